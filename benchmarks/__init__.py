@@ -0,0 +1,25 @@
+"""Benchmarks for nlp4all.
+
+These are not run as part of the tests. E.g. to benchmark data source imports:
+
+    python -m benchmarks.ingest --rows 10000 100000 --output ingest.json
+
+and the schema path helpers on synthetic schemas with 10k paths:
+
+    python -m benchmarks.paths --paths 1000 10000 --output paths.json
+
+and naive Bayes scoring of 10k documents, one at a time and in a batch:
+
+    python -m benchmarks.naive_bayes --documents 1000 10000 --output naive_bayes.json
+
+and concurrent taggers counting tags of the same analysis:
+
+    python -m benchmarks.analysis_counts --taggers 1 4 16 --output analysis_counts.json
+
+and expanding robot features to the words of a vocabulary:
+
+    python -m benchmarks.feature_index --vocabulary 10000 100000 --output feature_index.json
+
+See ``--help`` of each benchmark for the options. Results are written
+as JSON, so they can be compared across releases.
+"""
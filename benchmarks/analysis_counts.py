@@ -0,0 +1,230 @@
+"""Concurrent tagging benchmarks for analysis counts.
+
+N taggers (threads, each with its own session) tag the same analysis at once,
+on a SQLite database file, which stands in for the Postgres database of the app
+(the statements are the same, SQLite serializes the writers with a database
+lock where Postgres locks rows). Each mode is checked against the exact counts
+of the tagged documents (see ``generators.tagged_documents``):
+
+- ``legacy``, each tag reads the count rows with the ORM, adds to them and
+  writes them back, the read-modify-write analyses used to do on their data,
+- ``upsert``, each tag adds to the count rows with ``upsert_counts``
+  (INSERT ... ON CONFLICT DO UPDATE SET count = count + n),
+- ``delta``, each tag appends deltas while a compactor folds them into the
+  count rows with ``claim_deltas`` and ``upsert_counts``, as tagging does.
+
+Usage:
+
+    python -m benchmarks.analysis_counts --taggers 1 4 16 --documents 200 --output analysis_counts.json
+"""
+
+import typing as t
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from nlp4all.database import Base
+from nlp4all.helpers.naive_bayes import CountStore
+from nlp4all.models.analysis_counts import (
+    AnalysisCategoryCountModel,
+    AnalysisCountDeltaModel,
+    AnalysisWordCountModel,
+    claim_deltas,
+    upsert_counts
+)
+
+from .generators import tagged_documents
+from .ingest import metadata
+
+ANALYSIS_ID = 1
+MODES = ("legacy", "upsert", "delta")
+TABLES = [AnalysisCategoryCountModel.__table__, AnalysisWordCountModel.__table__, AnalysisCountDeltaModel.__table__]
+
+Document = t.Tuple[int, t.List[str]]
+
+
+def create_database(path: Path) -> Engine:
+    """An engine on a new SQLite database file with the count tables."""
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 60, "check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _wal(dbapi_connection, _record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(engine, tables=TABLES)
+    return engine
+
+
+def _rows(category: int, words: t.List[str]):
+    return [(category, None, 1), *((category, word, 1) for word in dict.fromkeys(words))]
+
+
+def tag_legacy(session: Session, category: int, words: t.List[str]) -> None:
+    """Counts a document by reading the count rows and writing them back."""
+    for category_id, word, n in _rows(category, words):
+        if word is None:
+            row = session.get(AnalysisCategoryCountModel, (ANALYSIS_ID, category_id))
+            new = AnalysisCategoryCountModel(analysis_id=ANALYSIS_ID, category_id=category_id, count=0)
+        else:
+            row = session.get(AnalysisWordCountModel, (ANALYSIS_ID, category_id, word))
+            new = AnalysisWordCountModel(analysis_id=ANALYSIS_ID, category_id=category_id, word=word, count=0)
+        if row is None:
+            row = session.merge(new)
+        row.count += n
+    session.commit()
+
+
+def tag_upsert(session: Session, category: int, words: t.List[str]) -> None:
+    """Counts a document with atomic upserts."""
+    upsert_counts(session, ANALYSIS_ID, _rows(category, words))
+    session.commit()
+
+
+def tag_delta(session: Session, category: int, words: t.List[str]) -> None:
+    """Counts a document by appending deltas."""
+    session.execute(insert(AnalysisCountDeltaModel), [
+        {"analysis_id": ANALYSIS_ID, "category_id": category_id, "word": word, "n": n}
+        for category_id, word, n in _rows(category, words)])
+    session.commit()
+
+
+def compact(session: Session) -> int:
+    """Folds the pending deltas into the count rows."""
+    claimed = claim_deltas(session, ANALYSIS_ID)
+    upsert_counts(session, ANALYSIS_ID, claimed)
+    session.commit()
+    return len(claimed)
+
+
+def read_counts(engine: Engine) -> CountStore[int]:
+    """The counts in the count rows."""
+    store: CountStore[int] = CountStore()
+    with Session(engine) as session:
+        categories = session.execute(select(
+            AnalysisCategoryCountModel.category_id, AnalysisCategoryCountModel.count)).all()
+        store.set_counts([row[0] for row in categories], None, [row[1] for row in categories])
+        words = session.execute(select(
+            AnalysisWordCountModel.category_id, AnalysisWordCountModel.word, AnalysisWordCountModel.count)).all()
+        store.set_counts([row[0] for row in words], [row[1] for row in words], [row[2] for row in words])
+    return store
+
+
+def lost_counts(expected: CountStore[int], actual: CountStore[int]) -> int:
+    """The number of counts of expected missing from actual."""
+    lost = sum(max(count - actual.count(category), 0)
+               for category, count in zip(expected.categories, expected.category_counts.tolist()))
+    counts = expected.counts
+    for row, category in enumerate(expected.categories):
+        for column in counts[row].nonzero()[0]:
+            lost += max(int(counts[row, column]) - actual.count(category, expected.words[column]), 0)
+    return lost
+
+
+def run_case(
+        mode: str,
+        taggers: int,
+        documents: int,
+        vocabulary: int = 200,
+        categories: int = 4,
+        words: int = 10,
+        directory: t.Optional[Path] = None) -> t.Dict[str, t.Any]:
+    """Times taggers tagging documents each, concurrently.
+
+    Returns:
+        The measurements for the case, in seconds, and the number of lost counts.
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        engine = create_database(Path(tmp) / "counts.db")
+        tag = {"legacy": tag_legacy, "upsert": tag_upsert, "delta": tag_delta}[mode]
+        work = [list(tagged_documents(documents, vocabulary, categories, words, seed=seed))
+                for seed in range(taggers)]
+        expected: CountStore[int] = CountStore()
+        for tagger_documents in work:
+            for category, document in tagger_documents:
+                expected.add(int(category[1:]), document)
+        errors: t.List[BaseException] = []
+        done = threading.Event()
+
+        def tagger(tagger_documents: t.List[t.Tuple[str, t.List[str]]]) -> None:
+            with Session(engine) as session:
+                for category, document in tagger_documents:
+                    try:
+                        tag(session, int(category[1:]), document)
+                    except Exception as e:  # pylint: disable=broad-except
+                        session.rollback()
+                        errors.append(e)
+
+        def compactor() -> None:
+            with Session(engine) as session:
+                while not done.is_set():
+                    compact(session)
+                    time.sleep(0.01)
+
+        threads = [threading.Thread(target=tagger, args=(tagger_documents,)) for tagger_documents in work]
+        background = threading.Thread(target=compactor) if mode == "delta" else None
+        started = time.perf_counter()
+        if background is not None:
+            background.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        if background is not None:
+            background.join()
+            with Session(engine) as session:
+                compact(session)
+        lost = lost_counts(expected, read_counts(engine))
+        engine.dispose()
+
+    return {
+        "mode": mode,
+        "taggers": taggers,
+        "documents": documents * taggers,
+        "words": words,
+        "seconds": elapsed,
+        "tags_per_second": documents * taggers / elapsed,
+        "errors": len(errors),
+        "lost": lost,
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> t.Dict[str, t.Any]:
+    """Runs the benchmarks and writes the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--taggers", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--documents", type=int, default=200, help="documents per tagger")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--vocabulary", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--words", type=int, default=10, help="words per document")
+    parser.add_argument("--output", help="file to write the results to, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for taggers in args.taggers:
+        for mode in args.modes:
+            result = run_case(mode, taggers, args.documents, args.vocabulary, args.categories, args.words)
+            print(f"{taggers} taggers, {mode}: {result['tags_per_second']:.0f} tags/s, "
+                  f"{result['lost']} counts lost, {result['errors']} errors", file=sys.stderr)
+            results.append(result)
+    report = {"meta": {**metadata(), "benchmark": "analysis_counts"}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
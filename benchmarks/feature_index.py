@@ -0,0 +1,102 @@
+"""Robot feature expansion benchmarks.
+
+Times expanding wildcard features (``prefix*``, ``*suffix``, ``*infix*``) to the
+words of a vocabulary of random words, as ``BayesianRobotModel.calculate_accuracy``
+does for every feature of a robot:
+
+- ``scan``, ``BayesianRobotModel.matches`` against every word,
+- ``build``, building the ``FeatureIndex`` of the vocabulary (once per vocabulary),
+- ``index``, ``FeatureIndex.expand``, the first expansion of each feature.
+
+Usage:
+
+    python -m benchmarks.feature_index --vocabulary 10000 100000 --features 100 --output feature_index.json
+"""
+
+import typing as t
+import argparse
+import json
+import random
+import string
+import sys
+import time
+
+from nlp4all.helpers.feature_index import FeatureIndex
+from nlp4all.models import BayesianRobotModel
+
+from .ingest import metadata
+
+
+def vocabulary_and_features(vocabulary: int, features: int, seed: int = 1) -> t.Tuple[t.List[str], t.List[str]]:
+    """Random words, and features made from parts of them, a third of each kind."""
+    rng = random.Random(seed)
+    words = list(dict.fromkeys(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12))) for _ in range(vocabulary)))
+    made = []
+    for i in range(features):
+        word = rng.choice(words)
+        if i % 3 == 0:
+            made.append(word[:3] + "*")
+        elif i % 3 == 1:
+            made.append("*" + word[-3:])
+        else:
+            made.append("*" + word[1:4] + "*")
+    return words, made
+
+
+def run_case(vocabulary: int, features: int) -> t.Dict[str, t.Any]:
+    """Times expanding features to the words of a vocabulary.
+
+    Returns:
+        The measurements for the case, in seconds.
+    """
+    words, made = vocabulary_and_features(vocabulary, features)
+
+    started = time.perf_counter()
+    scanned = [[word for word in words if BayesianRobotModel.matches(word, feature)] for feature in made]
+    scan = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = FeatureIndex(words)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expanded = [index.expand(feature) for feature in made]
+    lookup = time.perf_counter() - started
+    assert expanded == scanned
+
+    return {
+        "vocabulary": len(words),
+        "features": features,
+        "matches": sum(len(matched) for matched in expanded),
+        "scan": scan,
+        "build": build,
+        "index": lookup,
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> t.Dict[str, t.Any]:
+    """Runs the benchmarks and writes the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vocabulary", nargs="+", type=int, default=[10000, 100000])
+    parser.add_argument("--features", type=int, default=100)
+    parser.add_argument("--output", help="file to write the results to, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for vocabulary in args.vocabulary:
+        result = run_case(vocabulary, args.features)
+        print(f"{vocabulary} words: scan {result['scan']:.4f}s, build {result['build']:.4f}s, "
+              f"index {result['index']:.4f}s", file=sys.stderr)
+        results.append(result)
+    report = {"meta": {**metadata(), "benchmark": "feature_index"}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Synthetic data sets for the benchmarks.
+
+The generators are deterministic (seeded), so the same arguments always write
+the same file, and results can be compared across runs.
+"""
+
+import typing as t
+import csv
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+WORDS = (
+    "the a to and of in is it you that for on with this be are at have not was "
+    "data climate vote school game music news city today love people time world "
+    "great new good first last long little own other old right big high different "
+    "#nlp #election #football @user @news https://t.co/abc123 https://example.org"
+).split()
+LANGS = ["en", "da", "de", "es", "fr", "und"]
+START = datetime(2020, 1, 1)
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _timestamp(rng: random.Random) -> datetime:
+    return START + timedelta(seconds=rng.randrange(3 * 365 * 24 * 3600))
+
+
+def flat_csv(file_path: t.Union[str, os.PathLike], rows: int, seed: int = 1) -> Path:
+    """Writes a flat CSV file, with a header and some quoted text fields."""
+    rng = random.Random(seed)
+    file_path = Path(file_path)
+    with file_path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "created_at", "user", "text", "retweets", "likes", "score", "lang", "verified"])
+        for i in range(rows):
+            text = _text(rng, rng.randint(3, 30))
+            if rng.random() < 0.05:
+                # commas, quotes and newlines need quoting
+                text = f'"{text}", she said\nand then, {text}'
+            writer.writerow([
+                i,
+                _timestamp(rng).isoformat(),
+                f"user{rng.randrange(10000)}",
+                text,
+                rng.randrange(1000),
+                rng.randrange(5000),
+                round(rng.random(), 4),
+                rng.choice(LANGS),
+                "true" if rng.random() < 0.1 else "false",
+            ])
+    return file_path
+
+
+def _user(rng: random.Random) -> dict:
+    uid = rng.randrange(10 ** 9)
+    return {
+        "id": uid,
+        "id_str": str(uid),
+        "name": _text(rng, 2),
+        "screen_name": f"user{uid % 100000}",
+        "location": _text(rng, 2) if rng.random() < 0.6 else None,
+        "description": _text(rng, rng.randint(0, 20)),
+        "followers_count": rng.randrange(100000),
+        "friends_count": rng.randrange(5000),
+        "verified": rng.random() < 0.05,
+        "created_at": _timestamp(rng).isoformat(),
+    }
+
+
+def _entities(rng: random.Random, text: str) -> dict:
+    return {
+        "hashtags": [
+            {"text": word[1:], "indices": [text.find(word), text.find(word) + len(word)]}
+            for word in text.split() if word.startswith("#")],
+        "user_mentions": [
+            {"screen_name": word[1:], "id": rng.randrange(10 ** 9), "indices": [0, len(word)]}
+            for word in text.split() if word.startswith("@")],
+        "urls": [
+            {"url": word, "expanded_url": word + "/expanded", "display_url": word[8:]}
+            for word in text.split() if word.startswith("https://")],
+    }
+
+
+def tweet(rng: random.Random, i: int, retweet: bool = True) -> dict:
+    """A deeply nested, tweet like document."""
+    text = _text(rng, rng.randint(3, 40))
+    document: t.Dict[str, t.Any] = {
+        "id": i,
+        "id_str": str(i),
+        "created_at": _timestamp(rng).isoformat(),
+        "text": text,
+        "lang": rng.choice(LANGS),
+        "user": _user(rng),
+        "entities": _entities(rng, text),
+        "retweet_count": rng.randrange(1000),
+        "favorite_count": rng.randrange(5000),
+        "place": None,
+    }
+    if rng.random() < 0.2:
+        lon, lat = rng.uniform(-180, 180), rng.uniform(-90, 90)
+        document["place"] = {
+            "country": rng.choice(["Denmark", "Germany", "Spain"]),
+            "full_name": _text(rng, 2),
+            "bounding_box": {
+                "type": "Polygon",
+                "coordinates": [[[lon, lat], [lon + 1, lat], [lon + 1, lat + 1], [lon, lat + 1]]],
+            },
+        }
+    if rng.random() < 0.1:
+        document["extended_entities"] = {"media": [
+            {"id": rng.randrange(10 ** 9), "type": "photo", "media_url": "https://example.org/image.jpg",
+             "sizes": {"small": {"w": 340, "h": 240}, "large": {"w": 1024, "h": 768}}}]}
+    if retweet and rng.random() < 0.3:
+        document["retweeted_status"] = tweet(rng, rng.randrange(10 ** 9), retweet=False)
+    return document
+
+
+def tweets_jsonl(file_path: t.Union[str, os.PathLike], rows: int, seed: int = 1) -> Path:
+    """Writes a JSON lines file of nested tweet like documents."""
+    rng = random.Random(seed)
+    file_path = Path(file_path)
+    with file_path.open("w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(json.dumps(tweet(rng, i)))
+            f.write("\n")
+    return file_path
+
+
+def wide_json(
+        file_path: t.Union[str, os.PathLike],
+        rows: int,
+        seed: int = 1,
+        width: int = 1000,
+        density: float = 0.02) -> Path:
+    """Writes a JSON lines file of wide, sparse documents.
+
+    Each document has about ``width * density`` of ``width`` possible fields,
+    the type of a field (integer, number, string or boolean) depends on its name.
+    """
+    rng = random.Random(seed)
+    file_path = Path(file_path)
+    fields = [f"field_{i:04d}" for i in range(width)]
+    per_row = max(1, int(width * density))
+    with file_path.open("w", encoding="utf-8") as f:
+        for i in range(rows):
+            document: t.Dict[str, t.Any] = {"id": i}
+            for idx in sorted(rng.sample(range(width), per_row)):
+                kind = idx % 4
+                if kind == 0:
+                    document[fields[idx]] = rng.randrange(10 ** 6)
+                elif kind == 1:
+                    document[fields[idx]] = rng.random()
+                elif kind == 2:
+                    document[fields[idx]] = _text(rng, 3)
+                else:
+                    document[fields[idx]] = rng.random() < 0.5
+            f.write(json.dumps(document))
+            f.write("\n")
+    return file_path
+
+
+def wide_schema(paths: int, fanout: int = 10, array_every: int = 3, seed: int = 1) -> dict:
+    """A JSON schema with (about) ``paths`` leaf paths, for the schema path benchmarks.
+
+    Objects have ``fanout`` properties and are nested until there are enough
+    leaves; every ``array_every``-th nested object is an array of objects.
+    """
+    rng = random.Random(seed)
+    types = ["string", "integer", "number", "boolean"]
+
+    def _object(leaves: int, depth: int) -> dict:
+        properties: t.Dict[str, t.Any] = {}
+        if leaves <= fanout:
+            for i in range(leaves):
+                properties[f"f{depth}_{i}"] = {"type": rng.choice(types)}
+        else:
+            per_child, extra = divmod(leaves, fanout)
+            for i in range(fanout):
+                child = _object(per_child + (1 if i < extra else 0), depth + 1)
+                if i % array_every == array_every - 1:
+                    child = {"type": "array", "items": [child]}
+                properties[f"o{depth}_{i}"] = child
+        return {"type": "object", "properties": properties, "required": sorted(properties)}
+
+    schema = _object(paths, 0)
+    schema["$schema"] = "http://json-schema.org/schema#"
+    return schema
+
+
+def tagged_documents(
+        documents: int,
+        vocabulary: int = 5000,
+        categories: int = 4,
+        words: int = 20,
+        seed: int = 1) -> t.List[t.Tuple[str, t.List[str]]]:
+    """Tagged documents for the naive Bayes benchmarks, (category, words) each.
+
+    Words are drawn from a vocabulary with Zipf-like frequencies, and each
+    category favours a part of the vocabulary, so the categories can be told apart.
+    """
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocabulary)]
+    weights = [1 / (i + 1) for i in range(vocabulary)]
+    result = []
+    for _ in range(documents):
+        category = rng.randrange(categories)
+        drawn = rng.choices(vocab, weights, k=words)
+        # shift a third of the words into the part of the vocabulary of the category
+        shifted = [
+            vocab[(int(word[1:]) + category * vocabulary // categories) % vocabulary] if i % 3 == 0 else word
+            for i, word in enumerate(drawn)]
+        result.append((f"c{category}", shifted))
+    return result
+
+
+# data set name -> (generator, file suffix)
+DATASETS: t.Dict[str, t.Tuple[t.Callable[..., Path], str]] = {
+    "flat_csv": (flat_csv, ".csv"),
+    "tweets_jsonl": (tweets_jsonl, ".jsonl"),
+    "wide_json": (wide_json, ".jsonl"),
+}
+
+
+def dataset_file(name: str, rows: int, directory: t.Union[str, os.PathLike]) -> Path:
+    """The file for a data set, generated if it doesn't exist yet."""
+    generator, suffix = DATASETS[name]
+    file_path = Path(directory, f"{name}_{rows}{suffix}")
+    if not file_path.exists():
+        tmp_path = file_path.with_name(file_path.name + ".tmp")
+        generator(tmp_path, rows)
+        tmp_path.rename(file_path)
+    return file_path
@@ -0,0 +1,245 @@
+"""Data source import benchmarks.
+
+Each case imports a synthetic data set (see ``generators``) the way
+``data_source_tasks.load_data_file`` does: records are read and parsed, CSV
+values are converted to their column types, the schema is built and the
+documents are written to a collection. The collection is an in-process mongo
+stand-in (mongomock), or "null" to leave out the cost of storing the documents.
+
+Measured per case:
+
+- rows per second for the whole import, and without the schema generation,
+- the time spent generating the schema,
+- the peak resident memory (RSS) of the process running the import.
+
+Every case runs in a new process, so peak RSS isn't carried over between cases.
+
+Usage:
+
+    python -m benchmarks.ingest --rows 10000 100000 1000000 --output ingest.json
+"""
+
+import typing as t
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from nlp4all.helpers.data_source import (
+    SchemaSampler,
+    coerce_csv_batch,
+    infer_csv_types,
+    schema_aliased_path_dict,
+    schema_builder
+)
+from nlp4all.helpers.data_source_ingest import MappedRecordReader, RecordReader, ingest
+
+from .generators import DATASETS, dataset_file
+
+
+class NullCollection:
+    """Discards inserted documents."""
+
+    def insert_many(self, documents: t.List[dict], ordered: bool = True) -> None:  # pylint: disable=unused-argument
+        """Does nothing."""
+
+
+def peak_rss_mb() -> float:
+    """The peak resident memory of this process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _collection(name: str) -> t.Any:
+    if name == "null":
+        return NullCollection()
+    if name == "mongomock":
+        import mongomock  # pylint: disable=import-outside-toplevel
+        return mongomock.MongoClient().get_database("benchmark").get_collection("data")
+    raise ValueError(f"Unknown collection: {name}")
+
+
+def run_case(
+        dataset: str,
+        rows: int,
+        directory: t.Union[str, os.PathLike],
+        collection: str = "mongomock",
+        schema_mode: str = "sample",
+        mmap: bool = True,
+        writers: int = 4,
+        batch_size: int = 1000) -> t.Dict[str, t.Any]:
+    """Imports a data set once, in this process.
+
+    Args:
+        dataset: The name of the data set, see ``generators.DATASETS``.
+        rows: The number of rows in the data set.
+        directory: Where the data set files are (generated).
+        collection: "mongomock" or "null".
+        schema_mode: "sample" or "full", like DATA_IMPORT_SCHEMA_MODE.
+        mmap: Whether to read through a memory map, like DATA_IMPORT_MMAP.
+        writers: The number of writer threads.
+        batch_size: The number of documents per write.
+
+    Returns:
+        The measurements for the case.
+    """
+    file_path = dataset_file(dataset, rows, directory)
+    is_csv = file_path.suffix == ".csv"
+    rss_before = peak_rss_mb()
+    builder: t.Any = schema_builder()
+    if schema_mode == "sample":
+        builder = SchemaSampler(builder)
+    schema_seconds = 0.0
+    coerce_seconds = 0.0
+    column_types: t.Dict[str, str] = {}
+    started = time.perf_counter()
+    if is_csv:
+        with file_path.open("rb") as f:
+            sample = [document for _, document in zip(range(1000), RecordReader(f, True))]
+        column_types = infer_csv_types(sample)
+
+    def _on_batch(batch: t.List[dict]) -> None:
+        nonlocal schema_seconds, coerce_seconds
+        if column_types:
+            before = time.perf_counter()
+            coerce_csv_batch(batch, column_types)
+            coerce_seconds += time.perf_counter() - before
+        before = time.perf_counter()
+        for document in batch:
+            builder.add_object(document)
+        schema_seconds += time.perf_counter() - before
+
+    reader_class = MappedRecordReader if mmap else RecordReader
+    with file_path.open("rb") as f:
+        stats = ingest(
+            reader_class(f, is_csv),
+            _collection(collection),
+            on_batch=_on_batch,
+            batch_size=batch_size,
+            writers=writers,
+            ids_from_offsets=True)
+    before = time.perf_counter()
+    schema = builder.to_schema()
+    schema_seconds += time.perf_counter() - before
+    seconds = time.perf_counter() - started
+    return {
+        "dataset": dataset,
+        "rows": stats.rows_written,
+        "file_bytes": file_path.stat().st_size,
+        "collection": collection,
+        "schema_mode": schema_mode,
+        "mmap": mmap,
+        "writers": writers,
+        "batch_size": batch_size,
+        "seconds": seconds,
+        "rows_per_second": stats.rows_written / seconds if seconds else None,
+        "rows_per_second_without_schema": (
+            stats.rows_written / (seconds - schema_seconds) if seconds > schema_seconds else None),
+        "mb_per_second": file_path.stat().st_size / 2 ** 20 / seconds if seconds else None,
+        "schema_seconds": schema_seconds,
+        "coerce_seconds": coerce_seconds,
+        "schema_paths": len(schema_aliased_path_dict(schema)),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": rss_before,
+    }
+
+
+def _run_case_process(args: argparse.Namespace, dataset: str, rows: int) -> t.Dict[str, t.Any]:
+    """Runs a case in a new process, so its peak RSS is its own."""
+    command = [
+        sys.executable, "-m", "benchmarks.ingest", "--single",
+        "--datasets", dataset,
+        "--rows", str(rows),
+        "--data-dir", str(args.data_dir),
+        "--collection", args.collection,
+        "--schema-mode", args.schema_mode,
+        "--writers", str(args.writers),
+        "--batch-size", str(args.batch_size),
+    ]
+    if args.no_mmap:
+        command.append("--no-mmap")
+    result = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(result.stdout)
+
+
+def metadata() -> t.Dict[str, t.Any]:
+    """Where and when the benchmarks ran."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "benchmark": "ingest",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> t.Dict[str, t.Any]:
+    """Runs the benchmarks and writes the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--datasets", nargs="+", default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument("--rows", nargs="+", type=int, default=[10000, 100000, 1000000])
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "nlp4all-benchmarks"),
+                        help="where the generated data sets are kept between runs")
+    parser.add_argument("--collection", default="mongomock", choices=["mongomock", "null"])
+    parser.add_argument("--schema-mode", default="sample", choices=["sample", "full"])
+    parser.add_argument("--no-mmap", action="store_true", help="read in chunks instead of through a memory map")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--output", help="file to write the results to, defaults to stdout")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run all cases in this process (peak RSS is then cumulative)")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    if args.single:
+        result = run_case(
+            args.datasets[0], args.rows[0], args.data_dir, args.collection, args.schema_mode,
+            not args.no_mmap, args.writers, args.batch_size)
+        print(json.dumps(result))
+        return result
+
+    results = []
+    for dataset in args.datasets:
+        for rows in args.rows:
+            # generate the file up front, so it doesn't count for the case
+            started = time.perf_counter()
+            dataset_file(dataset, rows, args.data_dir)
+            generate_seconds = time.perf_counter() - started
+            if args.in_process:
+                result = run_case(
+                    dataset, rows, args.data_dir, args.collection, args.schema_mode,
+                    not args.no_mmap, args.writers, args.batch_size)
+            else:
+                result = _run_case_process(args, dataset, rows)
+            result["generate_seconds"] = generate_seconds
+            print(f"{dataset} {rows}: {result['rows_per_second']:.0f} rows/s, "
+                  f"schema {result['schema_seconds']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB",
+                  file=sys.stderr)
+            results.append(result)
+    report = {"meta": metadata(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
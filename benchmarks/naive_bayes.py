@@ -0,0 +1,121 @@
+"""Naive Bayes scoring benchmarks.
+
+Times scoring documents by category (``get_predictions_and_words`` of analyses
+and confusion matrices), on synthetic tagged documents (see
+``generators.tagged_documents``):
+
+- ``legacy``, the loops over words x categories x categories on the nested
+  dictionaries analyses kept in JSON (``legacy_predictions_and_words``),
+- ``scorer``, ``NaiveBayesScorer.predictions_and_words``, one document at a time,
+- ``batch``, ``NaiveBayesScorer.score_batch``, all of the documents at once.
+
+Usage:
+
+    python -m benchmarks.naive_bayes --documents 1000 10000 --output naive_bayes.json
+"""
+
+import typing as t
+import argparse
+import json
+import sys
+import time
+
+from nlp4all.helpers.naive_bayes import CountStore, NaiveBayesScorer
+
+from .generators import tagged_documents
+from .ingest import metadata
+
+
+def legacy_predictions_and_words(data: t.Dict[str, t.Any], category_names: t.List[str], words: t.Iterable[str]):
+    """The scores of a document as analyses computed them on their nested dictionaries."""
+    preds: t.Dict[str, t.Dict[str, float]] = {}
+    predictions: t.Dict[str, t.Dict[str, float]] = {}
+    if data["counts"] == 0:
+        predictions = {c: {w: 0} for w in words for c in category_names}
+    else:
+        for word in words:
+            preds[word] = {c: 0 for c in category_names}
+            for cat in category_names:
+                predictions[cat] = predictions.get(cat, {})
+                prob_ba = data[cat]["words"].get(word, 0) / data[cat]["counts"]
+                prob_a = data[cat]["counts"] / data["counts"]
+                prob_b = sum(data[c]["words"].get(word, 0) for c in category_names) / data["counts"]
+                if prob_b == 0:
+                    preds[word][cat] = 0
+                    predictions[cat][word] = 0
+                else:
+                    preds[word][cat] = round(prob_ba * prob_a / prob_b, 2)
+                    predictions[cat][word] = round(prob_ba * prob_a / prob_b, 2)
+    return preds, {k: round(sum(v.values()) / len(set(words)), 2) for k, v in predictions.items()}
+
+
+def run_case(
+        documents: int,
+        vocabulary: int = 5000,
+        categories: int = 4,
+        words: int = 20) -> t.Dict[str, t.Any]:
+    """Times scoring documents, trained on as many documents as are scored.
+
+    Returns:
+        The measurements for the case, in seconds.
+    """
+    store: CountStore[str] = CountStore()
+    for category, document in tagged_documents(documents, vocabulary, categories, words, seed=1):
+        store.add(category, document)
+    data = store.to_data()
+    test = [document for _, document in tagged_documents(documents, vocabulary, categories, words, seed=2)]
+    scorer = NaiveBayesScorer(store)
+    names = list(store.categories)
+
+    started = time.perf_counter()
+    for document in test:
+        legacy_predictions_and_words(data, names, set(document))
+    legacy = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for document in test:
+        scorer.predictions_and_words(document)
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scorer.score_batch([scorer.encode(document) for document in test])
+    batch = time.perf_counter() - started
+
+    return {
+        "documents": documents,
+        "vocabulary": len(store.words),
+        "categories": len(names),
+        "words": words,
+        "legacy": legacy,
+        "scorer": single,
+        "batch": batch,
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> t.Dict[str, t.Any]:
+    """Runs the benchmarks and writes the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--words", type=int, default=20, help="words per document")
+    parser.add_argument("--output", help="file to write the results to, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for documents in args.documents:
+        result = run_case(documents, args.vocabulary, args.categories, args.words)
+        print(f"{documents} documents: legacy {result['legacy']:.4f}s, scorer {result['scorer']:.4f}s, "
+              f"batch {result['batch']:.4f}s", file=sys.stderr)
+        results.append(result)
+    report = {"meta": {**metadata(), "benchmark": "naive_bayes"}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Schema path benchmarks.
+
+Times the helpers that work on the aliased paths of a schema, on synthetic
+schemas (see ``generators.wide_schema``) with many leaf paths:
+
+- ``schema_aliased_path_dict``, listing the paths of the schema,
+- ``PathTrie``, building the trie of the paths,
+- ``path_with_parents``, the paths and all of their parents,
+- ``minimum_paths_for_deletion``, the paths to remove when keeping a part of them,
+- ``delete_paths``, removing those paths from the schema.
+
+Usage:
+
+    python -m benchmarks.paths --paths 1000 10000 --output paths.json
+"""
+
+import typing as t
+import argparse
+import copy
+import json
+import random
+import sys
+import time
+
+from nlp4all.helpers.data_source import (
+    PathTrie,
+    delete_paths,
+    minimum_paths_for_deletion,
+    path_with_parents,
+    schema_aliased_path_dict
+)
+
+from .generators import wide_schema
+from .ingest import metadata
+
+
+def _best_of(repeat: int, func: t.Callable[[], t.Any]) -> float:
+    """The fastest of ``repeat`` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_case(paths: int, keep: float = 0.1, fanout: int = 10, repeat: int = 3) -> t.Dict[str, t.Any]:
+    """Times the schema path helpers on one synthetic schema.
+
+    Args:
+        paths: The number of leaf paths in the schema.
+        keep: The fraction of the paths that are kept (selected).
+        fanout: The number of properties per object.
+        repeat: The number of runs per helper, the fastest counts.
+
+    Returns:
+        The measurements for the case, in seconds.
+    """
+    schema = wide_schema(paths, fanout=fanout)
+    aliased = schema_aliased_path_dict(schema)
+    rng = random.Random(1)
+    selected = {alias: aliased[alias] for alias in rng.sample(list(aliased), max(1, int(len(aliased) * keep)))}
+    to_remove = minimum_paths_for_deletion(selected, aliased)
+
+    def _delete() -> None:
+        delete_paths(copy.deepcopy(schema), to_remove.values())
+
+    copy_seconds = _best_of(repeat, lambda: copy.deepcopy(schema))
+    return {
+        "paths": len(aliased),
+        "keep": len(selected),
+        "remove": len(to_remove),
+        "fanout": fanout,
+        "schema_aliased_path_dict": _best_of(repeat, lambda: schema_aliased_path_dict(schema)),
+        "path_trie": _best_of(repeat, lambda: PathTrie(aliased)),
+        "path_with_parents": _best_of(repeat, lambda: path_with_parents(aliased)),
+        "minimum_paths_for_deletion": _best_of(repeat, lambda: minimum_paths_for_deletion(selected, aliased)),
+        # the schema is copied for every run, as it's modified in place
+        "delete_paths": max(0.0, _best_of(repeat, _delete) - copy_seconds),
+    }
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> t.Dict[str, t.Any]:
+    """Runs the benchmarks and writes the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--keep", type=float, default=0.1, help="fraction of the paths that are kept")
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="file to write the results to, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for paths in args.paths:
+        result = run_case(paths, args.keep, args.fanout, args.repeat)
+        print(f"{result['paths']} paths: minimum_paths_for_deletion {result['minimum_paths_for_deletion']:.4f}s, "
+              f"path_with_parents {result['path_with_parents']:.4f}s", file=sys.stderr)
+        results.append(result)
+    report = {"meta": {**metadata(), "benchmark": "paths"}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -60,7 +60,7 @@ def create_app(env: Union[None, str] = None) -> Flask:
     login_manager.needs_refresh_message_category = "info"
 
     dbhelper.init_app(app)
-    # TODO: the connection probably doesn't need to exist for each request
+    # connects lazily, once per (forked) process
     docdb.init_app(app)
     nlp.init_app(app)
 
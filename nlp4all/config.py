@@ -41,6 +41,10 @@ except EnvironmentError:
     MONGO_INITDB_ROOT_USERNAME = "nlp4all"
     MONGO_INITDB_ROOT_PASSWORD = "nlp4all"
 
+MONGO_URI = (
+    f"mongodb://{MONGO_INITDB_ROOT_USERNAME}:{MONGO_INITDB_ROOT_PASSWORD}@{MONGODB_HOST}"
+    ":27017/nlp4all?authSource=admin")
+
 if DB_BACKEND == "postgres":
     pg_host = get_env_variable('POSTGRES_HOST')
     pg_user = get_env_variable('POSTGRES_USER')
@@ -68,6 +72,53 @@ class Config:  # pylint: disable=too-few-public-methods
     LOG_LEVEL = logging.WARNING
     DATA_UPLOAD_DIR: str = 'data'
 
+    # Data source import
+    DATA_IMPORT_MMAP: bool = True  # read uploads through a memory map instead of in chunks
+    DATA_IMPORT_CHUNK_SIZE: int = 2 ** 20  # bytes read from the upload at a time
+    DATA_IMPORT_BATCH_SIZE: int = 1000  # max documents per insert_many
+    DATA_IMPORT_BATCH_BYTES: int = 8 * 2 ** 20  # max (source) bytes per insert_many
+    DATA_IMPORT_QUEUE_DEPTH: int = 8  # batches waiting for a writer before parsing blocks
+    DATA_IMPORT_WRITERS: int = 4  # writer threads per import
+    DATA_IMPORT_PROGRESS_ROWS: int = 10000  # rows between progress updates
+    DATA_IMPORT_PROGRESS_INTERVAL: float = 2.0  # seconds between progress updates of sharded imports
+    DATA_IMPORT_CHECKPOINT_INTERVAL: float = 60.0  # seconds between checkpoints to resume an import from
+    # a started import whose worker hasn't reported progress for this long is taken over (and resumed)
+    # when its task is delivered again, until then a redelivered task is retried later
+    DATA_IMPORT_LEASE_TIMEOUT: float = 600.0
+    # JSON lines uploads larger than DATA_IMPORT_SHARD_MIN_BYTES are split into this many
+    # newline aligned byte ranges, each imported in its own process. 1 disables sharding.
+    DATA_IMPORT_SHARDS: int = 1
+    DATA_IMPORT_SHARD_MIN_BYTES: int = 64 * 2 ** 20
+    # discover the schema from a sample first, and only import the fields the user selects
+    DATA_IMPORT_TWO_PHASE: bool = False
+    DATA_IMPORT_DISCOVERY_ROWS: int = 10000  # rows the schema is discovered from in a two phase import
+    DATA_IMPORT_CSV_TYPES: bool = True  # convert CSV values to the column types inferred from a sample
+    DATA_IMPORT_CSV_TYPE_SAMPLE: int = 1000  # rows sampled to infer CSV column types
+    # "full" builds the schema from every document, "sample" from a sample (see SchemaSampler)
+    DATA_IMPORT_SCHEMA_MODE: str = "sample"
+    DATA_IMPORT_SCHEMA_HEAD: int = 1000  # documents always used for the schema in "sample" mode
+    DATA_IMPORT_SCHEMA_RESERVOIR: int = 1000  # random sample size for the schema in "sample" mode
+    # collections with more documents are pruned in _id ranges of this size, DATA_PRUNE_WORKERS at a time
+    DATA_PRUNE_CHUNK_SIZE: int = 100000
+    DATA_PRUNE_WORKERS: int = 4
+    DATA_BROWSE_PAGE_SIZE: int = 50  # documents per page when browsing a data source
+    DATA_BROWSE_MAX_PAGE_SIZE: int = 1000
+    DATA_EXPORT_BATCH_SIZE: int = 1000  # documents read at a time by the NDJSON export
+    DATA_EXPORT_DIR: str = 'data/exports'  # where the Parquet export task writes its files
+    DATA_INDEX_POLL_INTERVAL: float = 2.0  # seconds between progress updates while indexes are built
+
+    # MongoDB (document store), the client is created on first use in each process
+    MONGO_URI: str = MONGO_URI
+    MONGO_MAX_POOL_SIZE: int = 100  # connections per process
+    MONGO_MIN_POOL_SIZE: int = 0  # connections kept open when idle
+    MONGO_MAX_IDLE_TIME_MS: t.Optional[int] = None  # close connections idle this long, None keeps them
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: t.Optional[int] = None  # max wait for a free connection, None waits
+    MONGO_CONNECT_TIMEOUT_MS: int = 20000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 30000
+    MONGO_SOCKET_TIMEOUT_MS: t.Optional[int] = None  # None: operations don't time out
+    # primary, primaryPreferred, secondary, secondaryPreferred or nearest
+    MONGO_READ_PREFERENCE: str = "primary"
+
     # Security
     BCRYPT_LOG_ROUNDS: int = 12
     BCRYPT_HASH_PREFIX: str = "2b"
@@ -77,11 +128,22 @@ class Config:  # pylint: disable=too-few-public-methods
     SQLALCHEMY_DATABASE_URI = DB_URI
     STATIC_DIR = "static"
 
+    # Analyses
+    # seconds between compactions of the tag count deltas, run by celery beat (the beat service in compose)
+    ANALYSIS_COUNTS_COMPACT_INTERVAL: float = 60.0
+
     # Celery
     CELERY: dict = dict(
         broker_url=CELERY_BROKER_URL,
         result_backend=CELERY_RESULT_BACKEND,
         task_ignore_result=True,
+        include=["nlp4all.helpers.analysis_tasks"],
+        beat_schedule={
+            "compact-analysis-counts": {
+                "task": "nlp4all.helpers.analysis_tasks.compact_analysis_counts",
+                "schedule": ANALYSIS_COUNTS_COMPACT_INTERVAL,
+            },
+        },
     )
 
     SPACY_MODEL_TYPES = {
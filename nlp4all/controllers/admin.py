@@ -1,8 +1,8 @@
 """Admin controller."""  # pylint: disable=invalid-name
 
-from flask import flash, redirect, url_for
+from flask import flash, jsonify, redirect, url_for
 from celery.result import AsyncResult
-from nlp4all import db
+from nlp4all import db, docdb
 from ..models import UserGroupModel, DataTagCategoryModel
 from ..forms.admin import AddOrgForm
 from ..forms.analyses import AddTweetCategoryForm
@@ -50,3 +50,9 @@ class AdminController(BaseController):
     def celery_result(cls, task_id: str):
         result = AsyncResult(task_id)
         return cls.render_template("celery_result.html", result=result)
+
+    @classmethod
+    def mongo_status(cls):
+        """MongoDB health and connection pool metrics of the worker serving the request"""
+        status = docdb.health()
+        return jsonify(status), 200 if status["ok"] else 503
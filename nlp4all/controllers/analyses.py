@@ -265,13 +265,8 @@ class AnalysesController(BaseController):  # pylint: disable=too-many-public-met
             the_tweet = DataModel.query.get(data_id)
             category = DataTagCategoryModel.query.get(category_id)
             the_tweet = DataModel.query.get(data_id)
-            bayes_analysis.data = bayes_analysis.updated_data(the_tweet, category)
-            # all this  stuff is necessary  because the database backend doesnt resgister
-            # changes on JSON
-            flag_modified(bayes_analysis, "data")
-            db.add(bayes_analysis)
-            db.merge(bayes_analysis)
-            db.flush()
+            # only the counts of the category and of the words of the tweet are written
+            bayes_analysis.count_tag(the_tweet, category)
             db.session.commit()
             tag = DataTagModel(
                 category=category.id,
@@ -331,7 +326,7 @@ class AnalysesController(BaseController):  # pylint: disable=too-many-public-met
         data["chart_data"] = create_bar_chart_data(data["predictions"], "Computeren gætter på...")
         # filter robots that are retired, and sort them alphabetically
         # data['robots'] = sorted(robots, key= lambda r: r.name)
-        data["analysis_data"] = bayes_analysis.data
+        data["analysis_data"] = bayes_analysis.counts_data()
         data["user"] = current_user
         data["user_role"] = current_user.roles
         data["tag_options"] = a_project.categories
@@ -343,13 +338,8 @@ class AnalysesController(BaseController):  # pylint: disable=too-many-public-met
             category = DataTagCategoryModel.query.get(
                 int(form.choices.data)
             )  # pylint: disable=no-member
-            bayes_analysis.data = bayes_analysis.updated_data(the_tweet, category)
-            # all this  stuff is necessary  because the database backend doesnt resgister
-            # changes on JSON
-            flag_modified(bayes_analysis, "data")
-            db.add(bayes_analysis)
-            db.merge(bayes_analysis)
-            db.flush()
+            # only the counts of the category and of the words of the tweet are written
+            bayes_analysis.count_tag(the_tweet, category)
             db.session.commit()
             tag = DataTagModel(
                 category=category.id,
@@ -1656,13 +1646,8 @@ class AnalysesController(BaseController):  # pylint: disable=too-many-public-met
         print("hep1")
 
         # save the prediction
-        bayes_analysis.data = bayes_analysis.updated_data(this_tweet, category)
-        # all this  stuff is necessary  because the database backend doesnt resgister
-        # changes on JSON
-        flag_modified(bayes_analysis, "data")
-        db.add(bayes_analysis)
-        db.merge(bayes_analysis)
-        db.flush()
+        # only the counts of the category and of the words of the tweet are written
+        bayes_analysis.count_tag(this_tweet, category)
         db.session.commit()
         print("hep2")
         tag = DataTagModel(
@@ -1714,7 +1699,7 @@ class AnalysesController(BaseController):  # pylint: disable=too-many-public-met
         data["chart_data"] = create_bar_chart_data(data["predictions"], "Computeren gætter på...")
         # filter robots that are retired, and sort them alphabetically
         # data['robots'] = sorted(robots, key= lambda r: r.name)
-        data["analysis_data"] = bayes_analysis.data
+        data["analysis_data"] = bayes_analysis.counts_data()
 
         return jsonify(data, the_tweet.id, the_tweet.time_posted)
 
@@ -2,16 +2,20 @@
 
 import typing as t
 import os
-from datetime import datetime
-from flask import redirect, url_for
+import uuid
+from flask import Response, abort, redirect, request, send_file, stream_with_context, url_for
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
 from flask_login import current_user
 from werkzeug.utils import secure_filename
-from sqlalchemy.orm import joinedload, scoped_session
+from sqlalchemy.orm import joinedload
 from .base import BaseController
 from ..forms.data_source import AddDataSourceForm, DataSourceFieldSelectForm
 from ..models import DataSourceModel, BackgroundTaskModel
 from .. import db, conf, docdb
 from ..helpers import data_source_tasks as bg_tasks
+from ..helpers.data_source_browse import browse_page, field_projection, ndjson_lines
+from ..helpers.data_source_ingest import unique_upload_name
 from ..database import BackgroundTaskStatus
 
 
@@ -32,19 +36,12 @@ class DataSourceController(BaseController):  # pylint: disable=too-few-public-me
         form = AddDataSourceForm()
         if form.validate_on_submit():
             f = form.data_source.data
-            filename = secure_filename(f.filename)
+            # if the file exists a timestamp is added to the filename
+            filename = unique_upload_name(conf.DATA_UPLOAD_DIR, secure_filename(f.filename))
             destination = os.path.join(
                 conf.DATA_UPLOAD_DIR,
                 filename)
 
-            # if the file exists we can add a timestamp to the filename
-            while os.path.exists(destination):
-                ts = datetime.now().strftime("%Y%m%d%H%M%S")
-                filename = f"{os.path.splitext(filename)[0]}_{ts}{os.path.splitext(filename)[1]}"
-                destination = os.path.join(
-                    conf.DATA_UPLOAD_DIR,
-                    filename)
-
             f.save(destination)
             ds = DataSourceModel(
                 data_source_name=form.data_source_name.data,
@@ -103,9 +100,14 @@ class DataSourceController(BaseController):  # pylint: disable=too-few-public-me
                     form.data_source_main.data,  # type: ignore
                     ds.aliased_path(form.data_source_main.data))  # type: ignore
                 fields_to_keep = form.data_source_fields.data + [form.data_source_main.data]  # type: ignore
+                ds.meta = {**(ds.meta or {}), 'selected_fields': list(dict.fromkeys(fields_to_keep))}
                 ds.task_id = None
                 db.session.commit()
-                bg_tasks.prune_data_source.delay(ds.id, fields_to_keep)  # type: ignore
+                if ds.awaiting_import:
+                    # two phase import, only the selected fields are imported
+                    bg_tasks.import_data_source.delay(ds.id, fields_to_keep)  # type: ignore
+                else:
+                    bg_tasks.prune_data_source.delay(ds.id, fields_to_keep)  # type: ignore
                 # bg = BackgroundTaskModel(
                 #     task_id=bg_task.id,
                 # )
@@ -135,29 +137,121 @@ class DataSourceController(BaseController):  # pylint: disable=too-few-public-me
         return redirect(url_for("data_source_controller.home"))
 
     @classmethod
-    def inspect(cls, datasource_id: int):
-        """Inspect data source"""
-        from ..helpers.data_source import schema_aliased_path_dict
-        sess: scoped_session = db.session
-        ds: t.Union[DataSourceModel, None] = sess.query(DataSourceModel).filter_by(
+    def _get(cls, datasource_id: int) -> DataSourceModel:
+        """The data source, or a 404"""
+        ds: t.Union[DataSourceModel, None] = db.session.query(DataSourceModel).filter_by(
             id=datasource_id).first()
-        if ds is None:
-            return cls.render_template("404.html", title="Not found")
+        if ds is None or ds.schema is None:
+            abort(404)
+        return ds
+
+    @classmethod
+    def _projection(cls, ds: DataSourceModel) -> t.Optional[t.Dict[str, int]]:
+        """The projection for the "fields" argument (comma separated aliases), or the selected fields"""
+        fields = request.args.get("fields", type=str)
+        selected = fields.split(",") if fields else (ds.meta or {}).get("selected_fields")
+        if not selected:
+            return None
         paths = ds.path_aliases_from_schema()
+        unknown = [field for field in selected if field not in paths]
+        if unknown:
+            abort(400, f"Unknown fields: {', '.join(unknown)}")
+        return field_projection(paths[field] for field in selected)
 
-        # selected_paths = {field: paths[field] for field in ('content', 'id')}
+    @classmethod
+    def _page(cls, ds: DataSourceModel) -> t.Tuple[t.List[dict], t.Optional[str]]:
+        """The page of documents for the "after" and "limit" arguments"""
+        limit = min(max(request.args.get("limit", conf.DATA_BROWSE_PAGE_SIZE, type=int), 1),
+                    conf.DATA_BROWSE_MAX_PAGE_SIZE)
+        try:
+            return browse_page(
+                docdb.get_collection(ds.collection_name),
+                request.args.get("after", type=str),
+                limit,
+                cls._projection(ds))
+        except ValueError as e:
+            abort(400, str(e))
 
-        # paths_to_remove = minimum_paths_for_deletion(selected_paths, paths)
-        new_schema = schema_aliased_path_dict(ds.schema, types_only=True)
-        # get the first 10 rows from the data
-        data_collection = docdb.get_collection(ds.collection_name)
-        data = [d for d in data_collection.find().limit(10)]
+    @classmethod
+    def inspect(cls, datasource_id: int):
+        """Inspect data source"""
+        ds = cls._get(datasource_id)
+        paths, new_schema = ds.path_maps_from_schema()
+        data, next_page = cls._page(ds)
 
         return cls.render_template(
             "data_source_inspect.html",
             title="Set up Data Source",
             ds=ds,
             data=data,
+            next_page=next_page,
             paths=paths,
             anything=new_schema
         )
+
+    @classmethod
+    def browse(cls, datasource_id: int):
+        """A page of documents as JSON, with the cursor of the next page
+
+        Arguments: after (the cursor), limit, and fields (comma separated aliases).
+        """
+        ds = cls._get(datasource_id)
+        data, next_page = cls._page(ds)
+        return Response(
+            json_util.dumps({"documents": data, "next": next_page}, json_options=RELAXED_JSON_OPTIONS),
+            mimetype="application/json")
+
+    @classmethod
+    def export_ndjson(cls, datasource_id: int):
+        """Stream every document as JSON lines, optionally only the fields (comma separated aliases)"""
+        ds = cls._get(datasource_id)
+        lines = ndjson_lines(
+            docdb.get_collection(ds.collection_name), cls._projection(ds), conf.DATA_EXPORT_BATCH_SIZE)
+        filename = secure_filename(ds.data_source_name) or ds.collection_name
+        return Response(
+            stream_with_context(lines),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={filename}.jsonl"})
+
+    @classmethod
+    def export(cls, datasource_id: int):
+        """Export the data source collection as a Parquet file
+
+        The file is written by a background task (``export_data_source``), this shows its
+        progress and sends the file once it is done. A new export is started when there is
+        none of the current schema, or with the "refresh" argument.
+        """
+        ds = cls._get(datasource_id)
+        export = (ds.meta or {}).get("parquet_export") or {}
+        task: t.Optional[BackgroundTaskModel] = None
+        if export.get("fingerprint") == ds.schema_fingerprint and not request.args.get("refresh"):
+            task = db.session.query(BackgroundTaskModel).filter_by(task_id=export.get("task_id")).first()
+        if task is not None and task.task_status == BackgroundTaskStatus.SUCCESS:
+            path = bg_tasks.export_path(ds, task.task_id)
+            if path.exists():
+                return send_file(
+                    path.resolve(),
+                    mimetype="application/vnd.apache.parquet",
+                    as_attachment=True,
+                    download_name=f"{secure_filename(ds.data_source_name) or ds.collection_name}.parquet")
+            task = None
+        if task is None:
+            if export.get("task_id"):
+                bg_tasks.export_path(ds, export["task_id"]).unlink(missing_ok=True)
+            task = BackgroundTaskModel(
+                task_id=str(uuid.uuid4()),
+                task_status=BackgroundTaskStatus.PENDING,
+                total_steps=0,
+                current_step=0,
+            )
+            db.session.add(task)
+            ds.meta = {**(ds.meta or {}), "parquet_export": {
+                "task_id": task.task_id, "fingerprint": ds.schema_fingerprint}}
+            db.session.commit()
+            bg_tasks.export_data_source.apply_async((ds.id,), task_id=task.task_id)  # type: ignore
+        return cls.render_template(
+            "data_source_export.html",
+            title="Data source export",
+            ds=ds,
+            task=task
+        )
@@ -27,7 +27,11 @@ class AddDataSourceForm(FlaskForm):
     data_source = FileField(
         "Data source",
         validators=[
-            FileAllowed(["csv", "tsv", "json", "txt"], "Only csv, tsv, json and txt files are allowed"),
+            FileAllowed(
+                ["csv", "tsv", "json", "jsonl", "ndjson", "txt", "gz", "bz2", "xz", "zst",
+                 "parquet", "pq", "arrow", "feather", "ipc"],
+                "Only csv, tsv, json, jsonl and txt files (optionally compressed), "
+                "and parquet or arrow files are allowed"),
             FileRequired("Please select a file.")
         ])
     submit = SubmitField("Create")
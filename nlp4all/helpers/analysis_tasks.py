@@ -0,0 +1,34 @@
+"""Celery background tasks for analyses."""
+
+import typing as t
+from celery import shared_task
+from sqlalchemy import select
+from .. import db
+from ..models import AnalysisCountDeltaModel, BayesianAnalysisModel
+
+
+@shared_task
+def compact_analysis_counts(analysis_id: t.Optional[int] = None) -> int:
+    """Folds the pending count deltas of analyses into their count tables.
+
+    Runs periodically (see the CELERY beat schedule in the config, celery beat runs
+    in its own compose service), each analysis is compacted and committed on its own.
+
+    Args:
+        analysis_id: The analysis to compact, None for all analyses with pending deltas
+
+    Returns:
+        int: The number of deltas folded
+    """
+    if analysis_id is None:
+        analysis_ids = db.session.scalars(select(AnalysisCountDeltaModel.analysis_id).distinct()).all()
+    else:
+        analysis_ids = [analysis_id]
+    folded = 0
+    for an_id in analysis_ids:
+        analysis = db.session.get(BayesianAnalysisModel, an_id)
+        if analysis is None:
+            continue
+        folded += analysis.compact_counts(db.session)
+        db.session.commit()
+    return folded
@@ -3,11 +3,21 @@
 from __future__ import annotations
 
 import typing as t
+import copy
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
 from genson import SchemaBuilder, SchemaNode, SchemaStrategy
-from genson.schema.strategies import Object, List, Tuple
+from genson.schema.strategies import Object, List, Tuple, String
+from genson.schema.strategies.base import TypedSchemaStrategy
 from pathlib import Path
 import csv
+import random
 import re
+import sys
 
 
 class N4AObject(Object):
@@ -88,6 +98,26 @@ class N4ATuple(Tuple):
     #     return schema
 
 
+class N4ADateTime(TypedSchemaStrategy):
+    """Date/time strategy for nlp4all, e.g. for typed CSV columns.
+
+    Dates are stored as datetimes, in the schema they are strings with a
+    "date-time" format, like in JSON schema.
+    """
+
+    JS_TYPE = "string"
+    PYTHON_TYPE = datetime
+
+    @classmethod
+    def match_schema(cls, schema):
+        return schema.get("type") == cls.JS_TYPE and schema.get("format") == "date-time"
+
+    def to_schema(self):
+        schema = super().to_schema()
+        schema["format"] = "date-time"
+        return schema
+
+
 class N4ASchemaNode(SchemaNode):
     """Schema node for nlp4all."""
 
@@ -117,6 +147,11 @@ class N4ASchemaNode(SchemaNode):
                     return types[1]
                 if types[1]['type'] == 'null':
                     return types[0]
+            # dates that are mixed with other strings are just strings
+            stypes = [stype.get('type') for stype in types]
+            stypes = [v for stype in stypes for v in (stype if isinstance(stype, list) else [stype])]
+            if all(stype in ('string', 'null') for stype in stypes):
+                return {'type': 'string'}
         except KeyError:
             pass
 
@@ -159,6 +194,185 @@ def csv_row_to_json(row: t.List[str], headers: t.List[str]) -> dict:
     return {headers[i]: row[i] for i in range(len(row))}
 
 
+# the field an _id of an uploaded document is kept in, the _id of an imported document is its
+# offset in the upload (see data_source_ingest.ingest), so all ids of a collection have one type
+SOURCE_ID_FIELD = "_source_id"
+
+
+def keep_source_id(document: t.Any) -> t.Any:
+    """Moves the _id of an uploaded document to SOURCE_ID_FIELD, in place.
+
+    Returns:
+        The document.
+    """
+    if isinstance(document, dict) and "_id" in document:
+        document[SOURCE_ID_FIELD] = document.pop("_id")
+    return document
+
+
+CSV_INTEGER = re.compile(r"[+-]?(0|[1-9][0-9]*)")
+CSV_NUMBER = re.compile(r"[+-]?((0|[1-9][0-9]*)(\.[0-9]*)?|\.[0-9]+)([eE][+-]?[0-9]+)?")
+CSV_BOOLEANS = {"true": True, "false": False}
+# whether datetime.fromisoformat reads all of the ISO dates CSV_DATE matches
+FROMISOFORMAT_READS_ISO = sys.version_info >= (3, 11)
+CSV_DATE = re.compile(
+    r"(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})"
+    r"([T ](?P<time>[0-9]{2}:[0-9]{2})(:(?P<seconds>[0-9]{2})([.,](?P<fraction>[0-9]+))?)?"
+    r"(?P<offset>Z|[+-][0-9]{2}(:?[0-9]{2})?)?)?")
+
+
+def _csv_integer(value: str) -> int:
+    # leading zeros (ids, zip codes) would be lost, and mongo integers are 64 bit
+    if CSV_INTEGER.fullmatch(value) is None or not -2 ** 63 <= int(value) < 2 ** 63:
+        raise ValueError(f"Not an integer: {value}")
+    return int(value)
+
+
+def _csv_number(value: str) -> float:
+    if CSV_NUMBER.fullmatch(value) is None:
+        raise ValueError(f"Not a number: {value}")
+    return float(value)
+
+
+def _csv_boolean(value: str) -> bool:
+    try:
+        return CSV_BOOLEANS[value.lower()]
+    except KeyError as e:
+        raise ValueError(f"Not a boolean: {value}") from e
+
+
+def _csv_date_time(value: str) -> datetime:
+    match = CSV_DATE.fullmatch(value)
+    if match is None:
+        raise ValueError(f"Not an ISO date: {value}")
+    if FROMISOFORMAT_READS_ISO:
+        return datetime.fromisoformat(value)
+    # fromisoformat only reads the format isoformat writes: no "Z", no offsets
+    # without a colon, and fractions of 3 or 6 digits
+    iso = match["date"]
+    if match["time"] is not None:
+        iso += f"T{match['time']}:{match['seconds'] or '00'}"
+        if match["fraction"] is not None:
+            iso += "." + match["fraction"][:6].ljust(6, "0")
+        offset = match["offset"]
+        if offset == "Z":
+            iso += "+00:00"
+        elif offset is not None:
+            iso += f"{offset[:3]}:{offset[-2:] if len(offset) > 3 else '00'}"
+    return datetime.fromisoformat(iso)
+
+
+# the types a CSV column can have, with the function converting a value,
+# in the order they are tried when inferring the type of a column
+CSV_TYPES: t.Dict[str, t.Callable[[str], t.Any]] = {
+    "boolean": _csv_boolean,
+    "integer": _csv_integer,
+    "number": _csv_number,
+    "date-time": _csv_date_time,
+}
+
+
+def infer_csv_types(rows: t.Iterable[dict]) -> t.Dict[str, str]:
+    """Infers the types of CSV columns from a sample of the rows.
+
+    A column gets a type if all of its (non empty) sampled values can be converted
+    to it, see ``CSV_TYPES``. Columns that are empty in the sample, or that can't
+    be converted, are strings.
+
+    Args:
+        rows: The sample, as returned by ``csv_row_to_json``.
+
+    Returns:
+        The inferred type for each column ("boolean", "integer", "number",
+        "date-time" or "string").
+    """
+    candidates: t.Dict[str, t.List[str]] = {}
+    seen: t.Set[str] = set()
+    for row in rows:
+        for column, value in row.items():
+            if column not in candidates:
+                candidates[column] = list(CSV_TYPES)
+            if value == "":
+                continue
+            seen.add(column)
+            remaining = []
+            for ctype in candidates[column]:
+                try:
+                    CSV_TYPES[ctype](value)
+                except ValueError:
+                    continue
+                remaining.append(ctype)
+            candidates[column] = remaining
+    return {
+        column: remaining[0] if column in seen and remaining else "string"
+        for column, remaining in candidates.items()}
+
+
+def _convert_column(values: t.List[str], ctype: str) -> t.List[t.Any]:
+    """Converts the (non empty) values of a column, raises ValueError if any of them can't be."""
+    if ctype == "integer":
+        if not all(map(CSV_INTEGER.fullmatch, values)):
+            raise ValueError("Not all integers")
+        converted = list(map(int, values))
+        if converted and not (-2 ** 63 <= min(converted) and max(converted) < 2 ** 63):
+            raise ValueError("Not all 64 bit integers")
+        return converted
+    if ctype == "number":
+        if not all(map(CSV_NUMBER.fullmatch, values)):
+            raise ValueError("Not all numbers")
+        return list(map(float, values))
+    if ctype == "boolean":
+        booleans = list(map(CSV_BOOLEANS.get, map(str.lower, values)))
+        if None in booleans:
+            raise ValueError("Not all booleans")
+        return booleans
+    return list(map(CSV_TYPES[ctype], values))
+
+
+def coerce_csv_batch(batch: t.List[dict], column_types: t.Dict[str, str]) -> t.List[dict]:
+    """Converts the values of a batch of CSV rows to their column types, in place.
+
+    This works a column at a time: the values of a column are checked and converted
+    with ``map``, without a Python call per value (except for dates). Only when a
+    column has values that can't be converted (e.g. a typo in a column of numbers)
+    are its values converted one at a time, and those values are kept as strings,
+    so no data is lost. Empty values in typed columns become None.
+
+    Args:
+        batch: The rows, as returned by ``csv_row_to_json``.
+        column_types: The column types, as returned by ``infer_csv_types``.
+
+    Returns:
+        The batch.
+    """
+    for column, ctype in column_types.items():
+        convert = CSV_TYPES.get(ctype)
+        if convert is None:
+            continue
+        rows = []
+        for row in batch:
+            value = row.get(column)
+            if not isinstance(value, str):
+                continue
+            if value == "":
+                row[column] = None
+            else:
+                rows.append(row)
+        values = [row[column] for row in rows]
+        try:
+            converted = _convert_column(values, ctype)
+        except ValueError:
+            converted = []
+            for value in values:
+                try:
+                    converted.append(convert(value))
+                except ValueError:
+                    converted.append(value)
+        for row, value in zip(rows, converted):
+            row[column] = value
+    return batch
+
+
 def csv_to_json(csv: t.List[t.List[str]], headers: t.Union[t.List[str], None]) -> t.List[dict]:
     """Converts a CSV to a JSON array.
 
@@ -207,8 +421,15 @@ def schema_builder() -> N4ASchemaBuilder:
         The schema builder.
     """
     # add our custom list and object strategies
-    N4ASchemaNode.STRATEGIES = tuple([s for s in SchemaBuilder.STRATEGIES if s not in [
-        Object, List, Tuple]] + [N4ATuple, N4AList, N4AObject])
+    strategies: t.List[t.Type[SchemaStrategy]] = []
+    for strategy in SchemaBuilder.STRATEGIES:
+        if strategy in [Object, List, Tuple]:
+            continue
+        # date-time strings have to be matched before other strings
+        if strategy is String:
+            strategies.append(N4ADateTime)
+        strategies.append(strategy)
+    N4ASchemaNode.STRATEGIES = tuple(strategies + [N4ATuple, N4AList, N4AObject])
     N4ASchemaBuilder.NODE_CLASS = N4ASchemaNode
     N4ASchemaBuilder.STRATEGIES = N4ASchemaNode.STRATEGIES
     return N4ASchemaBuilder()
@@ -289,27 +510,147 @@ def generate_schema(
     return schema
 
 
-def schema_aliased_path_dict(schema: dict,
-                             depth: t.Union[None, int] = None,
-                             types_only: bool = False) -> t.Dict[str, t.Tuple[str, ...]]:
-    """Gets a dictionary of all paths in a schema, with their aliases.
-    This recursively goes through a json schema and returns a list of paths to
-    all properties that can contain data (i.e. not objects or arrays).
+def merge_schemas(schemas: t.Iterable[dict]) -> dict:
+    """Merges schemas generated from parts of the same data.
 
-    Aliases are the contents of the "title" field of a schema.
+    Args:
+        schemas: The schemas to merge, e.g. one per shard of an import.
+
+    Returns:
+        A schema that covers all of the data.
+    """
+    builder = schema_builder()
+    for schema in schemas:
+        builder.add_schema(schema)
+    return builder.to_schema()
+
+
+def document_path_signature(document: t.Any) -> t.Set[str]:
+    """Gets the set of key paths in a document, with the type found at each path.
+
+    Array elements share the path of their array, so a document with a list of
+    100 identical objects has the same signature as one with a single object.
+    Two documents with the same signature add the same information to a schema
+    builder.
 
     Args:
-        schema: The schema to get the paths from.
-        depth: The depth to go to. If None, will go to the end.
+        document: The document to get the signature of.
 
     Returns:
-        A dictionary of paths to aliases. The format is:
-        {
-            "namespaced.field.alias": ("full", "path", "to", "field"),
-            ...
-        }
+        A set of strings, one for each (path, type) pair in the document.
+    """
+    signature: t.Set[str] = set()
+
+    def _walk(value: t.Any, prefix: str) -> None:
+        if isinstance(value, dict):
+            signature.add(prefix + "\x1eobject")
+            for key, child in value.items():
+                _walk(child, prefix + "\x1f" + key)
+        elif isinstance(value, list):
+            signature.add(prefix + "\x1earray")
+            for child in value:
+                _walk(child, prefix + "\x1f[]")
+        else:
+            signature.add(prefix + "\x1e" + type(value).__name__)
+
+    _walk(document, "")
+    return signature
+
+
+class SchemaSampler:
+    """Builds a schema from a sample of a stream of documents.
+
+    The first ``head`` documents are always added to the schema builder, and a
+    reservoir sample of ``reservoir`` documents from the rest of the stream is
+    added when the schema is generated. Every other document only gets a
+    structural check: its path signature (see ``document_path_signature``) is
+    compared to the paths seen so far, and it is added to the builder only if it
+    has a path (or a type at a path) that hasn't been seen before.
+
+    This means every path and type in the stream ends up in the schema. Only
+    the "required" lists can differ from a full build, as they are based on the
+    documents that were added to the builder. For homogeneous data the schema is
+    identical to one built from every document.
+
+    It can be used in place of a schema builder, i.e. it has ``add_object`` and
+    ``to_schema``.
     """
-    paths = {}
+
+    def __init__(
+            self,
+            builder: t.Union[SchemaBuilder, None] = None,
+            head: int = 1000,
+            reservoir: int = 1000,
+            seed: t.Union[int, None] = None):
+        self.builder = builder if builder is not None else schema_builder()
+        self.head = head
+        self.reservoir_size = reservoir
+        self.known_paths: t.Set[str] = set()
+        self.seen = 0
+        self.added = 0
+        self._reservoir: t.List[t.Any] = []
+        self._rng = random.Random(seed)
+
+    def _add(self, document: t.Any, signature: t.Set[str]) -> None:
+        self.builder.add_object(document)
+        self.known_paths |= signature
+        self.added += 1
+
+    def add_object(self, document: t.Any) -> None:
+        """Adds a document from the stream."""
+        self.seen += 1
+        signature = document_path_signature(document)
+        if self.seen <= self.head:
+            self._add(document, signature)
+            return
+        if not signature <= self.known_paths:
+            self._add(document, signature)
+        # reservoir sampling (algorithm R) over the documents after the head,
+        # the documents are copied as the caller may still change them (e.g. set their ids)
+        if isinstance(document, dict):
+            document = dict(document)
+        position = self.seen - self.head
+        if len(self._reservoir) < self.reservoir_size:
+            self._reservoir.append(document)
+        else:
+            idx = self._rng.randrange(position)
+            if idx < self.reservoir_size:
+                self._reservoir[idx] = document
+
+    def add_schema(self, schema: dict) -> None:
+        """Merges a schema into the builder, e.g. a partial schema of the same data."""
+        self.builder.add_schema(schema)
+
+    def partial_schema(self) -> dict:
+        """Generates the schema of the documents added so far, without the reservoir sample."""
+        return self.builder.to_schema()
+
+    def to_schema(self) -> dict:
+        """Adds the reservoir sample to the builder and generates the schema."""
+        for document in self._reservoir:
+            self.builder.add_object(document)
+            self.added += 1
+        self._reservoir = []
+        return self.builder.to_schema()
+
+
+class SchemaPathMaps(t.NamedTuple):
+    """The aliased paths of a schema, and the types at those paths."""
+
+    paths: t.Dict[str, t.Tuple[str, ...]]
+    types: t.Dict[str, t.Tuple[str, ...]]
+
+
+def schema_fingerprint(schema: dict) -> str:
+    """A stable hash of a schema, the same for equal schemas whatever their key order."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _schema_path_maps(schema: dict, depth: t.Union[None, int] = None) -> SchemaPathMaps:
+    """Walks a schema once for both its aliased paths and their types."""
+    paths: t.Dict[str, t.Tuple[str, ...]] = {}
+    types: t.Dict[str, t.Tuple[str, ...]] = {}
 
     def _schema_aliased_path_dict(
             schema: dict,
@@ -327,7 +668,9 @@ def schema_aliased_path_dict(schema: dict,
             stype = [stype]
         if 'object' in stype:
             if "properties" not in schema:
-                paths[".".join(new_title_prefix)] = tuple(new_path) if not types_only else tuple(stype)
+                alias = ".".join(new_title_prefix)
+                paths[alias] = tuple(new_path)
+                types[alias] = tuple(stype)
             else:
                 for key, value in schema["properties"].items():
                     new_path = path + ["properties", key]
@@ -347,11 +690,73 @@ def schema_aliased_path_dict(schema: dict,
                         new_title_prefix,
                         depth=depth - 1 if depth is not None else None)
         elif any(map(lambda v: v in stype, ["string", "number", "integer", "boolean", "null"])):
-            paths[".".join(new_title_prefix)] = tuple(new_path) if not types_only else tuple(stype)
+            alias = ".".join(new_title_prefix)
+            paths[alias] = tuple(new_path)
+            types[alias] = tuple(stype)
 
     _schema_aliased_path_dict(schema, [], title_prefix=[], depth=depth)
 
-    return paths
+    return SchemaPathMaps(paths, types)
+
+
+# fingerprint -> path maps, most recently used last
+_PATH_MAPS_CACHE: 'OrderedDict[str, SchemaPathMaps]' = OrderedDict()
+_PATH_MAPS_CACHE_LOCK = threading.Lock()
+PATH_MAPS_CACHE_SIZE = 64
+
+
+def schema_path_maps(schema: dict, fingerprint: t.Optional[str] = None) -> SchemaPathMaps:
+    """The aliased paths and types of a schema, cached by the schema fingerprint.
+
+    Args:
+        schema: The schema to get the paths from.
+        fingerprint: The ``schema_fingerprint`` of the schema, if it is known
+                     (e.g. ``DataSourceModel.schema_fingerprint``), saves hashing the schema.
+
+    Returns:
+        New dictionaries, so they can be changed without changing the cache.
+    """
+    if fingerprint is None:
+        fingerprint = schema_fingerprint(schema)
+    with _PATH_MAPS_CACHE_LOCK:
+        maps = _PATH_MAPS_CACHE.get(fingerprint)
+        if maps is not None:
+            _PATH_MAPS_CACHE.move_to_end(fingerprint)
+    if maps is None:
+        maps = _schema_path_maps(schema)
+        with _PATH_MAPS_CACHE_LOCK:
+            _PATH_MAPS_CACHE[fingerprint] = maps
+            while len(_PATH_MAPS_CACHE) > PATH_MAPS_CACHE_SIZE:
+                _PATH_MAPS_CACHE.popitem(last=False)
+    return SchemaPathMaps(dict(maps.paths), dict(maps.types))
+
+
+def schema_aliased_path_dict(schema: dict,
+                             depth: t.Union[None, int] = None,
+                             types_only: bool = False) -> t.Dict[str, t.Tuple[str, ...]]:
+    """Gets a dictionary of all paths in a schema, with their aliases.
+    This recursively goes through a json schema and returns a list of paths to
+    all properties that can contain data (i.e. not objects or arrays).
+
+    Aliases are the contents of the "title" field of a schema.
+
+    Without a depth the paths come from ``schema_path_maps``, so a schema is
+    only walked once for its paths and types.
+
+    Args:
+        schema: The schema to get the paths from.
+        depth: The depth to go to. If None, will go to the end.
+        types_only: Map the aliases to the types at the paths instead.
+
+    Returns:
+        A dictionary of paths to aliases. The format is:
+        {
+            "namespaced.field.alias": ("full", "path", "to", "field"),
+            ...
+        }
+    """
+    maps = schema_path_maps(schema) if depth is None else _schema_path_maps(schema, depth)
+    return maps.types if types_only else maps.paths
 
 
 def schema_path_to_jsonb_path(path: t.Tuple[str, ...]) -> str:
@@ -414,20 +819,100 @@ def schema_path_index_and_keys_for_pgsql(path: t.Tuple[str, ...]) -> t.List[t.Tu
     return index_and_keys
 
 
+class PathTrie:
+    """A prefix tree of dotted (aliased) paths, e.g. from ``schema_aliased_path_dict``.
+
+    Every node is a part of a path, so the parents of a path are the nodes on
+    the way to it, and paths with a common prefix share its nodes. A path can
+    hold a value, e.g. its schema path.
+    """
+
+    __slots__ = ("children", "value", "terminal")
+
+    def __init__(self, paths: t.Union[t.Mapping[str, t.Any], t.Iterable[str], None] = None):
+        self.children: t.Dict[str, PathTrie] = {}
+        self.value: t.Any = None
+        self.terminal = False
+        if isinstance(paths, t.Mapping):
+            for path, value in paths.items():
+                self.insert(path, value)
+        elif paths is not None:
+            for path in paths:
+                self.insert(path)
+
+    @staticmethod
+    def _parts(path: t.Union[str, t.Sequence[str]]) -> t.Sequence[str]:
+        return path.split(".") if isinstance(path, str) else path
+
+    def insert(self, path: t.Union[str, t.Sequence[str]], value: t.Any = None) -> 'PathTrie':
+        """Adds a path (dotted or split into parts), returns its node."""
+        node = self
+        for part in self._parts(path):
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = PathTrie()
+            node = child
+        node.terminal = True
+        node.value = value
+        return node
+
+    def find(self, path: t.Union[str, t.Sequence[str]]) -> t.Optional['PathTrie']:
+        """The node of a path or of a parent of paths, None if there is none."""
+        node: t.Optional[PathTrie] = self
+        for part in self._parts(path):
+            node = node.children.get(part)  # type: ignore
+            if node is None:
+                return None
+        return node
+
+    def __contains__(self, path: t.Union[str, t.Sequence[str]]) -> bool:
+        """Whether the path was added or is a parent of an added path."""
+        return self.find(path) is not None
+
+    def walk(self, prefix: str = "") -> t.Iterator[t.Tuple[str, 'PathTrie']]:
+        """Yields the dotted path and node of every node below this one, parents first."""
+        stack = [(prefix, self)]
+        while stack:
+            path, node = stack.pop()
+            if node is not self:
+                yield path, node
+            for part, child in reversed(node.children.items()):
+                stack.append((f"{path}.{part}" if path else part, child))
+
+    def items(self) -> t.Iterator[t.Tuple[str, t.Any]]:
+        """Yields the dotted paths that were added and their values."""
+        return ((path, node.value) for path, node in self.walk() if node.terminal)
+
+
 def path_with_parents(paths: t.Iterable[str]) -> t.Set[str]:
     """Get a set of all parent paths for the given paths."""
-
-    all_paths: t.List = []
+    all_paths: t.Set[str] = set()
     for path in paths:
-        for i in range(1, len(path.split(".")) + 1):
-            all_paths += [".".join(path.split(".")[:i])]
-    return set(all_paths)
+        # from the path up, the parents of a parent that's there already are too
+        while path not in all_paths:
+            all_paths.add(path)
+            end = path.rfind(".")
+            if end == -1:
+                break
+            path = path[:end]
+    return all_paths
+
 
+def _schema_path_prefix(path: t.Sequence[str], depth: int) -> t.Tuple[str, ...]:
+    """The part of a schema path up to the property at ``depth`` of its aliased path.
 
-def find_last(lst, sought_elt):
-    for r_idx, elt in enumerate(reversed(lst)):
-        if elt == sought_elt:
-            return len(lst) - 1 - r_idx
+    Every "properties" hop is a part of the aliased path, "items" hops aren't.
+    """
+    for i, part in enumerate(path):
+        if part == "properties":
+            depth -= 1
+            if depth == 0:
+                return tuple(path[:i + 2])
+    # not a property path (e.g. ends in "items"), remove the array as a whole
+    path = tuple(path)
+    while path and path[-1] == "items":
+        path = path[:-1]
+    return path
 
 
 def minimum_paths_for_deletion(
@@ -454,79 +939,245 @@ def minimum_paths_for_deletion(
     {
         "x.y.z": ("properties", "x", "properties", "y", "properties", "z"),
     }
+
+    The kept paths are put in a ``PathTrie``, and every path is walked down it
+    once: the first part of a path that isn't (a parent of) a kept path is the
+    highest level item to remove. Objects aren't in ``paths`` (only their
+    properties are), their schema path is cut from the path of a property.
     """
-    keep['$schema'] = ('$schema', )
-    keep_set = path_with_parents(keep.keys())
-    paths_to_remove = {}
+    keep_trie = PathTrie(keep.keys())
+    keep_trie.insert(("$schema",))
+    paths_to_remove: t.Dict[str, t.Tuple[str, ...]] = {}
     for path, path_tuple in paths.items():
-        if path not in keep_set:
-            # we only want to add the highest level item
-            # if we have a.b.c and a.b, we only want to add a.b
-            hierarchy = path.split(".")
-            h_len = len(hierarchy)
-            if h_len > 1:
-                for i in range(1, h_len + 1):
-                    parent = ".".join(hierarchy[:i])
-
-                    if parent in paths_to_remove:
-                        break
-                    if parent in keep_set:
-                        continue
-                    # the key might not exist if it's an object
-                    # because we can't use objects for filtering
-                    # but we can use their usable properties
-                    if parent in paths:
-                        paths_to_remove[parent] = paths[parent]
-                    else:
-                        # we can use a "pseudo" path, this will be the path_tuple
-                        # up to the parent
-                        parent_tuple = None
-                        for j in range(i, h_len):
-                            tmp_path = ".".join(hierarchy[:j])
-                            if tmp_path in paths:
-                                parent_tuple = paths[tmp_path]
-                                break
-                        if parent_tuple is None:
-                            parent_tuple = path_tuple
-                        idx = find_last(parent_tuple, hierarchy[i - 1])
-                        if idx is not None:
-                            idx += 1
-                            paths_to_remove[parent] = parent_tuple[:idx]
-                        else:
-                            # last resort, just use the whole path
-                            paths_to_remove[parent] = parent_tuple
-                    break
-            else:
-                if path_tuple[-1] == "items":
-                    paths_to_remove[path] = path_tuple[:-1]
-                else:
-                    paths_to_remove[path] = path_tuple
-
+        parts = path.split(".")
+        node = keep_trie
+        for depth, part in enumerate(parts, start=1):
+            child = node.children.get(part)
+            if child is None:
+                break
+            node = child
+        else:
+            continue
+        parent = ".".join(parts[:depth])
+        if parent not in paths_to_remove:
+            paths_to_remove[parent] = _schema_path_prefix(paths.get(parent, path_tuple), depth)
     return paths_to_remove
 
 # def build_delete_where_clause()
 
 
-def nested_get_all(dic: t.Union[t.Dict, t.List[t.Dict]], keys: t.Tuple[str, ...]) -> t.List[t.Any]:
-    out = []
-    if not isinstance(dic, list):
-        dic = [dic]
-    n_keys = len(keys)
-    for di in dic:
-        for i, key in enumerate(keys):
-            if isinstance(di, list):
-                for d in di:
-                    res = nested_get_all(d, keys[i:])
-                    if res and not res == []:
-                        out += res
+def projection_tree(fields: t.Iterable[str]) -> t.Dict[str, t.Any]:
+    """Builds the tree of fields to keep for ``project_document``.
+
+    Args:
+        fields: Dotted field paths, arrays are left out like in mongo
+                (e.g. "entities.urls.url" for the url of each of the urls).
+
+    Returns:
+        A nested dictionary, True marks a field that is kept as a whole.
+        E.g. ["text", "user.name", "user.id"] gives
+        {"text": True, "user": {"name": True, "id": True}}.
+    """
+    tree: t.Dict[str, t.Any] = {}
+    for field in fields:
+        parts = field.split(".")
+        node = tree
+        for part in parts[:-1]:
+            if node.get(part) is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def project_document(document: t.Any, tree: t.Dict[str, t.Any]) -> t.Any:
+    """Keeps only the fields of a document that are in a projection tree.
+
+    Lists are projected element by element, like in a mongo projection.
+
+    Args:
+        document: The document (or a value inside it).
+        tree: The fields to keep, see ``projection_tree``.
+
+    Returns:
+        A new, projected document.
+    """
+    if isinstance(document, list):
+        return [project_document(item, tree) for item in document]
+    if not isinstance(document, dict):
+        return document
+    projected = {}
+    for key, subtree in tree.items():
+        if key not in document:
+            continue
+        projected[key] = document[key] if subtree is True else project_document(document[key], subtree)
+    return projected
+
+
+def _expand(nodes: t.Iterable[t.Any]) -> t.Iterator[t.Any]:
+    """Yields the nodes, with (nested) lists replaced by their items."""
+    for node in nodes:
+        if isinstance(node, list):
+            yield from _expand(node)
+        else:
+            yield node
+
+
+class SchemaPath:
+    """A schema path compiled into an accessor for schemas and documents.
+
+    Schema paths (see ``schema_aliased_path_dict``) go through "properties" and
+    "items" hops. Compiling a path once saves re-walking the tuple and its
+    special cases for every schema or document it's used on, see ``compile_path``.
+
+    Lists met on the way (e.g. the list of item schemas of an array) are walked
+    item by item, so every method works on all of the matches.
+    """
+
+    __slots__ = ("path", "_walk", "_key", "_document_steps")
+
+    def __init__(self, path: t.Sequence[str]):
+        self.path: t.Tuple[str, ...] = tuple(path)
+        if not self.path:
+            raise ValueError("Empty schema path")
+        self._walk = self.path[:-1]
+        self._key = self.path[-1]
+        # "properties" hops only exist in the schema, "items" is a list in the document
+        self._document_steps: t.Tuple[t.Optional[str], ...] = tuple(
+            None if part == "items" else part for part in self.path if part != "properties")
+
+    def __repr__(self) -> str:
+        return f"SchemaPath({self.path!r})"
+
+    def owners(self, schema: t.Union[dict, t.List[dict]]) -> t.List[dict]:
+        """The dicts that (would) hold the last key of the path."""
+        nodes: t.List[t.Any] = [schema]
+        for key in self._walk:
+            nodes = [node[key] for node in _expand(nodes) if isinstance(node, dict) and key in node]
+        return [node for node in _expand(nodes) if isinstance(node, dict)]
+
+    def get_all(self, schema: t.Union[dict, t.List[dict]]) -> t.List[t.Any]:
+        """All of the values at the path.
+
+        An object schema whose title is the last key counts as a match too.
+        """
+        key = self._key
+        out = []
+        for owner in self.owners(schema):
+            if key in owner:
+                out.append(owner[key])
+            elif owner.get("title") == key:
+                out.append(owner)
+        return out
+
+    def set_all(self, schema: t.Union[dict, t.List[dict]], value: t.Any) -> int:
+        """Replaces all of the values at the path, only existing keys are set.
+
+        Returns:
+            The number of values set.
+        """
+        key = self._key
+        count = 0
+        for owner in self.owners(schema):
+            if key in owner or owner.get("title") == key:
+                owner[key] = value
+                count += 1
+        return count
+
+    def delete(self, schema: t.Union[dict, t.List[dict]]) -> int:
+        """Deletes all of the values at the path.
+
+        A deleted property is also removed from "required" of its object schema.
+
+        Returns:
+            The number of values deleted.
+        """
+        return delete_paths(schema, [self.path])
+
+    def values(self, document: t.Any) -> t.List[t.Any]:
+        """The values at the path in a document (not a schema).
+
+        "properties" hops are left out and "items" hops walk the items of a list,
+        e.g. ("properties", "tags", "items", "properties", "text") gives the
+        "text" of every item in "tags".
+        """
+        nodes: t.List[t.Any] = [document]
+        for step in self._document_steps:
+            if step is None:
+                nodes = list(_expand(nodes))
             else:
-                if key in di:
-                    di = di[key]
-                    if i == n_keys - 1:
-                        out.append(di)
-                elif i == n_keys - 1 and "title" in di and di["title"] == key:
-                    out.append(di)
-    return out
+                nodes = [node[step] for node in _expand(nodes) if isinstance(node, dict) and step in node]
+        return nodes
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_path(path: t.Tuple[str, ...]) -> SchemaPath:
+    return SchemaPath(path)
+
+
+def compile_path(path: t.Sequence[str]) -> SchemaPath:
+    """The (cached) compiled accessor for a schema path.
+
+    Paths stored as JSON come back as lists, they share the cache entry of the tuple.
+    """
+    return _compile_path(tuple(path))
+
+
+def _path_tree(paths: t.Iterable[t.Sequence[str]]) -> t.Dict[str, t.Any]:
+    """Merges paths into a tree of nested dicts, a path ends in a None leaf.
+
+    Paths inside another path are left out.
+    """
+    tree: t.Dict[str, t.Any] = {}
+    for path in paths:
+        node = tree
+        for part in path[:-1]:
+            child = node.setdefault(part, {})
+            if child is None:
+                break
+            node = child
+        else:
+            node[path[-1]] = None
+    return tree
+
+
+def _delete_tree(node: t.Any, tree: t.Dict[str, t.Any], parent: t.Optional[dict], hop: t.Optional[str]) -> int:
+    if isinstance(node, list):
+        return sum(_delete_tree(item, tree, parent, hop) for item in node)
+    if not isinstance(node, dict):
+        return 0
+    count = 0
+    for key, subtree in tree.items():
+        if subtree is None:
+            if key in node:
+                del node[key]
+                count += 1
+            if hop == "properties" and parent is not None and key in parent.get("required", ()):
+                parent["required"].remove(key)
+        elif key in node:
+            count += _delete_tree(node[key], subtree, node, key)
+    return count
+
+
+def delete_paths(schema: t.Union[dict, t.List[dict]], paths: t.Iterable[t.Sequence[str]]) -> int:
+    """Deletes many paths from a schema in one walk of the schema.
+
+    The paths are merged into a tree first, so shared prefixes are walked once.
+    A deleted property is also removed from "required" of its object schema.
+
+    Args:
+        schema: The schema, modified in place.
+        paths: The schema paths to delete.
+
+    Returns:
+        The number of values deleted.
+    """
+    return _delete_tree(schema, _path_tree(paths), None, None)
+
+
+def nested_get_all(dic: t.Union[t.Dict, t.List[t.Dict]], keys: t.Tuple[str, ...]) -> t.List[t.Any]:
+    return compile_path(keys).get_all(dic)
 
 
 def nested_set(dic: t.Dict, keys: t.Tuple[str, ...], value: t.Any):
@@ -539,83 +1190,25 @@ def nested_set_all(
         dic: t.Union[t.Dict, t.List[t.Dict]],
         keys: t.Tuple[str, ...],
         value: t.Any) -> t.Union[t.Dict, t.List[t.Dict]]:
-    is_list = isinstance(dic, list)
-    if not is_list:
-        dic = [dic]  # type: ignore
-    n_keys = len(keys)
-    for i, di in enumerate(dic):
-        if isinstance(di, list):
-            for k, d in enumerate(di):
-                res = nested_set_all(d, keys, value)
-                di[k] = res
-            dic[i] = di  # type: ignore
-        else:
-            if keys[0] in di:
-                if n_keys == 1:
-                    di[keys[0]] = value
-                    dic[i] = di
-                else:
-                    dic[i] = nested_set_all(di[keys[0]], keys[1:], value)  # type: ignore
-            elif n_keys == 1 and "title" in di and di["title"] == keys[0]:
-                di[keys[0]] = value
-                dic[i] = di
-    if not is_list:
-        return dic[0]
+    compile_path(keys).set_all(dic, value)
     return dic
 
 
 def nested_del_all(dic: t.Union[t.Dict, t.List[t.Dict]], keys: t.Tuple[str, ...]) -> t.Union[t.Dict, t.List[t.Dict]]:
-    is_list = isinstance(dic, list)
-    if not is_list:
-        dic = [dic]  # type: ignore
-    n_keys = len(keys)
-    for i, di in enumerate(dic):
-        if isinstance(di, list):
-            new_list = []
-            for k, d in enumerate(di):
-                res = nested_del_all(d, keys)
-                new_list.append(res)
-            dic[i] = new_list  # type: ignore
-        else:
-            if keys[0] in di:
-                if n_keys == 1:
-                    del di[keys[0]]
-                    dic[i] = di
-                else:
-                    if n_keys in (2, 3) and "required" in di and keys[-1] in di["required"]:
-                        di["required"].remove(keys[-1])
-                    new_dict = nested_del_all(di[keys[0]], keys[1:])
-                    dic[i] = {**di, keys[0]: new_dict}
-            # elif n_keys == 1 and "title" in di and di["title"] == keys[0]:
-            #     if "required" in di and keys[-1] in di["required"]:
-            #         di["required"].remove(keys[-1])
-            #     del dic[i]
-            elif n_keys in (2, 3) and "required" in di and keys[-1] in di["required"]:
-                di["required"].remove(keys[-1])
-                dic[i] = di
-    return dic if is_list else dic[0]
+    compile_path(keys).delete(dic)
+    return dic
 
 
 def remove_paths_from_schema(schema: t.Dict, paths: t.Dict[str, t.Tuple[str, ...]]) -> dict:
     """Removes the given paths from the schema.
 
     Args:
-        schema: The schema to remove the paths from.
+        schema: The schema to remove the paths from, it isn't modified.
         paths: The paths to remove.
 
     Returns:
-        The schema with the paths removed.
+        A copy of the schema with the paths removed.
     """
-
-    for path in paths.values():
-        try:
-            val = []
-            val = nested_get_all(schema, path)
-            if len(val) == 0:
-                continue
-            schema = nested_del_all(schema, path)  # type: ignore
-        except KeyError:
-            continue
-        except TypeError:
-            pass
+    schema = copy.deepcopy(schema)
+    delete_paths(schema, paths.values())
     return schema
@@ -0,0 +1,447 @@
+"""Columnar (Parquet / Arrow IPC) import and export for data sources.
+
+Columnar files are read one record batch at a time (a Parquet row group is read
+in batches as well), and each batch is converted to documents in one go. The
+schema is taken from the Arrow schema of the file, so unlike CSV and JSON imports
+no schema has to be generated from the rows.
+
+This needs ``pyarrow``, which is optional: without it columnar uploads are rejected.
+"""
+
+from __future__ import annotations
+
+import typing as t
+import os
+import json
+from datetime import datetime
+from pathlib import Path
+
+from .data_source import SOURCE_ID_FIELD, project_document
+
+if t.TYPE_CHECKING:
+    from pymongo.collection import Collection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+
+COLUMNAR_SUFFIXES: t.Dict[str, str] = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def columnar_format(file_name: t.Union[str, os.PathLike]) -> t.Optional[str]:
+    """The columnar format of a file, from its suffix, None if it isn't columnar."""
+    return COLUMNAR_SUFFIXES.get(Path(file_name).suffix.lower())
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("Parquet and Arrow files need pyarrow to be installed")
+
+
+def arrow_type_to_schema(data_type: 'pa.DataType', title: t.Optional[str] = None) -> dict:
+    """Converts an Arrow type to a schema in the form generated for JSON imports.
+
+    Args:
+        data_type: The Arrow type.
+        title: The title (field name) for objects, lists use the title of their field.
+
+    Returns:
+        The schema for values of the type.
+    """
+    types = pa.types
+    if types.is_dictionary(data_type):
+        return arrow_type_to_schema(data_type.value_type, title)
+    if types.is_struct(data_type):
+        fields = [data_type.field(i) for i in range(data_type.num_fields)]
+        schema = {
+            "type": "object",
+            "properties": {f.name: arrow_type_to_schema(f.type, f.name) for f in fields},
+            "required": [f.name for f in fields],
+        }
+        if title is not None:
+            schema["title"] = title
+        return schema
+    if types.is_map(data_type):
+        entries = pa.struct([("key", data_type.key_type), ("value", data_type.item_type)])
+        return {"type": "array", "items": [arrow_type_to_schema(entries, title)]}
+    if types.is_list(data_type) or types.is_large_list(data_type) or types.is_fixed_size_list(data_type):
+        return {"type": "array", "items": [arrow_type_to_schema(data_type.value_type, title)]}
+    if types.is_boolean(data_type):
+        return {"type": "boolean"}
+    if types.is_integer(data_type) or types.is_duration(data_type):
+        return {"type": "integer"}
+    if types.is_floating(data_type) or types.is_decimal(data_type):
+        return {"type": "number"}
+    if types.is_timestamp(data_type) or types.is_date(data_type):
+        return {"type": "string", "format": "date-time"}
+    if types.is_null(data_type):
+        return {"type": "null"}
+    return {"type": "string"}
+
+
+def arrow_schema_to_schema(arrow_schema: 'pa.Schema') -> dict:
+    """Converts the Arrow schema of a file to the schema of its documents."""
+    schema = arrow_type_to_schema(pa.struct(list(arrow_schema)))
+    schema["$schema"] = "http://json-schema.org/schema#"
+    schema["title"] = "nlp4all"
+    return schema
+
+
+def bson_type(data_type: 'pa.DataType') -> 'pa.DataType':
+    """The type to cast an Arrow type to, so its Python values can be stored in mongo.
+
+    E.g. mongo can store ``datetime`` but not ``date`` or ``Decimal`` values.
+    """
+    types = pa.types
+    if types.is_dictionary(data_type):
+        return bson_type(data_type.value_type)
+    if types.is_struct(data_type):
+        return pa.struct([
+            data_type.field(i).with_type(bson_type(data_type.field(i).type)) for i in range(data_type.num_fields)])
+    if types.is_map(data_type):
+        return pa.list_(pa.struct([("key", bson_type(data_type.key_type)), ("value", bson_type(data_type.item_type))]))
+    if types.is_list(data_type) or types.is_fixed_size_list(data_type):
+        return pa.list_(bson_type(data_type.value_type))
+    if types.is_large_list(data_type):
+        return pa.large_list(bson_type(data_type.value_type))
+    if types.is_date(data_type):
+        return pa.timestamp("ms")
+    if types.is_time(data_type):
+        return pa.string()
+    if types.is_decimal(data_type) or types.is_float16(data_type):
+        return pa.float64()
+    if types.is_duration(data_type):
+        return pa.int64()
+    return data_type
+
+
+def project_arrow_type(data_type: 'pa.DataType', tree: t.Union[bool, t.Dict[str, t.Any]]) -> 'pa.DataType':
+    """The type of values of an Arrow type after ``data_source.project_document``."""
+    if not isinstance(tree, dict):
+        # True, the whole value is kept
+        return data_type
+    types = pa.types
+    if types.is_dictionary(data_type):
+        return project_arrow_type(data_type.value_type, tree)
+    if types.is_struct(data_type):
+        return pa.struct([
+            data_type.field(i).with_type(project_arrow_type(data_type.field(i).type, tree[data_type.field(i).name]))
+            for i in range(data_type.num_fields) if data_type.field(i).name in tree])
+    if types.is_list(data_type) or types.is_large_list(data_type) or types.is_fixed_size_list(data_type):
+        return pa.list_(project_arrow_type(data_type.value_type, tree))
+    return data_type
+
+
+def _document_name(name: str) -> str:
+    """The field a column is read into, an _id column is kept in SOURCE_ID_FIELD like in CSV and JSON imports."""
+    return SOURCE_ID_FIELD if name == "_id" else name
+
+
+class ArrowRecordReader:
+    """Reads the documents of a Parquet or Arrow IPC file, a record batch at a time.
+
+    This has the same interface as ``data_source_ingest.RecordReader`` (see
+    ``data_source_ingest.Records``), so it can be used with ``ingest``. Positions
+    and offsets are in rows, not bytes: the offset of a record is its row number,
+    and ``position`` is the number of rows read so far (including the skipped
+    ``start`` rows). ``bytes_read`` is the in-memory Arrow size of the rows read,
+    which bounds the size of the write batches.
+
+    With ``keep`` (see ``data_source.projection_tree``), only the kept fields are
+    read: other top level columns aren't decoded at all, and the documents and
+    schema are projected to the kept nested fields.
+    """
+
+    def __init__(
+            self,
+            file_path: t.Union[str, os.PathLike],
+            file_format: str,
+            batch_size: int = 10000,
+            start: int = 0,
+            keep: t.Optional[t.Dict[str, t.Any]] = None):
+        _require_pyarrow()
+        self.file_path = Path(file_path)
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.start = start
+        self.header = None
+        self.bytes_read = 0
+        self.rows_read = 0
+        self.record_offset = start
+        if file_format == "parquet":
+            self._parquet = pq.ParquetFile(self.file_path, memory_map=True)
+            self.arrow_schema = self._parquet.schema_arrow
+            self.num_rows = self._parquet.metadata.num_rows
+        else:
+            self.arrow_schema = self._open_ipc().schema
+            self.num_rows = sum(batch.num_rows for batch in self._ipc_batches())
+        self.keep = keep
+        self.columns: t.Optional[t.List[str]] = None
+        if keep is not None:
+            self.columns = [name for name in self.arrow_schema.names if _document_name(name) in keep]
+            self.arrow_schema = pa.schema([self.arrow_schema.field(name) for name in self.columns])
+        self._cast_schema = pa.schema([f.with_type(bson_type(f.type)) for f in self.arrow_schema])
+        self._names = [_document_name(name) for name in self.arrow_schema.names]
+
+    def _open_ipc(self) -> t.Union['pa.ipc.RecordBatchFileReader', 'pa.ipc.RecordBatchStreamReader']:
+        source = pa.memory_map(str(self.file_path))
+        try:
+            return pa.ipc.open_file(source)
+        except pa.ArrowInvalid:
+            # a stream, e.g. written with pa.ipc.new_stream, is read from the start
+            source.seek(0)
+            return pa.ipc.open_stream(source)
+
+    def _ipc_batches(self) -> t.Iterator['pa.RecordBatch']:
+        """The record batches of an Arrow IPC file or stream, one at a time."""
+        reader = self._open_ipc()
+        if isinstance(reader, pa.ipc.RecordBatchFileReader):
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+        else:
+            yield from reader
+
+    @property
+    def position(self) -> int:
+        """The number of rows before the next record."""
+        return self.start + self.rows_read
+
+    @property
+    def source_position(self) -> int:
+        """Same as ``position``, columnar files aren't read as a byte stream."""
+        return self.position
+
+    def schema(self) -> dict:
+        """The schema of the documents, from the Arrow schema."""
+        fields = [field.with_name(name) for field, name in zip(self.arrow_schema, self._names)]
+        if self.keep is not None:
+            fields = [field.with_type(project_arrow_type(field.type, self.keep[field.name])) for field in fields]
+        return arrow_schema_to_schema(pa.schema(fields))
+
+    def batches(self) -> t.Iterator['pa.RecordBatch']:
+        """The record batches of the file, starting at row ``start``."""
+        skip = self.start
+        if self.file_format == "parquet":
+            metadata = self._parquet.metadata
+            row_groups: t.List[int] = []
+            for i in range(metadata.num_row_groups):
+                rows = metadata.row_group(i).num_rows
+                if skip >= rows and not row_groups:
+                    skip -= rows
+                    continue
+                row_groups.append(i)
+            if not row_groups:
+                return
+            batches = self._parquet.iter_batches(
+                batch_size=self.batch_size, row_groups=row_groups, columns=self.columns)
+        else:
+            batches = self._ipc_batches()
+            if self.columns is not None:
+                batches = (batch.select(self.columns) for batch in batches)
+        for batch in batches:
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            if skip:
+                batch = batch.slice(skip)
+                skip = 0
+            for offset in range(0, batch.num_rows, self.batch_size):
+                yield batch.slice(offset, self.batch_size)
+
+    def __iter__(self) -> t.Iterator[dict]:
+        for batch in self.batches():
+            documents = pa.Table.from_batches([batch]).cast(self._cast_schema).rename_columns(self._names).to_pylist()
+            if self.keep is not None:
+                documents = [project_document(document, self.keep) for document in documents]
+            row_bytes = batch.nbytes / max(batch.num_rows, 1)
+            for document in documents:
+                self.record_offset = self.position
+                self.rows_read += 1
+                self.bytes_read += int(row_bytes)
+                yield document
+
+
+def schema_to_arrow_type(schema: dict) -> 'pa.DataType':
+    """Converts a (generated) schema to the Arrow type for its values.
+
+    Values that don't have a single type (e.g. a field that is sometimes a number,
+    sometimes a string) are exported as JSON text, these get the ``large_string``
+    type so they can be told apart from real strings.
+    """
+    stype = schema.get("type")
+    if isinstance(stype, list):
+        stype = [s for s in stype if s != "null"]
+        if stype == ["integer", "number"] or stype == ["number", "integer"]:
+            return pa.float64()
+        stype = stype[0] if len(stype) == 1 else None
+    if stype == "object":
+        if "properties" not in schema:
+            return pa.large_string()
+        return pa.struct([(key, schema_to_arrow_type(value)) for key, value in schema["properties"].items()])
+    if stype == "array":
+        items = schema.get("items", [])
+        if isinstance(items, dict):
+            items = [items]
+        item_types = [schema_to_arrow_type(item) for item in items]
+        if not item_types:
+            return pa.list_(pa.large_string())
+        if all(item_type == item_types[0] for item_type in item_types):
+            return pa.list_(item_types[0])
+        if all(pa.types.is_struct(item_type) for item_type in item_types):
+            try:
+                merged = pa.unify_schemas([pa.schema(list(item_type)) for item_type in item_types])
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                return pa.list_(pa.large_string())
+            return pa.list_(pa.struct(list(merged)))
+        if all(pa.types.is_integer(i) or pa.types.is_floating(i) for i in item_types):
+            return pa.list_(pa.float64())
+        return pa.list_(pa.large_string())
+    if stype == "integer":
+        return pa.int64()
+    if stype == "number":
+        return pa.float64()
+    if stype == "boolean":
+        return pa.bool_()
+    if stype == "string":
+        if schema.get("format") == "date-time":
+            return pa.timestamp("ms")
+        return pa.string()
+    if stype == "null":
+        return pa.null()
+    return pa.large_string()
+
+
+# the column of an export that keeps what doesn't fit the other columns, as JSON text
+EXTRA_FIELDS_COLUMN = "_extra"
+
+_INT64_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def _fits(value: t.Any, data_type: 'pa.DataType') -> bool:
+    """True if a (non-null, scalar) value can be written to a column of an Arrow type."""
+    types = pa.types
+    if isinstance(value, bool):
+        return types.is_boolean(data_type)
+    if isinstance(value, int):
+        return types.is_floating(data_type) or (types.is_int64(data_type) and value in _INT64_RANGE)
+    if isinstance(value, float):
+        return types.is_floating(data_type)
+    if isinstance(value, str):
+        return types.is_string(data_type)
+    if isinstance(value, datetime):
+        return types.is_timestamp(data_type)
+    return False
+
+
+def _conform(value: t.Any, data_type: 'pa.DataType', extra: t.Dict[str, t.Any], key: str) -> t.Any:
+    """The value to write to a column of an Arrow type.
+
+    Values that are exported as JSON text are turned into text. The schema the
+    columns come from may be a sample, so a value can have another type than its
+    column, or have fields the column doesn't. Such a value (or its extra fields)
+    is put in ``extra`` under ``key`` instead, and the column gets null (or the
+    fields that fit).
+    """
+    if value is None:
+        return None
+    types = pa.types
+    if types.is_large_string(data_type):
+        return value if isinstance(value, str) else json.dumps(value, default=str)
+    if types.is_struct(data_type):
+        if not isinstance(value, dict):
+            extra[key] = value
+            return None
+        nested: t.Dict[str, t.Any] = {}
+        row = {}
+        for i in range(data_type.num_fields):
+            field = data_type.field(i)
+            row[field.name] = _conform(value.get(field.name), field.type, nested, field.name)
+        for name, item in value.items():
+            if name not in row:
+                nested[name] = item
+        if nested:
+            extra[key] = nested
+        return row
+    if types.is_list(data_type):
+        if not isinstance(value, list):
+            extra[key] = value
+            return None
+        mismatched: t.Dict[str, t.Any] = {}
+        items = [_conform(item, data_type.value_type, mismatched, key) for item in value]
+        if mismatched:
+            # lists are kept as a whole
+            extra[key] = value
+            return None
+        return items
+    if _fits(value, data_type):
+        return value
+    extra[key] = value
+    return None
+
+
+def export_parquet(
+        collection: 'Collection',
+        schema: dict,
+        destination: t.Union[str, os.PathLike, t.BinaryIO],
+        batch_size: int = 10000,
+        compression: str = "zstd",
+        on_progress: t.Optional[t.Callable[[int], None]] = None) -> int:
+    """Exports the documents of a data source collection to a Parquet file.
+
+    The documents are written a row group (``batch_size`` documents) at a time,
+    with the columns taken from the data source schema. Fields the schema doesn't
+    have and values that don't fit their column (the schema may come from a
+    sample) are written to the EXTRA_FIELDS_COLUMN column, as a JSON object in
+    the shape of the document.
+
+    Args:
+        collection: The data source collection.
+        schema: The data source schema.
+        destination: A file path or a writable binary file.
+        batch_size: The number of documents per row group.
+        compression: The Parquet compression codec.
+        on_progress: Called with the number of documents written after each row group.
+
+    Returns:
+        The number of documents exported.
+    """
+    _require_pyarrow()
+    row_type = schema_to_arrow_type({**schema, "type": "object"})
+    arrow_schema = pa.schema(list(row_type) + [pa.field(EXTRA_FIELDS_COLUMN, pa.large_string())])
+    count = 0
+    with pq.ParquetWriter(destination, arrow_schema, compression=compression) as writer:
+        batch: t.List[dict] = []
+
+        def _write() -> None:
+            rows = []
+            for document in batch:
+                extra: t.Dict[str, t.Any] = {}
+                row = _conform(document, row_type, extra, EXTRA_FIELDS_COLUMN)
+                row[EXTRA_FIELDS_COLUMN] = json.dumps(extra[EXTRA_FIELDS_COLUMN], default=str) if extra else None
+                rows.append(row)
+            writer.write_table(pa.Table.from_pylist(rows, schema=arrow_schema), row_group_size=batch_size)
+
+        for document in collection.find({}, {"_id": 0}, batch_size=batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                _write()
+                count += len(batch)
+                batch = []
+                if on_progress is not None:
+                    on_progress(count)
+        if batch:
+            _write()
+            count += len(batch)
+            if on_progress is not None:
+                on_progress(count)
+    return count
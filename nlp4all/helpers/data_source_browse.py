@@ -0,0 +1,105 @@
+"""Browsing and exporting the documents of a data source collection.
+
+Pages are selected on ``_id`` (keyset pagination): a page is the documents with
+an ``_id`` after the last one of the previous page, found through the ``_id``
+index. Unlike skip/limit, a page costs the same however far into the
+collection it is. The position is passed around as an opaque cursor string.
+
+The NDJSON export reads the collection in the same way, one page at a time, so
+it needs constant memory and no long lived server cursor.
+"""
+
+from __future__ import annotations
+
+import typing as t
+import base64
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+
+from .data_source_prune import outermost_fields
+
+if t.TYPE_CHECKING:
+    from pymongo.collection import Collection
+
+
+def encode_cursor(last_id: t.Any) -> str:
+    """An opaque, url safe cursor for the ``_id`` of the last document of a page."""
+    return base64.urlsafe_b64encode(json_util.dumps({"_id": last_id}).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> t.Any:
+    """The ``_id`` from ``encode_cursor``.
+
+    Raises:
+        ValueError: If the cursor is not valid.
+    """
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))["_id"]
+    except Exception as exc:
+        raise ValueError(f"Invalid cursor: {cursor}") from exc
+
+
+def field_projection(paths: t.Optional[t.Iterable[t.Sequence[str]]]) -> t.Optional[t.Dict[str, int]]:
+    """The mongo projection for schema paths, None for the whole documents.
+
+    Paths inside another path are left out, see ``outermost_fields``.
+    """
+    if paths is None:
+        return None
+    return {field: 1 for field in outermost_fields(paths)}
+
+
+def browse_page(
+        collection: 'Collection',
+        after: t.Optional[str] = None,
+        limit: int = 50,
+        projection: t.Optional[t.Dict[str, int]] = None) -> t.Tuple[t.List[dict], t.Optional[str]]:
+    """A page of documents, in ``_id`` order.
+
+    Args:
+        collection: The data source collection.
+        after: The cursor of the previous page, None for the first page.
+        limit: The number of documents per page.
+        projection: The fields to return, see ``field_projection``.
+
+    Returns:
+        The documents, and the cursor of the next page (None on the last page).
+    """
+    query = {} if after is None else {"_id": {"$gt": decode_cursor(after)}}
+    # one more than the page, to know whether there's a next page
+    documents = list(collection.find(query, projection).sort("_id", 1).limit(limit + 1))
+    if len(documents) <= limit:
+        return documents, None
+    documents = documents[:limit]
+    return documents, encode_cursor(documents[-1]["_id"])
+
+
+def iter_pages(
+        collection: 'Collection',
+        projection: t.Optional[t.Dict[str, int]] = None,
+        batch_size: int = 1000) -> t.Iterator[t.List[dict]]:
+    """Every document of a collection, in ``_id`` order, ``batch_size`` documents at a time.
+
+    ``_id`` is always returned, it's where the next page starts.
+    """
+    query: t.Dict[str, t.Any] = {}
+    while True:
+        documents = list(collection.find(query, projection).sort("_id", 1).limit(batch_size))
+        if documents:
+            yield documents
+        if len(documents) < batch_size:
+            return
+        query = {"_id": {"$gt": documents[-1]["_id"]}}
+
+
+def ndjson_lines(
+        collection: 'Collection',
+        projection: t.Optional[t.Dict[str, int]] = None,
+        batch_size: int = 1000) -> t.Iterator[bytes]:
+    """The documents of a collection as JSON lines (NDJSON), a page of lines per chunk.
+
+    Mongo types (e.g. ObjectId, dates) use the relaxed extended JSON format.
+    """
+    for page in iter_pages(collection, projection, batch_size):
+        yield "".join(json_util.dumps(document, json_options=RELAXED_JSON_OPTIONS) + "\n"
+                      for document in page).encode("utf-8")
@@ -0,0 +1,149 @@
+"""Indexes of data source collections.
+
+Only the fields that are queried get an index: the filterables of a data source
+(an ascending index each) and its document text field (a text index). Every
+other index is a cost on writes without a use.
+
+The indexes this module creates are named with ``INDEX_PREFIX``. ``IndexManager.sync``
+compares them to the indexes a data source needs, drops the ones that aren't
+needed anymore (e.g. of a removed filterable) and creates the missing ones in a
+single ``create_indexes`` call, so the collection is scanned once.
+"""
+
+from __future__ import annotations
+
+import typing as t
+from concurrent.futures import ThreadPoolExecutor, wait
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+
+from .data_source_prune import mongo_field_path
+
+if t.TYPE_CHECKING:
+    from pymongo.collection import Collection
+
+INDEX_PREFIX = "n4a_"
+TEXT_INDEX_PREFIX = INDEX_PREFIX + "text_"
+
+
+def index_models(
+        filterables: t.Mapping[str, t.Mapping[str, t.Any]],
+        text_path: t.Optional[t.Sequence[str]] = None) -> t.List[IndexModel]:
+    """The indexes a data source needs.
+
+    Args:
+        filterables: The filterables of the data source, name -> ``Filterable.to_dict()``.
+        text_path: The schema path of the document text field, if it is set.
+
+    Returns:
+        An ascending index per filterable, and a text index for the text field.
+    """
+    models = []
+    for name, filterable in filterables.items():
+        field = mongo_field_path(filterable["path"])
+        models.append(IndexModel([(field, ASCENDING)], name=f"{INDEX_PREFIX}{name}"))
+    if text_path:
+        field = mongo_field_path(text_path)
+        models.append(IndexModel([(field, TEXT)], name=f"{TEXT_INDEX_PREFIX}{field}"))
+    return models
+
+
+def _index_key(key: t.Any, weights: t.Optional[t.Mapping[str, t.Any]] = None) -> t.List[t.Tuple[str, t.Any]]:
+    """The key of an index as a list of (field, direction).
+
+    The server reports text indexes by their internal key, the indexed fields
+    are the keys of their weights.
+    """
+    pairs = [(field, direction) for field, direction in (key.items() if isinstance(key, dict) else key)]
+    if weights and ("_fts", TEXT) in pairs:
+        pairs = [(field, TEXT) for field in weights]
+    return pairs
+
+
+class IndexManager:
+    """Keeps the indexes of a data source collection in line with its filterables."""
+
+    def __init__(self, collection: 'Collection', poll_interval: float = 1.0):
+        """Initializes an IndexManager
+
+        Args:
+            collection: The data source collection.
+            poll_interval: Seconds between progress updates while indexes are built.
+        """
+        self.collection = collection
+        self.poll_interval = poll_interval
+
+    def managed(self) -> t.Dict[str, t.List[t.Tuple[str, t.Any]]]:
+        """The indexes on the collection that were created by an IndexManager, name -> key."""
+        return {
+            name: _index_key(info["key"], info.get("weights"))
+            for name, info in self.collection.index_information().items()
+            if name.startswith(INDEX_PREFIX)}
+
+    def plan(self, models: t.Sequence[IndexModel]) -> t.Tuple[t.List[IndexModel], t.List[str]]:
+        """The indexes to create and the (names of) indexes to drop.
+
+        Indexes are replaced when their key changed, e.g. the path of a filterable.
+        """
+        existing = self.managed()
+        wanted = {model.document["name"]: model for model in models}
+        drop = [
+            name for name, key in existing.items()
+            if name not in wanted or _index_key(wanted[name].document["key"]) != key]
+        create = [model for name, model in wanted.items() if name not in existing or name in drop]
+        return create, drop
+
+    def build_progress(self) -> t.Optional[t.Tuple[int, int]]:
+        """(done, total) of the index builds running on the collection, None if unknown."""
+        try:
+            current: t.Mapping[str, t.Any] = self.collection.database.client.admin.command({
+                "currentOp": 1,
+                "ns": self.collection.full_name,
+                "command.createIndexes": {"$exists": True},
+            })
+        except (PyMongoError, NotImplementedError):
+            return None
+        ops = current.get("inprog", [])
+        progress = [op["progress"] for op in ops if "progress" in op]
+        if not progress:
+            return None
+        return sum(p.get("done", 0) for p in progress), sum(p.get("total", 0) for p in progress)
+
+    def sizes(self) -> t.Dict[str, int]:
+        """The size of every index of the collection, in bytes (empty if the server doesn't tell)."""
+        try:
+            stats: t.Mapping[str, t.Any] = self.collection.database.command({"collStats": self.collection.name})
+        except (PyMongoError, NotImplementedError):
+            return {}
+        return dict(stats.get("indexSizes", {}))
+
+    def sync(
+            self,
+            models: t.Sequence[IndexModel],
+            on_progress: t.Optional[t.Callable[[int, int], None]] = None) -> t.Dict[str, t.Any]:
+        """Drops the indexes that aren't needed anymore and creates the missing ones.
+
+        Args:
+            models: The indexes the collection should have, see ``index_models``.
+            on_progress: Called on the calling thread with (done, total) while
+                         the indexes are built, if the server reports progress.
+
+        Returns:
+            The names of the created and dropped indexes, and the index sizes in bytes.
+        """
+        create, drop = self.plan(models)
+        for name in drop:
+            self.collection.drop_index(name)
+        if create:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(self.collection.create_indexes, create)
+                while not wait([future], timeout=self.poll_interval).done:
+                    progress = self.build_progress()
+                    if progress is not None and on_progress is not None:
+                        on_progress(*progress)
+                future.result()
+        return {
+            "created": [model.document["name"] for model in create],
+            "dropped": drop,
+            "sizes": self.sizes(),
+        }
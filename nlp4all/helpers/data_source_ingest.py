@@ -0,0 +1,653 @@
+"""Streaming ingestion engine for data source imports.
+
+An import is split into two stages connected by a bounded queue:
+
+    parse (calling thread) -> queue -> writers (thread pool) -> document collection
+
+The parse stage reads the upload in large byte chunks and turns it into documents,
+which are grouped into size-bounded batches. The writer stage sends each batch
+to ``insert_many(ordered=False)`` from a pool of threads. Because the queue is
+bounded, the parser blocks whenever the writers can't keep up (backpressure), so
+memory use stays flat regardless of the size of the upload.
+"""
+
+from __future__ import annotations
+
+import typing as t
+import os
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import mmap
+import time
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+from pymongo.errors import BulkWriteError
+
+from .data_source import csv_row_to_json, keep_source_id
+
+if t.TYPE_CHECKING:
+    from pymongo.collection import Collection
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+
+# magic bytes at the start of compressed files
+COMPRESSION_MAGIC: t.Dict[str, bytes] = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "xz": b"\xfd7zXZ\x00",
+}
+COMPRESSION_SUFFIXES: t.Dict[str, str] = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".zst": "zstd",
+    ".xz": "xz",
+}
+
+
+def detect_compression(f: t.BinaryIO) -> t.Optional[str]:
+    """Detects the compression of a file from its magic bytes.
+
+    The position of the file is left unchanged.
+
+    Returns:
+        The compression (a key of COMPRESSION_MAGIC), or None if the file isn't compressed.
+    """
+    pos = f.tell()
+    head = f.read(max(len(magic) for magic in COMPRESSION_MAGIC.values()))
+    f.seek(pos)
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def decompress_stream(f: t.BinaryIO, compression: str) -> t.BinaryIO:
+    """Wraps a compressed file in a stream of its decompressed contents.
+
+    Nothing is decompressed up front, data is decompressed as it is read.
+    """
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=f, mode="rb")  # type: ignore
+    if compression == "bz2":
+        return bz2.BZ2File(f, mode="rb")  # type: ignore
+    if compression == "xz":
+        return lzma.LZMAFile(f, mode="rb")  # type: ignore
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd compressed files requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)  # type: ignore
+    raise ValueError(f"Unsupported compression: {compression}")
+
+
+def data_suffix(file_name: t.Union[str, os.PathLike]) -> str:
+    """Gets the (lower case) suffix of a file name, ignoring compression suffixes.
+
+    e.g. "tweets.jsonl.gz" -> ".jsonl"
+    """
+    suffixes = [suffix.lower() for suffix in Path(file_name).suffixes]
+    while suffixes and suffixes[-1] in COMPRESSION_SUFFIXES:
+        suffixes.pop()
+    return suffixes[-1] if suffixes else ""
+
+
+def upload_suffix(file_name: t.Union[str, os.PathLike]) -> str:
+    """Gets the suffixes of a file name that say how it is imported: its data suffix and compression suffixes.
+
+    e.g. "tweets.2023.jsonl.gz" -> ".jsonl.gz"
+    """
+    suffixes = Path(file_name).suffixes
+    end = len(suffixes)
+    while end and suffixes[end - 1].lower() in COMPRESSION_SUFFIXES:
+        end -= 1
+    return "".join(suffixes[max(end - 1, 0):])
+
+
+def unique_upload_name(directory: t.Union[str, os.PathLike], file_name: str) -> str:
+    """Gets a name for an upload that doesn't replace a file in the directory.
+
+    If the name is taken, a timestamp (and a counter, if that is taken too) goes
+    before the suffixes of the upload, so it is still imported the same way,
+    e.g. "tweets.jsonl.gz" -> "tweets_20230101120000.jsonl.gz".
+    """
+    suffix = upload_suffix(file_name)
+    stem = file_name[:len(file_name) - len(suffix)]
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    name = file_name
+    count = 0
+    while os.path.exists(os.path.join(directory, name)):
+        name = f"{stem}_{timestamp}{f'_{count}' if count else ''}{suffix}"
+        count += 1
+    return name
+
+
+class RecordError(ValueError):
+    """A record in an upload could not be parsed.
+
+    Attributes:
+        offset: The byte offset of the start of the record in the file.
+        row: The (1-based) number of the record, not counting a CSV header.
+    """
+
+    def __init__(self, offset: int, row: int, error: Exception):
+        self.offset = offset
+        self.row = row
+        message = str(error)
+        if len(message) > 100:
+            message = message[:100] + "..."
+        super().__init__(f"Invalid record {row} at byte {offset}: {message}")
+
+
+def loads(data: t.Union[bytes, memoryview]) -> t.Any:
+    """Decodes a JSON document from bytes.
+
+    Uses orjson when it is installed, as it decodes straight from the buffer.
+    Anything orjson rejects (e.g. NaN, or integers larger than 64 bits) is
+    retried with the standard library, so the result is always the same.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(bytes(data))
+
+
+class Records(t.Protocol):
+    """The documents ``ingest`` reads, with the position of the reader in its source.
+
+    Implemented by ``RecordReader`` and ``data_source_arrow.ArrowRecordReader``.
+    """
+
+    bytes_read: int
+    rows_read: int
+    record_offset: int
+
+    @property
+    def position(self) -> int:
+        """The position after the last record read."""
+
+    @property
+    def source_position(self) -> int:
+        """The position in the source file, for progress reports."""
+
+    def __iter__(self) -> t.Iterator[dict]:
+        ...
+
+
+class RecordReader:
+    """Reads documents from a CSV or JSON lines upload in large byte chunks.
+
+    Reading starts at the current position of the file, and stops at the end of
+    the file or after ``limit`` bytes.
+
+    When ``f`` is a decompressing stream, ``source`` should be the underlying
+    (compressed) file, so progress can be reported in bytes of the upload. Byte
+    offsets of records are always offsets in the decompressed data.
+
+    For CSV, the first line read is the header, unless ``header`` is given
+    (e.g. when resuming from the middle of a file).
+
+    An ``_id`` field of the upload is renamed to ``data_source.SOURCE_ID_FIELD``.
+
+    Attributes:
+        bytes_read: The number of bytes consumed from the file so far.
+        rows_read: The number of documents produced so far.
+        record_offset: The byte offset in the file of the last record read.
+        header: The CSV header.
+    """
+
+    def __init__(
+            self,
+            f: t.BinaryIO,
+            is_csv: bool,
+            chunk_size: int = 2 ** 20,
+            encoding: str = "utf-8",
+            limit: t.Optional[int] = None,
+            source: t.Optional[t.BinaryIO] = None,
+            header: t.Optional[t.List[str]] = None):
+        self._f = f
+        self._source = source
+        self.header = header
+        self.is_csv = is_csv
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.limit = limit
+        self.start = f.tell()
+        self.bytes_read = 0
+        self.rows_read = 0
+        self.record_offset = self.start
+
+    @property
+    def position(self) -> int:
+        """The byte offset in the file after the last record read."""
+        return self.start + self.bytes_read
+
+    @property
+    def source_position(self) -> int:
+        """The position in the source (compressed) file, in bytes of the upload."""
+        if self._source is None:
+            return self.position
+        return self._source.tell()
+
+    def lines(self) -> t.Iterator[t.Union[bytes, memoryview]]:
+        """Yields the lines of the file, newline included."""
+        remainder = b""
+        remaining = self.limit
+        while remaining is None or remaining > 0:
+            chunk = self._f.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            buf = remainder + chunk if remainder else chunk
+            start = 0
+            while True:
+                end = buf.find(b"\n", start)
+                if end == -1:
+                    break
+                line = buf[start:end + 1]
+                self.bytes_read += len(line)
+                yield line
+                start = end + 1
+            remainder = buf[start:]
+        if remainder:
+            self.bytes_read += len(remainder)
+            yield remainder
+
+    def _csv_records(self) -> t.Iterator[dict]:
+        """Yields documents from CSV rows, the first row is the header."""
+        reader = csv.reader(str(line, self.encoding) for line in self.lines())
+        if self.header is None:
+            self.header = next(reader, None)
+        header = self.header
+        if header is None:
+            return
+        while True:
+            # the reader only pulls the lines it needs, so this is where the row starts
+            offset = self.start + self.bytes_read
+            row = next(reader, None)
+            if row is None:
+                return
+            if not row:
+                continue
+            self.rows_read += 1
+            self.record_offset = offset
+            try:
+                document = keep_source_id(csv_row_to_json(row, header))
+            except ValueError as e:
+                raise RecordError(offset, self.rows_read, e) from e
+            yield document
+
+    def _json_records(self) -> t.Iterator[dict]:
+        """Yields documents from JSON lines."""
+        for line in self.lines():
+            offset = self.start + self.bytes_read - len(line)
+            try:
+                document = loads(line)
+            except ValueError as e:
+                if not bytes(line).strip():
+                    continue
+                raise RecordError(offset, self.rows_read + 1, e) from e
+            self.rows_read += 1
+            self.record_offset = offset
+            yield keep_source_id(document)
+
+    def __iter__(self) -> t.Iterator[dict]:
+        if self.is_csv:
+            return self._csv_records()
+        return self._json_records()
+
+
+class MappedRecordReader(RecordReader):
+    """Reads documents from a memory mapped upload.
+
+    Lines are yielded as memoryview slices of the map, so a line is never copied
+    before it is decoded, and the pages of the file are managed by the OS rather
+    than held in (chunk) buffers. A line is released when the next one is read,
+    so it has to be decoded (or copied) before then.
+    """
+
+    def lines(self) -> t.Iterator[t.Union[bytes, memoryview]]:
+        """Yields the lines of the file, newline included."""
+        size = os.fstat(self._f.fileno()).st_size
+        end = size if self.limit is None else min(size, self.start + self.limit)
+        if end <= self.start:
+            return
+        mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mm)
+        try:
+            pos = self.start
+            while pos < end:
+                nl = mm.find(b"\n", pos, end)
+                line_end = end if nl == -1 else nl + 1
+                line = view[pos:line_end]
+                self.bytes_read += line_end - pos
+                yield line
+                line.release()
+                pos = line_end
+        finally:
+            view.release()
+            try:
+                mm.close()
+            except BufferError:
+                # a consumer still holds a slice, the map is closed when it's collected
+                pass
+
+
+def shard_offsets(file_path: t.Union[str, os.PathLike], shards: int,
+                  chunk_size: int = 2 ** 16) -> t.List[t.Tuple[int, int]]:
+    """Splits a file into (start, end) byte ranges that begin at the start of a line.
+
+    Each boundary is found by seeking to an even split of the file size, and
+    reading forward in chunks to the next newline.
+
+    Args:
+        file_path: The file to split.
+        shards: The (maximum) number of ranges.
+        chunk_size: How much to read at a time when looking for a newline.
+
+    Returns:
+        The byte ranges, empty ranges are left out.
+    """
+    size = os.stat(file_path).st_size
+    bounds = [0]
+    with open(file_path, "rb") as f:
+        for i in range(1, shards):
+            offset = max(size * i // shards, bounds[-1])
+            f.seek(offset)
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    offset = size
+                    break
+                idx = chunk.find(b"\n")
+                if idx != -1:
+                    offset += idx + 1
+                    break
+                offset += len(chunk)
+            bounds.append(offset)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+# mongo error code for inserting a document with an _id that already exists
+DUPLICATE_KEY = 11000
+
+
+def _only_duplicate_keys(error: BulkWriteError) -> bool:
+    """True if all errors of a bulk write are duplicate key errors."""
+    details = error.details or {}
+    if details.get("writeConcernErrors"):
+        return False
+    return all(e.get("code") == DUPLICATE_KEY for e in details.get("writeErrors", []))
+
+
+class BulkWriter:
+    """Writes batches of documents to a collection from a pool of threads.
+
+    Batches are handed over through a bounded queue, ``put`` blocks while the
+    queue is full. The first error raised by a writer is re-raised in the
+    calling thread on the next ``put`` or on ``close``.
+
+    Documents that already exist (duplicate ``_id``) are skipped, so batches can
+    safely be written again, e.g. when an import is resumed.
+
+    Batches can be put with their position in the source (e.g. the byte offset
+    after their last record). Batches complete out of order, ``committed_position``
+    is the position of the last batch for which it and every earlier batch has
+    been written, i.e. the point from which to resume.
+    """
+
+    def __init__(self, collection: 'Collection', writers: int = 4, queue_depth: int = 8):
+        self.collection = collection
+        self.rows_written = 0
+        self.rows_committed = 0
+        self.committed_position: t.Optional[int] = None
+        self._queue: queue.Queue[t.Optional[t.Tuple[int, t.List[dict], t.Optional[int]]]] = queue.Queue(
+            maxsize=max(1, queue_depth))
+        self._next_seq = 0
+        self._committed_seq = 0
+        self._done: t.Dict[int, t.Tuple[t.Optional[int], int]] = {}
+        self._lock = threading.Lock()
+        self._error: t.Optional[BaseException] = None
+        self._threads = [
+            threading.Thread(target=self._work, name=f"nlp4all-writer-{i}", daemon=True)
+            for i in range(max(1, writers))
+        ]
+        self._closed = False
+
+    def __enter__(self) -> 'BulkWriter':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(raise_error=exc is None)
+
+    def start(self) -> None:
+        """Starts the writer threads."""
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self) -> None:
+        """Writer loop, runs until it receives the stop marker."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                # after a failure the rest of the queue is drained without writing
+                # so the parser doesn't block forever on a full queue
+                if self._error is None:
+                    seq, batch, position = item
+                    try:
+                        self.collection.insert_many(batch, ordered=False)
+                    except BulkWriteError as e:
+                        if not _only_duplicate_keys(e):
+                            raise
+                    self._complete(seq, position, len(batch))
+            except BaseException as e:  # pylint: disable=broad-except
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _complete(self, seq: int, position: t.Optional[int], rows: int) -> None:
+        """Marks a batch as written, and advances the committed position."""
+        with self._lock:
+            self.rows_written += rows
+            self._done[seq] = (position, rows)
+            while self._committed_seq in self._done:
+                position, rows = self._done.pop(self._committed_seq)
+                self._committed_seq += 1
+                self.rows_committed += rows
+                if position is not None:
+                    self.committed_position = position
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def put(self, batch: t.List[dict], position: t.Optional[int] = None) -> None:
+        """Queues a batch for writing, blocks while the queue is full."""
+        self._raise_error()
+        seq = self._next_seq
+        self._next_seq += 1
+        self._queue.put((seq, batch, position))
+
+    def close(self, raise_error: bool = True) -> None:
+        """Waits for all queued batches to be written and stops the writers."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if raise_error:
+            self._raise_error()
+
+
+class IngestStats:
+    """Running statistics for an import."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows_read = 0
+        self.rows_written = 0
+        self.bytes_read = 0
+        self.source_position = 0
+        self.rows_committed = 0
+        self.committed_position: t.Optional[int] = None
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the import started."""
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        """Rows written per second since the import started."""
+        elapsed = self.elapsed
+        if elapsed <= 0:
+            return 0.0
+        return self.rows_written / elapsed
+
+
+class ProgressEstimator:
+    """Estimates throughput and time remaining for a byte-based progress.
+
+    Rates are exponential moving averages over the intervals between updates, so
+    the estimate follows changes in speed (e.g. when rows get wider further into
+    a file) without jumping around on every update.
+    """
+
+    def __init__(self, total_bytes: int, smoothing: float = 0.3, bytes_done: int = 0, rows_done: int = 0):
+        self.total_bytes = total_bytes
+        self.smoothing = smoothing
+        self.bytes_done = bytes_done
+        self.rows_done = rows_done
+        self.bytes_per_second: t.Optional[float] = None
+        self.rows_per_second: t.Optional[float] = None
+        self._last = time.monotonic()
+
+    def _smooth(self, current: t.Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return self.smoothing * sample + (1 - self.smoothing) * current
+
+    def update(self, bytes_done: int, rows_done: int, now: t.Optional[float] = None) -> None:
+        """Records the progress so far."""
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._last
+        if elapsed <= 0:
+            return
+        self.bytes_per_second = self._smooth(self.bytes_per_second, (bytes_done - self.bytes_done) / elapsed)
+        self.rows_per_second = self._smooth(self.rows_per_second, (rows_done - self.rows_done) / elapsed)
+        self.bytes_done = bytes_done
+        self.rows_done = rows_done
+        self._last = now
+
+    @property
+    def eta_seconds(self) -> t.Optional[float]:
+        """Estimated seconds until all bytes are processed, None if unknown."""
+        if not self.bytes_per_second:
+            return None
+        return max(self.total_bytes - self.bytes_done, 0) / self.bytes_per_second
+
+
+def ingest(
+        reader: Records,
+        collection: 'Collection',
+        on_batch: t.Optional[t.Callable[[t.List[dict]], None]] = None,
+        on_progress: t.Optional[t.Callable[[IngestStats], None]] = None,
+        batch_size: int = 1000,
+        batch_bytes: int = 8 * 2 ** 20,
+        queue_depth: int = 8,
+        writers: int = 4,
+        progress_every: int = 10000,
+        ids_from_offsets: bool = False) -> IngestStats:
+    """Streams all documents from a reader into a collection.
+
+    With ``ids_from_offsets``, documents get the byte offset of their record
+    as ``_id``. Importing (part of) the same file again then writes the same ids,
+    and rows that were already written are skipped. The readers keep an ``_id``
+    of the upload in another field, so every ``_id`` of the collection is an offset.
+
+    Args:
+        reader: The source of documents.
+        collection: The collection to insert the documents into.
+        on_batch: Called on the calling thread with each batch before it is
+                  queued for writing (e.g. to feed a schema builder).
+        on_progress: Called on the calling thread every ``progress_every`` rows
+                     and once when the import is done.
+        batch_size: Maximum number of documents per ``insert_many``.
+        batch_bytes: Maximum number of (source) bytes per ``insert_many``.
+        queue_depth: Number of batches that can wait for a writer.
+        writers: Number of writer threads.
+        progress_every: How often (in rows) to report progress.
+        ids_from_offsets: Whether to derive document ids from record offsets.
+
+    Returns:
+        The statistics for the import.
+    """
+    stats = IngestStats()
+    next_progress = progress_every
+
+    def _update_stats(writer: BulkWriter) -> None:
+        stats.rows_read = reader.rows_read
+        stats.bytes_read = reader.bytes_read
+        stats.source_position = reader.source_position
+        stats.rows_written = writer.rows_written
+        stats.rows_committed = writer.rows_committed
+        stats.committed_position = writer.committed_position
+
+    with BulkWriter(collection, writers=writers, queue_depth=queue_depth) as writer:
+        batch: t.List[dict] = []
+        offsets: t.List[int] = []
+
+        def _flush() -> None:
+            if on_batch is not None:
+                on_batch(batch)
+            # ids are set after on_batch, they are not part of the data (or its schema)
+            if ids_from_offsets:
+                for document, offset in zip(batch, offsets):
+                    document["_id"] = offset
+            writer.put(batch, reader.position)
+
+        batch_start = reader.bytes_read
+        for document in reader:
+            batch.append(document)
+            offsets.append(reader.record_offset)
+            if len(batch) >= batch_size or reader.bytes_read - batch_start >= batch_bytes:
+                _flush()
+                batch = []
+                offsets = []
+                batch_start = reader.bytes_read
+            if on_progress is not None and reader.rows_read >= next_progress:
+                next_progress += progress_every
+                _update_stats(writer)
+                on_progress(stats)
+        if batch:
+            _flush()
+    _update_stats(writer)
+    if on_progress is not None:
+        on_progress(stats)
+    return stats
@@ -0,0 +1,124 @@
+"""Removing fields from the documents of a data source collection.
+
+All of the fields are removed in a single pass over the collection, with one
+update that uses an aggregation pipeline (``$project`` exclusions). Unlike
+``$unset`` with ``$[]`` positional operators, the pipeline removes fields inside
+arrays of objects without requiring the array to exist in every document, so no
+per path filter (and collection scan) is needed.
+
+Large collections are split into ``_id`` ranges (chunks) that are updated in
+parallel, and progress can be reported per chunk.
+"""
+
+from __future__ import annotations
+
+import typing as t
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+if t.TYPE_CHECKING:
+    from pymongo.collection import Collection
+
+
+def mongo_field_path(path: t.Sequence[str]) -> str:
+    """Converts a schema path to a dotted mongo field path.
+
+    Arrays are left out, as dotted paths reach into arrays of objects in
+    queries and projections, e.g.
+    ("properties", "entities", "properties", "media", "items", "properties", "url")
+    becomes "entities.media.url".
+    """
+    return ".".join(part for part in path if part not in ("properties", "items"))
+
+
+def outermost_fields(paths: t.Iterable[t.Sequence[str]]) -> t.List[str]:
+    """The dotted mongo field paths of schema paths, without the ones inside another.
+
+    A projection can't include (or exclude) both a field and its parent, so
+    e.g. "user.name" is left out when "user" is there.
+    """
+    fields = {mongo_field_path(path) for path in paths}
+    return sorted(
+        field for field in fields
+        if not any(field[:i] in fields for i, char in enumerate(field) if char == "."))
+
+
+def prune_pipeline(paths: t.Iterable[t.Sequence[str]]) -> t.List[dict]:
+    """The update pipeline that removes all of the paths from a document.
+
+    Paths that are inside another removed path are left out, see
+    ``outermost_fields``. ``_id`` can't be removed.
+    """
+    return [{"$project": {field: 0 for field in outermost_fields(paths) if field != "_id"}}]
+
+
+def id_ranges(collection: 'Collection', chunk_size: int) -> t.List[t.Tuple[t.Any, t.Any]]:
+    """Splits a collection into ``_id`` ranges of about ``chunk_size`` documents.
+
+    The bounds are found by the server, each is the ``_id`` ``chunk_size`` entries
+    of the ``_id`` index after the one before. So only the bounds are sent to the
+    client, and the server walks the index once (a ``$bucketAuto`` on ``_id`` would
+    sort every ``_id`` in the pipeline instead). The last range has no upper bound.
+
+    Returns:
+        (lower, upper) bounds, the lower bound is inclusive, the upper exclusive.
+    """
+    bounds: t.List[t.Any] = []
+    while True:
+        document = collection.find_one(
+            {"_id": {"$gte": bounds[-1]}} if bounds else {},
+            {"_id": 1},
+            sort=[("_id", 1)],
+            skip=chunk_size if bounds else 0)
+        if document is None:
+            break
+        bounds.append(document["_id"])
+    return [(lower, upper) for lower, upper in zip(bounds, bounds[1:] + [None])]
+
+
+def _range_filter(lower: t.Any, upper: t.Any) -> dict:
+    if lower is None:
+        return {}
+    if upper is None:
+        return {"_id": {"$gte": lower}}
+    return {"_id": {"$gte": lower, "$lt": upper}}
+
+
+def prune_collection(
+        collection: 'Collection',
+        paths: t.Iterable[t.Tuple[str, ...]],
+        chunk_size: t.Optional[int] = None,
+        workers: int = 1,
+        on_chunk: t.Optional[t.Callable[[int, int, int], None]] = None) -> int:
+    """Removes schema paths from every document of a collection.
+
+    Args:
+        collection: The data source collection.
+        paths: The schema paths to remove, e.g. from ``minimum_paths_for_deletion``.
+        chunk_size: Split collections with more documents than this into
+                    ``_id`` ranges of this size. None updates the collection at once.
+        workers: The number of chunks updated at the same time.
+        on_chunk: Called on the calling thread after each chunk with the number
+                  of chunks done, the total number of chunks and the number of
+                  documents modified so far.
+
+    Returns:
+        The number of documents modified.
+    """
+    pipeline = prune_pipeline(paths)
+    if not pipeline[0]["$project"]:
+        return 0
+    ranges: t.List[t.Tuple[t.Any, t.Any]] = [(None, None)]
+    if chunk_size is not None and collection.estimated_document_count() > chunk_size:
+        ranges = id_ranges(collection, chunk_size) or ranges
+
+    def _prune(lower: t.Any, upper: t.Any) -> int:
+        return collection.update_many(_range_filter(lower, upper), pipeline).modified_count
+
+    modified = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as executor:
+        futures = [executor.submit(_prune, lower, upper) for lower, upper in ranges]
+        for done, future in enumerate(as_completed(futures), start=1):
+            modified += future.result()
+            if on_chunk is not None:
+                on_chunk(done, len(ranges), modified)
+    return modified
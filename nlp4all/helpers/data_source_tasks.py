@@ -1,44 +1,386 @@
 """Celery background tasks for data sources."""
 
+import itertools
 import logging
 import traceback
 import typing as t
-import json
-import csv
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
+import billiard
 from celery import shared_task, Task
 from .. import db, conf, docdb
 from ..models import DataSourceModel, DataModel, BackgroundTaskModel
 from ..database import BackgroundTaskStatus
-from sqlalchemy import select
-from sqlalchemy.orm import scoped_session
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, scoped_session
+from .data_source_arrow import ArrowRecordReader, columnar_format, export_parquet
+from .data_source_indexes import IndexManager, index_models
+from .data_source_ingest import (
+    RecordReader,
+    MappedRecordReader,
+    IngestStats,
+    ProgressEstimator,
+    data_suffix,
+    decompress_stream,
+    detect_compression,
+    ingest,
+    shard_offsets
+)
+from .data_source_prune import mongo_field_path, prune_collection
 from .data_source import (
-    csv_row_to_json,
-    generate_schema,
+    coerce_csv_batch,
+    project_document,
+    projection_tree,
+    infer_csv_types,
+    merge_schemas,
+    N4ASchemaBuilder,
+    SchemaSampler,
     schema_builder,
     remove_paths_from_schema,
-    minimum_paths_for_deletion,
-    schema_path_to_jsonb_path,
-    schema_aliased_path_dict
+    minimum_paths_for_deletion
 )
 
 
-def buf_count_newlines_gen(fname):
-    def _make_gen(reader):
-        while True:
-            b = reader(2 ** 16)
-            if not b:
-                break
-            yield b
+def _record_progress(task: BackgroundTaskModel, estimator: ProgressEstimator) -> None:
+    """Stores the byte progress and the estimates of an import on its task, and renews its lease."""
+    task.heartbeat_at = datetime.utcnow()
+    task.current_step = estimator.bytes_done
+    task.rows_processed = estimator.rows_done
+    task.rows_per_second = estimator.rows_per_second
+    task.eta_seconds = estimator.eta_seconds
+
+
+def _record_reader(
+        f: t.BinaryIO,
+        is_csv: bool,
+        limit: t.Optional[int] = None,
+        header: t.Optional[t.List[str]] = None) -> RecordReader:
+    """The record reader for an import, depending on DATA_IMPORT_MMAP."""
+    reader_class = MappedRecordReader if conf.DATA_IMPORT_MMAP else RecordReader
+    return reader_class(f, is_csv, chunk_size=conf.DATA_IMPORT_CHUNK_SIZE, limit=limit, header=header)
+
+
+def _partial_schema(builder: t.Union[SchemaSampler, N4ASchemaBuilder]) -> dict:
+    """The schema of the documents added to a builder so far."""
+    if isinstance(builder, SchemaSampler):
+        return builder.partial_schema()
+    return builder.to_schema()
+
+
+def _import_checkpoint(ds: DataSourceModel, file_path: Path) -> t.Optional[t.Dict[str, t.Any]]:
+    """The last checkpoint of an interrupted import of this upload, if any."""
+    checkpoint = (ds.meta or {}).get("import_checkpoint")
+    if checkpoint is None:
+        return None
+    if checkpoint.get("filename") != ds.filename or checkpoint.get("size") != file_path.stat().st_size:
+        return None
+    return checkpoint
+
+
+def _save_import_checkpoint(
+        ds: DataSourceModel,
+        file_path: Path,
+        stats: IngestStats,
+        rows: int,
+        schema: t.Optional[dict],
+        header: t.Optional[t.List[str]],
+        column_types: t.Optional[t.Dict[str, str]] = None) -> None:
+    """Stores the point an import can be resumed from, the caller commits.
+
+    Everything before ``stats.committed_position`` has been written, so a resumed
+    import continues from there with the partial schema built so far.
+    """
+    if ds.meta is None:
+        ds.meta = {}
+    ds.meta["import_checkpoint"] = {
+        "filename": ds.filename,
+        "size": file_path.stat().st_size,
+        "offset": stats.committed_position,
+        "source_position": stats.source_position,
+        "rows": rows,
+        "header": header,
+        "column_types": column_types,
+        "schema": schema,
+    }
+
+
+def _skip(f: t.BinaryIO, n: int) -> None:
+    """Reads and discards n bytes of a stream that can't seek (e.g. decompressing)."""
+    while n > 0:
+        chunk = f.read(min(n, conf.DATA_IMPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        n -= len(chunk)
+
+
+def _sample_csv_types(file_path: Path, compression: t.Optional[str] = None) -> t.Dict[str, str]:
+    """Infers the column types of a CSV upload from its first DATA_IMPORT_CSV_TYPE_SAMPLE rows."""
+    with file_path.open("rb") as f:
+        stream = f if compression is None else decompress_stream(f, compression)
+        reader = RecordReader(stream, True, chunk_size=conf.DATA_IMPORT_CHUNK_SIZE)
+        return infer_csv_types(itertools.islice(reader, conf.DATA_IMPORT_CSV_TYPE_SAMPLE))
+
+
+def _import_schema_builder() -> t.Union[SchemaSampler, N4ASchemaBuilder]:
+    """The schema builder for an import, depending on DATA_IMPORT_SCHEMA_MODE."""
+    builder = schema_builder()
+    if conf.DATA_IMPORT_SCHEMA_MODE == "sample":
+        return SchemaSampler(
+            builder,
+            head=conf.DATA_IMPORT_SCHEMA_HEAD,
+            reservoir=conf.DATA_IMPORT_SCHEMA_RESERVOIR)
+    return builder
+
+
+def _ingest_options() -> t.Dict[str, t.Any]:
+    """The configured options for ``data_source_ingest.ingest``."""
+    return {
+        "batch_size": conf.DATA_IMPORT_BATCH_SIZE,
+        "batch_bytes": conf.DATA_IMPORT_BATCH_BYTES,
+        "queue_depth": conf.DATA_IMPORT_QUEUE_DEPTH,
+        "writers": conf.DATA_IMPORT_WRITERS,
+        "progress_every": conf.DATA_IMPORT_PROGRESS_ROWS,
+        "ids_from_offsets": True,
+    }
+
+
+def _project_batch(batch: t.List[dict], keep: t.Optional[t.Dict[str, t.Any]]) -> None:
+    """Replaces the documents of a batch with their projections, in place."""
+    if keep is not None:
+        batch[:] = [project_document(document, keep) for document in batch]
+
 
-    with open(fname, "rb") as f:
-        count = sum(buf.count(b"\n") for buf in _make_gen(f.raw.read))
-    return count
+def _projection(ds: DataSourceModel, fields: t.Optional[t.Collection[str]]) -> t.Optional[t.Dict[str, t.Any]]:
+    """The projection tree for the selected fields of a data source, None to keep everything."""
+    if fields is None:
+        return None
+    return projection_tree(mongo_field_path(ds.aliased_path(field)) for field in fields)
 
 
-def load_data_file(ds: DataSourceModel) -> None:
-    """Load the data file."""
+# shared (rows, bytes) counters for the processes of a sharded import
+_shard_progress: t.Optional[t.Tuple[t.Any, t.Any]] = None
 
+
+def _init_shard_process(rows: t.Any, nbytes: t.Any) -> None:
+    """Set up a worker process for a sharded import."""
+    global _shard_progress  # pylint: disable=global-statement
+    _shard_progress = (rows, nbytes)
+    # the parent's client must not be used after a fork
+    docdb.reconnect()
+
+
+def import_shard(
+        file_path: str,
+        start: int,
+        end: int,
+        collection_name: str,
+        keep: t.Optional[t.Dict[str, t.Any]] = None) -> t.Dict[str, t.Any]:
+    """Import a byte range of a JSON lines upload.
+
+    This runs in a worker process of a sharded import. With ``keep``, only the
+    fields in the projection tree are written.
+
+    Returns:
+        The (partial) schema of the shard and the number of rows written.
+    """
+    builder = _import_schema_builder()
+    reported = [0, 0]
+
+    def _add_to_schema(batch: t.List[dict]) -> None:
+        _project_batch(batch, keep)
+        for item in batch:
+            builder.add_object(item)
+
+    def _report_progress(stats: IngestStats) -> None:
+        if _shard_progress is None:
+            return
+        rows, nbytes = _shard_progress
+        with rows.get_lock():
+            rows.value += stats.rows_written - reported[0]
+        with nbytes.get_lock():
+            nbytes.value += stats.bytes_read - reported[1]
+        reported[0] = stats.rows_written
+        reported[1] = stats.bytes_read
+
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        reader = _record_reader(f, False, limit=end - start)
+        stats = ingest(
+            reader,
+            docdb.get_collection(collection_name),
+            on_batch=_add_to_schema,
+            on_progress=_report_progress,
+            **_ingest_options())
+    return {
+        "schema": builder.to_schema() if stats.rows_read > 0 else None,
+        "rows": stats.rows_written,
+    }
+
+
+def _load_shards(
+        ds: DataSourceModel,
+        file_path: Path,
+        keep: t.Optional[t.Dict[str, t.Any]] = None) -> t.Tuple[t.Optional[dict], int]:
+    """Import a JSON lines upload with a process per byte range (shard).
+
+    The shards are newline aligned, so every line is parsed by exactly one process.
+    Each process builds the schema of its shard, and the partial schemas are merged.
+    """
+    task = ds.task
+    session: scoped_session = db.session
+    shards = shard_offsets(file_path, conf.DATA_IMPORT_SHARDS)
+    rows = billiard.Value("l", 0)
+    nbytes = billiard.Value("l", 0)
+    estimator = ProgressEstimator(task.total_steps)
+    with billiard.Pool(
+            processes=min(conf.DATA_IMPORT_SHARDS, len(shards)),
+            initializer=_init_shard_process,
+            initargs=(rows, nbytes)) as pool:
+        # a job per shard: billiard only marks the results of a job consumed for its first
+        # worker, the other workers of a multi-chunk map wait 30s for it before they exit
+        results = [
+            pool.apply_async(import_shard, (str(file_path), start, end, ds.collection_name, keep))
+            for start, end in shards]
+        while not all(result.ready() for result in results):
+            next(result for result in results if not result.ready()).wait(conf.DATA_IMPORT_PROGRESS_INTERVAL)
+            estimator.update(nbytes.value, rows.value)
+            _record_progress(task, estimator)
+            session.commit()
+        partials = [result.get() for result in results]
+        pool.close()
+        pool.join()
+    rows_written = sum(partial["rows"] for partial in partials)
+    estimator.update(task.total_steps, rows_written)
+    _record_progress(task, estimator)
+    session.commit()
+    schemas = [partial["schema"] for partial in partials if partial["schema"] is not None]
+    return (merge_schemas(schemas) if schemas else None), rows_written
+
+
+def _load_stream(
+        ds: DataSourceModel,
+        file_path: Path,
+        is_csv: bool,
+        compression: t.Optional[str] = None,
+        keep: t.Optional[t.Dict[str, t.Any]] = None) -> t.Tuple[t.Optional[dict], int]:
+    """Import an upload in the current process.
+
+    Compressed uploads are decompressed while they are read. Every
+    DATA_IMPORT_CHECKPOINT_INTERVAL seconds the import stores a checkpoint,
+    and if there is one for this upload the import resumes from it.
+    With DATA_IMPORT_CSV_TYPES, CSV values are converted to the column types
+    inferred from the first rows, so the schema (and indexes) get real types.
+    """
+    session: scoped_session = db.session
+    task = ds.task
+    builder = _import_schema_builder()
+    offset, source_position, rows_before, header = 0, 0, 0, None
+    column_types: t.Optional[t.Dict[str, str]] = None
+    checkpoint = _import_checkpoint(ds, file_path)
+    if checkpoint is not None:
+        logging.info("Resuming import of %s from byte %s", ds.filename, checkpoint["offset"])
+        offset = checkpoint["offset"]
+        source_position = checkpoint["source_position"]
+        rows_before = checkpoint["rows"]
+        header = checkpoint["header"]
+        column_types = checkpoint.get("column_types")
+        if checkpoint["schema"] is not None:
+            builder.add_schema(checkpoint["schema"])
+    elif is_csv and conf.DATA_IMPORT_CSV_TYPES:
+        column_types = _sample_csv_types(file_path, compression)
+    estimator = ProgressEstimator(task.total_steps, bytes_done=source_position, rows_done=rows_before)
+    last_checkpoint = time.monotonic()
+
+    def _add_to_schema(batch: t.List[dict]) -> None:
+        if column_types:
+            coerce_csv_batch(batch, column_types)
+        _project_batch(batch, keep)
+        for item in batch:
+            builder.add_object(item)
+
+    def _report_progress(stats: IngestStats) -> None:
+        nonlocal last_checkpoint
+        estimator.update(stats.source_position, rows_before + stats.rows_read)
+        _record_progress(task, estimator)
+        due = time.monotonic() - last_checkpoint >= conf.DATA_IMPORT_CHECKPOINT_INTERVAL
+        if due and stats.committed_position is not None:
+            _save_import_checkpoint(
+                ds, file_path, stats, rows_before + stats.rows_committed, _partial_schema(builder), reader.header,
+                column_types)
+            last_checkpoint = time.monotonic()
+        session.commit()
+
+    with file_path.open("rb") as f:
+        if compression is None:
+            f.seek(offset)
+            reader = _record_reader(f, is_csv, header=header)
+        else:
+            stream = decompress_stream(f, compression)
+            _skip(stream, offset)
+            reader = RecordReader(
+                stream,
+                is_csv,
+                chunk_size=conf.DATA_IMPORT_CHUNK_SIZE,
+                source=f,
+                header=header)
+        stats = ingest(
+            reader,
+            docdb.get_collection(ds.collection_name),
+            on_batch=_add_to_schema,
+            on_progress=_report_progress,
+            **_ingest_options())
+    if stats.rows_read == 0 and checkpoint is None:
+        return None, 0
+    return builder.to_schema(), rows_before + stats.rows_written
+
+
+def _load_columnar(
+        ds: DataSourceModel,
+        file_path: Path,
+        file_format: str,
+        keep: t.Optional[t.Dict[str, t.Any]] = None) -> t.Tuple[t.Optional[dict], int]:
+    """Import a Parquet or Arrow IPC upload.
+
+    The schema comes from the Arrow schema of the file, and progress and
+    checkpoints are in rows rather than bytes.
+    """
+    session: scoped_session = db.session
+    task = ds.task
+    checkpoint = _import_checkpoint(ds, file_path)
+    start = checkpoint["offset"] if checkpoint is not None else 0
+    reader = ArrowRecordReader(
+        file_path, file_format, batch_size=conf.DATA_IMPORT_BATCH_SIZE, start=start, keep=keep)
+    task.total_steps = reader.num_rows
+    schema = reader.schema()
+    estimator = ProgressEstimator(task.total_steps, bytes_done=start, rows_done=start)
+    last_checkpoint = time.monotonic()
+
+    def _report_progress(stats: IngestStats) -> None:
+        nonlocal last_checkpoint
+        estimator.update(stats.source_position, stats.source_position)
+        _record_progress(task, estimator)
+        due = time.monotonic() - last_checkpoint >= conf.DATA_IMPORT_CHECKPOINT_INTERVAL
+        if due and stats.committed_position is not None:
+            _save_import_checkpoint(ds, file_path, stats, stats.committed_position, None, None)
+            last_checkpoint = time.monotonic()
+        session.commit()
+
+    stats = ingest(
+        reader,
+        docdb.get_collection(ds.collection_name),
+        on_progress=_report_progress,
+        **_ingest_options())
+    return schema, start + stats.rows_written
+
+
+def _upload(ds: DataSourceModel) -> t.Tuple[Path, t.Optional[str], bool, t.Optional[str]]:
+    """The uploaded file of a data source and how to read it.
+
+    Returns:
+        The path of the file, its columnar format (None for CSV/JSON), whether
+        it is CSV and its compression.
+    """
     file_path = Path(
         conf.DATA_UPLOAD_DIR,
         ds.filename)
@@ -46,70 +388,96 @@ def load_data_file(ds: DataSourceModel) -> None:
     if not file_path.exists():
         raise RuntimeError("File not found")
 
-    if file_path.suffix.lower() not in [".csv", ".tsv", ".txt", ".json"]:
+    file_format = columnar_format(file_path)
+    if file_format is not None:
+        return file_path, file_format, False, None
+
+    suffix = data_suffix(file_path)
+    if suffix not in [".csv", ".tsv", ".txt", ".json", ".jsonl", ".ndjson"]:
         raise RuntimeError("Unsupported file type")
-    # if file_path.suffix.lower() in [".csv", ".tsv", ".txt"]:
-    #     data = csv_file_to_json(file_path)
-    # elif file_path.suffix.lower() == ".json":
-    #     data = json.load(file_path.open())
-    # else:
-    #     raise RuntimeError("Unsupported file type")
-
-    # schema = generate_schema(data)
-    # ds.schema = schema
-    is_csv = False if file_path.suffix.lower() == ".json" else True
-    data_processed = 0
-    ds.task.total_steps = buf_count_newlines_gen(str(file_path))
-    # @TODO: consider using a bulk insert here
-    builder = schema_builder()
-    f = file_path.open()
-    schema = None
-    if is_csv:
-        reader = csv.reader(f)
-        header = next(reader)
-        data_processed += 1
+
+    with file_path.open("rb") as f:
+        compression = detect_compression(f)
+    return file_path, None, suffix in [".csv", ".tsv", ".txt"], compression
+
+
+def discover_data_file(ds: DataSourceModel) -> None:
+    """Generate the schema of an upload from a sample, without importing it.
+
+    This is the first phase of a two phase import (DATA_IMPORT_TWO_PHASE). The
+    schema is generated from the first DATA_IMPORT_DISCOVERY_ROWS rows (or taken
+    from the Arrow schema), which is enough for the user to select the fields
+    to keep. The upload is kept for ``load_data_file``, which then only writes
+    the selected fields.
+    """
+    file_path, file_format, is_csv, compression = _upload(ds)
+    if file_format is not None:
+        schema: t.Optional[dict] = ArrowRecordReader(file_path, file_format).schema()
     else:
-        reader = f  # type: ignore
+        builder = schema_builder()
+        column_types = _sample_csv_types(file_path, compression) if is_csv and conf.DATA_IMPORT_CSV_TYPES else None
+        with file_path.open("rb") as f:
+            stream = f if compression is None else decompress_stream(f, compression)
+            reader = RecordReader(stream, is_csv, chunk_size=conf.DATA_IMPORT_CHUNK_SIZE)
+            sample = list(itertools.islice(reader, conf.DATA_IMPORT_DISCOVERY_ROWS))
+        if column_types:
+            coerce_csv_batch(sample, column_types)
+        for document in sample:
+            builder.add_object(document)
+        schema = builder.to_schema() if sample else None
+    if schema is not None:
+        ds.schema = schema
+        ds.aliased_paths = ds.path_aliases_from_schema()
+    if ds.meta is None:
+        ds.meta = {}
+    ds.meta["import_phase"] = "discovered"
+    db.session.commit()
+
+
+def load_data_file(ds: DataSourceModel, fields: t.Optional[t.Collection[str]] = None) -> None:
+    """Load the data file.
+
+    The file is streamed into the data source collection, see
+    ``data_source_ingest`` for how parsing and writing are pipelined.
+    Large JSON lines files are split into shards that are imported
+    in parallel processes, see ``DATA_IMPORT_SHARDS``.
+    Compressed files (gzip, bz2, xz, zstd) are detected from their magic
+    bytes and decompressed as a stream, e.g. "tweets.jsonl.gz".
+    Parquet and Arrow IPC files are read a record batch at a time, see
+    ``data_source_arrow``.
+
+    Args:
+        ds: The data source.
+        fields: The (aliased) fields to import, from the schema generated by
+                ``discover_data_file``. Other fields are dropped before the
+                documents are written. None imports everything.
+    """
+    file_path, file_format, is_csv, compression = _upload(ds)
+    keep = _projection(ds, fields)
     session: scoped_session = db.session
     af = session.autoflush
     session.autoflush = False
-    task = ds.task
-    ds_collection = docdb.get_collection(ds.collection_name)
-    # session.expire(task)
-    process_every = 100
-    update_every = 1000
-    data_items = []
-    for data_item in reader:
-        if is_csv:
-            data_item = csv_row_to_json(data_item, header)  # type: ignore
+
+    if file_format is not None:
+        schema, _ = _load_columnar(ds, file_path, file_format, keep)
+    else:
+        # progress is tracked in bytes of the upload, so it doesn't need a pre-scan
+        ds.task.total_steps = file_path.stat().st_size
+        # CSV can't be sharded safely, quoted fields may contain newlines,
+        # and compressed files can't be split at byte offsets
+        shardable = not is_csv and compression is None and conf.DATA_IMPORT_SHARDS > 1
+        if shardable and file_path.stat().st_size >= conf.DATA_IMPORT_SHARD_MIN_BYTES:
+            schema, _ = _load_shards(ds, file_path, keep)
         else:
-            data_item = json.loads(data_item)  # type: ignore
-        # data_model = DataModel(
-        #     data_source=ds,
-        #     document=data_item
-        # )
-
-        # session.add(data_model)
-        data_processed += 1
-        data_items.append(data_item)
-        if data_processed % process_every == 0:
-            schema = generate_schema(data_items, builder)  # type: ignore
-            ds_collection.insert_many(data_items)
-            data_items = []
-        if data_processed % update_every == 0:
-            task.current_step = data_processed
-            session.commit()
-    if len(data_items) > 0:
-        schema = generate_schema(data_items, builder)  # type: ignore
-        ds_collection.insert_many(data_items)
-        task.current_step = data_processed
-        session.commit()
+            schema, _ = _load_stream(ds, file_path, is_csv, compression, keep)
 
     if schema is not None:
         ds.schema = schema
         ds.aliased_paths = ds.path_aliases_from_schema()
-
-    f.close()
+    if ds.meta is not None:
+        ds.meta.pop("import_checkpoint", None)
+        ds.meta.pop("import_phase", None)
+    session.commit()
 
     # delete the file
     file_path.unlink()
@@ -136,17 +504,54 @@ def wait_for_data_source(data_source_id: int, task_id: str) -> t.Tuple[DataSourc
     return data_source, task
 
 
-@shared_task(ignore_result=True, bind=True)
-def process_data_source(self: Task, data_source_id: int) -> None:
-    """Process a data source."""
+def _lease_expired(task: BackgroundTaskModel) -> bool:
+    """True if the worker running a started task hasn't reported progress for DATA_IMPORT_LEASE_TIMEOUT."""
+    if task.heartbeat_at is None:
+        return True
+    return datetime.utcnow() - task.heartbeat_at >= timedelta(seconds=conf.DATA_IMPORT_LEASE_TIMEOUT)
+
+
+def _claim_task(
+        celery_task: Task,
+        data_source_id: int) -> t.Optional[t.Tuple[DataSourceModel, BackgroundTaskModel]]:
+    """Gets the data source and the (started) task for an import.
+
+    If the task was started before, it was delivered again: either the worker
+    running it died, or the broker gave up waiting for the acknowledgement
+    (RabbitMQ's consumer_timeout) while the import is still running. The
+    worker renews a lease on the task with every progress update, the import
+    is only taken over (and resumed from its last checkpoint) once the lease
+    has expired. Until then the task is retried after DATA_IMPORT_LEASE_TIMEOUT.
+
+    Returns:
+        The data source and the task, or None if the task shouldn't run.
+    """
+    task_id = celery_task.request.id
     data_source: t.Union[DataSourceModel, None] = None
+    task = db.session.query(BackgroundTaskModel).filter_by(task_id=task_id).first()
+    if task is not None and task.task_status in (BackgroundTaskStatus.SUCCESS, BackgroundTaskStatus.FAILURE):
+        # delivered again after it finished
+        return None
+    if task is not None and task.task_status == BackgroundTaskStatus.STARTED:
+        if not _lease_expired(task):
+            raise celery_task.retry(countdown=conf.DATA_IMPORT_LEASE_TIMEOUT)
+        data_source = db.session.query(DataSourceModel).filter_by(id=data_source_id).first()
+        if data_source is None:
+            task.task_status = BackgroundTaskStatus.FAILURE
+            task.status_message = "Unable to find data source with id: " + str(data_source_id)
+            db.session.commit()
+            return None
+        logging.info("Taking over import of data source %s from task %s", data_source_id, task_id)
+        task.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+        return data_source, task
     try:
-        data_source, task = wait_for_data_source(data_source_id, self.request.id)
+        data_source, task = wait_for_data_source(data_source_id, task_id)
     except Exception as e:
-        task = db.session.query(BackgroundTaskModel).filter_by(task_id=self.request.id).first()
+        task = db.session.query(BackgroundTaskModel).filter_by(task_id=task_id).first()
         if task is None:
             task = BackgroundTaskModel(
-                task_id=self.request.id,
+                task_id=task_id,
             )
             db.session.add(task)
         task.task_status = BackgroundTaskStatus.FAILURE
@@ -155,24 +560,104 @@ def process_data_source(self: Task, data_source_id: int) -> None:
         if data_source is not None:
             data_source.task = task
             db.session.commit()
-        return
+        return None
     if task.task_status != BackgroundTaskStatus.PENDING:
-        return
+        return None
     task.task_status = BackgroundTaskStatus.STARTED
+    task.heartbeat_at = datetime.utcnow()
     db.session.commit()
+    return data_source, task
+
+
+def _import_failed(data_source: DataSourceModel, task: BackgroundTaskModel, error: Exception) -> None:
+    """Marks an import as failed and removes the upload, the caller commits."""
+    task.task_status = BackgroundTaskStatus.FAILURE
+    task.status_message = str(error)
+    # delete all data items
+    Path(conf.DATA_UPLOAD_DIR, data_source.filename).unlink(missing_ok=True)
+    db.session.query(DataModel).filter(
+        DataModel.data_source_id == data_source.id).delete()
+
+
+def _build_indexes(data_source: DataSourceModel, task: BackgroundTaskModel) -> None:
+    """Builds (and drops) the indexes of the filterables and text field of a data source, the caller commits.
+
+    The build progress is reported on the task, the report is kept in the
+    data source meta (see ``DataSourceModel.index_report``).
+    """
+    sess: scoped_session = db.session
+    meta = data_source.meta or {}
+
+    def _report_progress(done: int, total: int) -> None:
+        task.heartbeat_at = datetime.utcnow()
+        task.current_step = done
+        task.total_steps = total
+        sess.commit()
+
     try:
-        load_data_file(data_source)
-        task.task_status = BackgroundTaskStatus.SUCCESS
-        task.status_message = "Data source processed successfully"
+        manager = IndexManager(docdb.get_collection(data_source.collection_name), conf.DATA_INDEX_POLL_INTERVAL)
+        report = manager.sync(
+            index_models(meta.get('filterables', {}), meta.get('document_text_path')),
+            on_progress=_report_progress)
+        data_source.meta = {**meta, 'indexes': report}
+        logging.info("Indexes of data source %s: created %s, dropped %s, sizes %s",
+                     data_source.id, report["created"], report["dropped"], report["sizes"])
     except Exception as e:
+        logging.info("Error building indexes: " + str(e))
+        logging.info(traceback.format_exc())
         task.task_status = BackgroundTaskStatus.FAILURE
         task.status_message = str(e)
-        # delete all data items
-        filename = Path(conf.DATA_UPLOAD_DIR, data_source.filename)
-        if filename.exists():
-            filename.unlink()
-        db.session.query(DataModel).filter(
-            DataModel.data_source_id == data_source_id).delete()
+
+
+@shared_task(ignore_result=True, bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None)
+def process_data_source(self: Task, data_source_id: int) -> None:
+    """Process a data source.
+
+    The task is acknowledged late, so if the worker running it dies the task is
+    delivered again, and the import resumes from its last checkpoint (see ``_claim_task``).
+
+    With DATA_IMPORT_TWO_PHASE, this only discovers the schema of the upload,
+    and ``import_data_source`` imports the fields the user selects.
+    """
+    claimed = _claim_task(self, data_source_id)
+    if claimed is None:
+        return
+    data_source, task = claimed
+    try:
+        if conf.DATA_IMPORT_TWO_PHASE:
+            discover_data_file(data_source)
+        else:
+            load_data_file(data_source)
+        task.task_status = BackgroundTaskStatus.SUCCESS
+        task.status_message = "Data source processed successfully"
+    except Exception as e:
+        _import_failed(data_source, task, e)
+    db.session.commit()
+
+
+@shared_task(ignore_result=True, bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None)
+def import_data_source(self: Task, data_source_id: int, selected_fields: t.Collection[str]) -> None:
+    """Import the selected fields of a data source.
+
+    This is the second phase of a two phase import, after ``process_data_source``
+    discovered the schema. Only the selected fields are written, so nothing has
+    to be pruned afterwards.
+    """
+    claimed = _claim_task(self, data_source_id)
+    if claimed is None:
+        return
+    data_source, task = claimed
+    try:
+        load_data_file(data_source, selected_fields)
+        task.task_status = BackgroundTaskStatus.SUCCESS
+        task.status_message = "Data source imported successfully"
+    except Exception as e:
+        logging.info("Error importing data source: " + str(e))
+        logging.info(traceback.format_exc())
+        _import_failed(data_source, task, e)
+        db.session.commit()
+        return
+    _build_indexes(data_source, task)
     db.session.commit()
 
 
@@ -198,21 +683,21 @@ def prune_data_source(self: Task, data_source_id: int, selected_fields: t.Collec
     logging.info("Paths to remove: " + str(paths_to_remove))
 
     ds_collection = docdb.get_collection(data_source.collection_name)
-    update_count = 0
-    update_every = 1
+
+    def _report_chunk(done: int, total: int, modified: int) -> None:
+        task.current_step = done
+        task.total_steps = total
+        task.rows_processed = modified
+        sess.commit()
+        logging.info("Pruned chunk %s of %s", done, total)
+
     try:
-        for path, path_tuple in paths_to_remove.items():
-            logging.info("Removing path: " + path)
-            jsonb_path = schema_path_to_jsonb_path(path_tuple)
-            result = ds_collection.update_many(
-                {path: {"$exists": True}},
-                {"$unset": {jsonb_path: ""}}
-            )
-            update_count += result.modified_count
-            if update_count % update_every == 0:
-                task.current_step = update_count
-                sess.commit()
-            logging.info("Removed path: " + path)
+        prune_collection(
+            ds_collection,
+            paths_to_remove.values(),
+            chunk_size=conf.DATA_PRUNE_CHUNK_SIZE,
+            workers=conf.DATA_PRUNE_WORKERS,
+            on_chunk=_report_chunk)
         task.status_message = "Data source pruned successfully"
         task.task_status = BackgroundTaskStatus.SUCCESS
         data_source.schema = remove_paths_from_schema(data_source.schema, paths_to_remove)
@@ -223,14 +708,95 @@ def prune_data_source(self: Task, data_source_id: int, selected_fields: t.Collec
         task.task_status = BackgroundTaskStatus.FAILURE
         task.status_message = str(e)
     # now we can add indices for the remaining paths
+    _build_indexes(data_source, task)
+    db.session.commit()
+
+
+@shared_task(ignore_result=True, bind=True)
+def index_data_source(self: Task, data_source_id: int) -> None:
+    """Bring the indexes of a data source in line with its filterables.
+
+    Run this after filterables are added or removed, indexes of removed
+    filterables are dropped.
+    """
+    data_source, task = wait_for_data_source(data_source_id, self.request.id)
+    if task.task_status != BackgroundTaskStatus.PENDING:
+        return
+    task.task_status = BackgroundTaskStatus.STARTED
+    task.status_message = "Building indexes"
+    db.session.commit()
+    _build_indexes(data_source, task)
+    if task.task_status != BackgroundTaskStatus.FAILURE:
+        task.task_status = BackgroundTaskStatus.SUCCESS
+        task.status_message = "Indexes built successfully"
+    db.session.commit()
+
+
+def export_path(data_source: DataSourceModel, task_id: str) -> Path:
+    """The Parquet file ``export_data_source`` writes for a task."""
+    return Path(conf.DATA_EXPORT_DIR, f"{data_source.collection_name}-{task_id}.parquet")
+
+
+@shared_task(ignore_result=True, bind=True)
+def export_data_source(self: Task, data_source_id: int) -> None:
+    """Export a data source collection as a Parquet file, see ``export_path``.
+
+    The task row is created (PENDING) by whoever sends the task, the progress
+    is reported on it in documents.
+    """
+    task = db.session.query(BackgroundTaskModel).filter_by(task_id=self.request.id).first()
+    data_source = db.session.query(DataSourceModel).filter_by(id=data_source_id).first()
+    if task is None or task.task_status != BackgroundTaskStatus.PENDING:
+        return
+    if data_source is None:
+        task.task_status = BackgroundTaskStatus.FAILURE
+        task.status_message = "Unable to find data source with id: " + str(data_source_id)
+        db.session.commit()
+        return
+    collection = docdb.get_collection(data_source.collection_name)
+    task.task_status = BackgroundTaskStatus.STARTED
+    task.total_steps = collection.estimated_document_count()
+    db.session.commit()
+
+    def _report_progress(count: int) -> None:
+        task.current_step = count
+        db.session.commit()
+
+    destination = export_path(data_source, task.task_id)
+    # written under another name first, so a file with the export name is complete
+    partial = destination.with_suffix(".partial")
     try:
-        docdb.add_indices_to_collection(
-            ds_collection,
-            schema_aliased_path_dict(data_source.schema, types_only=True),
-            data_source.document_text_field)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        export_parquet(collection, data_source.schema, partial, on_progress=_report_progress)
+        partial.replace(destination)
+        task.task_status = BackgroundTaskStatus.SUCCESS
+        task.status_message = "Data source exported successfully"
     except Exception as e:
-        logging.info("Error adding indices to collection: " + str(e))
+        logging.info("Error exporting data source: " + str(e))
         logging.info(traceback.format_exc())
+        partial.unlink(missing_ok=True)
         task.task_status = BackgroundTaskStatus.FAILURE
         task.status_message = str(e)
     db.session.commit()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_outdated_indexes(session: Session, _flush_context: t.Any) -> None:
+    """Remembers the data sources whose filterables changed, see ``_dispatch_index_builds``."""
+    for obj in itertools.chain(session.new, session.dirty):
+        if isinstance(obj, DataSourceModel) and obj.indexes_outdated:
+            session.info.setdefault("outdated_indexes", set()).add(obj.id)
+            obj.indexes_outdated = False
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_index_builds(session: Session) -> None:
+    """Syncs the indexes of data sources once their changed filterables are committed."""
+    for data_source_id in sorted(session.info.pop("outdated_indexes", ())):
+        index_data_source.delay(data_source_id)  # type: ignore
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_outdated_indexes(session: Session) -> None:
+    """The filterable changes were rolled back, so the indexes are still in line."""
+    session.info.pop("outdated_indexes", None)
@@ -0,0 +1,138 @@
+"""Wildcard feature lookups in a project vocabulary.
+
+Robots have features, words with wildcards (see ``BayesianRobotModel.matches``):
+``prefix*``, ``*suffix``, ``*infix*``, or a word without any. A ``FeatureIndex``
+expands a feature to the words of a vocabulary it matches without checking every
+word:
+
+- prefixes are a range of the sorted words, found by bisection,
+- suffixes are a range of the sorted reversed words,
+- infixes are looked up by their trigrams, in posting lists of the ids of the
+  words containing each trigram, and only the words containing all of them are
+  checked (infixes shorter than a trigram match much of the vocabulary anyway,
+  so those words are checked one by one).
+
+Matches are returned in the order of the vocabulary, as checking every word did.
+Indexes are cached by a key that changes with the vocabulary, e.g. the project
+and its vocabulary version (``feature_index``), and an index caches the expansion
+of each feature.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import typing as t
+from collections import OrderedDict
+import numpy as np
+
+NGRAM = 3
+
+
+def _upper_bound(sorted_words: t.List[str], prefix: str) -> int:
+    """The position after the last word starting with prefix"""
+    # the smallest string after all of the strings starting with prefix
+    for i in range(len(prefix) - 1, -1, -1):
+        if ord(prefix[i]) < 0x10FFFF:
+            return bisect.bisect_left(sorted_words, prefix[:i] + chr(ord(prefix[i]) + 1))
+    return len(sorted_words)
+
+
+class FeatureIndex:
+    """Prefix, suffix and infix lookups of the words of a vocabulary"""
+
+    def __init__(self, words: t.Iterable[str]):
+        """Indexes a vocabulary
+
+        Args:
+            words: The words, in the order matches are returned in
+        """
+        self.words: t.List[str] = list(words)
+        self.vocab = set(self.words)
+        # the ids of the words, sorted by word and by reversed word
+        self._by_prefix = sorted(range(len(self.words)), key=self.words.__getitem__)
+        self._prefixes = [self.words[i] for i in self._by_prefix]
+        self._by_suffix = sorted(range(len(self.words)), key=lambda i: self.words[i][::-1])
+        self._suffixes = [self.words[i][::-1] for i in self._by_suffix]
+        postings: t.Dict[str, t.List[int]] = {}
+        for i, word in enumerate(self.words):
+            for gram in {word[j:j + NGRAM] for j in range(len(word) - NGRAM + 1)}:
+                postings.setdefault(gram, []).append(i)
+        self._ngrams = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+        self._expansions: t.Dict[str, t.List[str]] = {}
+
+    def _in_order(self, ids: t.Iterable[int]) -> t.List[str]:
+        return [self.words[i] for i in sorted(ids)]
+
+    def prefixed(self, prefix: str) -> t.List[str]:
+        """The words starting with prefix"""
+        low = bisect.bisect_left(self._prefixes, prefix)
+        return self._in_order(self._by_prefix[low:_upper_bound(self._prefixes, prefix)])
+
+    def suffixed(self, suffix: str) -> t.List[str]:
+        """The words ending with suffix"""
+        reverse = suffix[::-1]
+        low = bisect.bisect_left(self._suffixes, reverse)
+        return self._in_order(self._by_suffix[low:_upper_bound(self._suffixes, reverse)])
+
+    def containing(self, infix: str) -> t.List[str]:
+        """The words containing infix"""
+        if len(infix) < NGRAM:
+            return [word for word in self.words if infix in word]
+        grams = {infix[j:j + NGRAM] for j in range(len(infix) - NGRAM + 1)}
+        if any(gram not in self._ngrams for gram in grams):
+            return []
+        ids: t.Optional[np.ndarray] = None
+        for gram in sorted(grams, key=lambda gram: len(self._ngrams[gram])):
+            ids = self._ngrams[gram] if ids is None else np.intersect1d(ids, self._ngrams[gram], assume_unique=True)
+        # the trigrams may be in a word without being next to each other
+        return [self.words[i] for i in ids.tolist() if infix in self.words[i]]  # type: ignore
+
+    def expand(self, feature: str) -> t.List[str]:
+        """The words a feature matches, see ``BayesianRobotModel.matches``
+
+        Args:
+            feature: The feature, matched in lowercase
+
+        Returns:
+            The words, in the order of the vocabulary (a new list)
+        """
+        feature_string = feature.lower()
+        words = self._expansions.get(feature_string)
+        if words is None:
+            if feature_string.startswith("*") and feature_string.endswith("*"):
+                words = self.containing(feature_string[1:-1])
+            elif feature_string.startswith("*"):
+                words = self.suffixed(feature_string[1:])
+            elif feature_string.endswith("*"):
+                words = self.prefixed(feature_string[:-1])
+            else:
+                words = [feature_string] if feature_string in self.vocab else []
+            self._expansions[feature_string] = words
+        return list(words)
+
+
+# vocabulary key -> index, most recently used last
+_INDEX_CACHE: 'OrderedDict[t.Hashable, FeatureIndex]' = OrderedDict()
+_INDEX_CACHE_LOCK = threading.Lock()
+INDEX_CACHE_SIZE = 16
+
+
+def feature_index(key: t.Hashable, words: t.Iterable[str]) -> FeatureIndex:
+    """The index of a vocabulary, cached by key (e.g. ``ProjectModel.feature_index``)
+
+    Args:
+        key: Identifies the vocabulary, a new key must be used when the words change
+        words: The words, in order, only read when the index is not cached
+    """
+    with _INDEX_CACHE_LOCK:
+        index = _INDEX_CACHE.get(key)
+        if index is not None:
+            _INDEX_CACHE.move_to_end(key)
+    if index is None:
+        index = FeatureIndex(words)
+        with _INDEX_CACHE_LOCK:
+            _INDEX_CACHE[key] = index
+            while len(_INDEX_CACHE) > INDEX_CACHE_SIZE:
+                _INDEX_CACHE.popitem(last=False)
+    return index
@@ -5,6 +5,11 @@ as well as some basic types for the filterable options.
 
 These help to avoid ever directly interacting with the metadata for DataSource.
 
+Besides ``validate`` for a single value, every filterable validates a column of
+values at once (``mask``, ``validate_many``) and summarizes one (``stats``). A
+column is a list or a 1-D NumPy array; the comparisons run on NumPy arrays, and
+date strings are parsed to ``datetime64`` once per column rather than per value.
+
 Classes:
     FilterableType: An enum to represent the type of filterable options
     Filterable: An abstract class to represent filterable options
@@ -17,7 +22,86 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from datetime import datetime
 from enum import Enum
+import math
 import typing as t
+import warnings
+import numpy as np
+
+Column = t.Union[t.Sequence[t.Any], np.ndarray]
+
+_NAT = np.datetime64("NaT", "us")
+
+
+def _column(values: Column) -> np.ndarray:
+    """A column of values as a 1-D NumPy array, lists become object arrays so the types are kept"""
+    if isinstance(values, np.ndarray):
+        if values.ndim != 1:
+            raise ValueError(f"A column has one dimension, not {values.ndim}")
+        return values
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def _is_instance(column: np.ndarray, types: t.Union[type, t.Tuple[type, ...]], exact: bool = False) -> np.ndarray:
+    """Which values of an object column are of the types (of exactly the types if exact)"""
+    if exact:
+        exact_types = types if isinstance(types, tuple) else (types,)
+        return np.fromiter((type(value) in exact_types for value in column), dtype=bool, count=len(column))
+    return np.fromiter((isinstance(value, types) for value in column), dtype=bool, count=len(column))
+
+
+def _in_range(values: np.ndarray, low: t.Union[int, float], high: t.Union[int, float]) -> np.ndarray:
+    """Which values of an integer or float array are between low and high, compared exactly
+
+    Python compares ints and floats exactly, NumPy converts the bounds to the type
+    of the array, which rounds ints beyond 2 ** 53 to a float, or overflows. The
+    bounds are moved to the nearest values of the type inside the range instead.
+    """
+    if values.dtype.kind in "iu":
+        info = np.iinfo(values.dtype)
+        if low > info.max or high < info.min:
+            return np.zeros(len(values), dtype=bool)
+        low = info.min if low < info.min else math.ceil(low)
+        high = info.max if high > info.max else math.floor(high)
+    else:
+        float_low, float_high = float(low), float(high)
+        low = float_low if float_low >= low else np.nextafter(float_low, np.inf)
+        high = float_high if float_high <= high else np.nextafter(float_high, -np.inf)
+    return (values >= values.dtype.type(low)) & (values <= values.dtype.type(high))
+
+
+def _parse_date(value: str) -> np.datetime64:
+    """An ISO string as a datetime64, NaT if it isn't a valid naive date"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return _NAT
+    return _NAT if parsed.tzinfo is not None else np.datetime64(parsed, "us")
+
+
+def _parse_dates(strings: np.ndarray) -> np.ndarray:
+    """ISO strings as datetime64, NaT where a string isn't a valid naive date.
+
+    Strings that start with a year and have at least a full date are parsed by
+    NumPy in one go, anything else (or a batch NumPy rejects, e.g. for a time
+    zone) is parsed one by one like ``FilterableDate.validate`` does.
+    """
+    strings = strings.astype(str)
+    dates = np.full(len(strings), _NAT)
+    iso = np.zeros(len(strings), dtype=bool)
+    if strings.dtype.itemsize >= 40:
+        # the code points of the first 10 characters: 4 digits, and not shorter than a date
+        chars = strings.view(np.uint32).reshape(len(strings), -1)
+        iso = ((chars[:, :4] >= ord("0")) & (chars[:, :4] <= ord("9"))).all(axis=1) & (chars[:, 9] != 0)
+    if iso.any():
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            try:
+                dates[iso] = strings[iso].astype("datetime64[us]")
+            except (ValueError, DeprecationWarning, UserWarning):
+                iso[:] = False
+    for i in np.flatnonzero(~iso):
+        dates[i] = _parse_date(strings[i])
+    return dates
 
 
 class FilterableType(Enum):
@@ -223,6 +307,63 @@ class Filterable(ABC):
             bool: Whether the value is valid or not
         """
 
+    def _parse(self, column: np.ndarray) -> t.Tuple[np.ndarray, t.Optional[np.ndarray]]:
+        """Validates a column, and converts it to the values to compute statistics on
+
+        Subclasses compare whole arrays, this works for any filterable by calling validate.
+
+        Returns:
+            The mask of valid values, and the converted values (None if there are no statistics)
+        """
+        return np.fromiter((self.validate(value) for value in column), dtype=bool, count=len(column)), None
+
+    def _range(self, values: np.ndarray) -> t.Dict[str, t.Any]:
+        """The statistics of the valid converted values of a column"""
+        return {}
+
+    def mask(self, values: Column) -> np.ndarray:
+        """Validates a column of values at once
+
+        Args:
+            values (Column): The values to validate, a list or a 1-D NumPy array
+
+        Returns:
+            np.ndarray: A boolean array, True where the value is valid (as ``validate``)
+        """
+        return self._parse(_column(values))[0]
+
+    def validate_many(self, values: Column) -> bool:
+        """Validates that all values of a column are valid for the filterable
+
+        Args:
+            values (Column): The values to validate, a list or a 1-D NumPy array
+
+        Returns:
+            bool: Whether all of the values are valid or not
+        """
+        return bool(self.mask(values).all())
+
+    def stats(self, values: Column) -> t.Dict[str, t.Any]:
+        """Summarizes a column of values in one pass
+
+        Args:
+            values (Column): The values, a list or a 1-D NumPy array
+
+        Returns:
+            t.Dict[str, t.Any]: The number of values, of valid values and of None values,
+            and for numbers and dates the min and max of the valid values (None if there are none)
+        """
+        column = _column(values)
+        mask, converted = self._parse(column)
+        stats = {
+            "count": len(column),
+            "valid": int(mask.sum()),
+            "nulls": int(_is_instance(column, type(None)).sum()) if column.dtype.kind == "O" else 0,
+        }
+        if converted is not None:
+            stats.update(self._range(converted[mask]))
+        return stats
+
 
 class FilterableString(Filterable):
     """A class to represent filterable strings"""
@@ -268,6 +409,20 @@ class FilterableString(Filterable):
 
         return True
 
+    def _parse(self, column: np.ndarray) -> t.Tuple[np.ndarray, t.Optional[np.ndarray]]:
+        if column.dtype.kind == "U":
+            mask = np.ones(len(column), dtype=bool)
+            lengths = np.char.str_len(column)
+        elif column.dtype.kind == "O":
+            mask = _is_instance(column, str)
+            lengths = np.fromiter((len(value) if valid else 0 for value, valid in zip(column, mask)),
+                                  dtype=np.int64, count=len(column))
+        else:
+            return np.zeros(len(column), dtype=bool), None
+        if self._max_length is not None:
+            mask &= lengths <= self._max_length
+        return mask, None
+
     @classmethod
     def _validate_options(cls, options: t.Dict[str, t.Any]) -> None:
         """Validates the options for the filterable number
@@ -352,6 +507,52 @@ class FilterableNumber(Filterable):
 
         return self._min_val <= int(value) <= self._max_val
 
+    def _floats(self, column: np.ndarray) -> np.ndarray:
+        floats = column.astype(np.float64)
+        return floats if self.is_float else np.trunc(floats)
+
+    def _parse(self, column: np.ndarray) -> t.Tuple[np.ndarray, t.Optional[np.ndarray]]:
+        # integers stay integers, a float64 can't tell the ints beyond 2 ** 53 apart
+        if column.dtype.kind in "iu":
+            return _in_range(column, self._min_val, self._max_val), column
+        if column.dtype.kind == "f":
+            numbers = self._floats(column)
+            # NaN compares False, and is not a valid number
+            return _in_range(numbers, self._min_val, self._max_val), numbers
+        if column.dtype.kind != "O":
+            return np.zeros(len(column), dtype=bool), None
+        # exact types, like validate: bools aren't numbers
+        ints = _is_instance(column, int, exact=True)
+        floats = _is_instance(column, float, exact=True)
+        mask = np.zeros(len(column), dtype=bool)
+        float_values = self._floats(column[floats])
+        mask[floats] = _in_range(float_values, self._min_val, self._max_val)
+        int_values = column[ints]
+        try:
+            int_values = int_values.astype(np.int64)
+            mask[ints] = _in_range(int_values, self._min_val, self._max_val)
+        except OverflowError:
+            # beyond 64 bits, compared as Python ints
+            mask[ints] = [self._min_val <= value <= self._max_val for value in int_values]
+        if not floats.any() and int_values.dtype.kind == "i":
+            numbers = np.zeros(len(column), dtype=np.int64)
+            numbers[ints] = int_values
+        elif not ints.any():
+            numbers = np.zeros(len(column), dtype=np.float64)
+            numbers[floats] = float_values
+        else:
+            # ints and floats, kept as Python numbers so they compare exactly
+            numbers = np.zeros(len(column), dtype=object)
+            numbers[ints] = int_values.tolist()
+            numbers[floats] = float_values.tolist()
+        return mask, numbers
+
+    def _range(self, values: np.ndarray) -> t.Dict[str, t.Any]:
+        if not len(values):
+            return {"min": None, "max": None}
+        convert = float if self.is_float else int
+        return {"min": convert(values.min()), "max": convert(values.max())}
+
     @classmethod
     def _validate_options(cls, options: t.Dict[str, t.Any]) -> None:
         """Validates the options for the filterable number
@@ -466,6 +667,34 @@ class FilterableDate(Filterable):
 
         return self._min_val <= value <= self._max_val
 
+    def _parse(self, column: np.ndarray) -> t.Tuple[np.ndarray, t.Optional[np.ndarray]]:
+        if column.dtype.kind == "M":
+            dates = column.astype("datetime64[us]")
+        elif column.dtype.kind == "U":
+            dates = _parse_dates(column)
+        elif column.dtype.kind == "O":
+            strings = _is_instance(column, str)
+            if strings.all():
+                dates = _parse_dates(column)
+            else:
+                dates = np.full(len(column), _NAT)
+                dates[strings] = _parse_dates(column[strings])
+                # aware datetimes can't be compared to the (naive) min and max
+                others = column[~strings]
+                naive = np.fromiter((isinstance(value, datetime) and value.tzinfo is None for value in others),
+                                    dtype=bool, count=len(others))
+                dates[np.flatnonzero(~strings)[naive]] = others[naive].astype("datetime64[us]")
+        else:
+            return np.zeros(len(column), dtype=bool), None
+        # NaT compares False
+        mask = (np.datetime64(self._min_val, "us") <= dates) & (dates <= np.datetime64(self._max_val, "us"))
+        return mask, dates
+
+    def _range(self, values: np.ndarray) -> t.Dict[str, t.Any]:
+        if not len(values):
+            return {"min": None, "max": None}
+        return {"min": values.min().item(), "max": values.max().item()}
+
     @classmethod
     def _validate_options(cls, options: t.Dict[str, t.Any]) -> None:
         """Validates the options for the filterable number
@@ -563,5 +792,12 @@ class FilterableBoolean(Filterable):
 
         return True
 
+    def _parse(self, column: np.ndarray) -> t.Tuple[np.ndarray, t.Optional[np.ndarray]]:
+        if column.dtype.kind == "b":
+            return np.ones(len(column), dtype=bool), None
+        if column.dtype.kind == "O":
+            return _is_instance(column, bool), None
+        return np.zeros(len(column), dtype=bool), None
+
 
 Filterable.register_type_handler(FilterableBoolean)
@@ -0,0 +1,226 @@
+"""Compiling filterables and chosen values into database queries
+
+Filtering a data source on its filterables (see ``filterable``) runs in the
+database, where the fields can be indexed, instead of in Python:
+
+- ``to_mongo`` gives a mongo query document for the data source collection,
+- ``to_postgres`` gives a SQLAlchemy expression on a JSONB column, e.g.
+  ``DataModel.document``. Equality uses containment (``@>``), ranges use
+  ``jsonb_path_exists``, both can use a GIN index on the column.
+
+A value chosen for a filterable is:
+
+- a value, e.g. "en", 3 or True, for documents with that value,
+- a list of values (strings), for documents with any of them,
+- a dictionary with "min" and/or "max" (numbers and dates), for an inclusive range,
+- None, for documents without a value (nullable filterables only).
+
+Conditions are composed with ``And`` and ``Or``, e.g.
+``And(Condition(lang, "en"), Or(Condition(likes, {"min": 10}), Condition(verified, True)))``.
+
+Classes:
+    Condition: A filterable and the value chosen for it
+    And: All of the conditions
+    Or: Any of the conditions
+"""
+
+from __future__ import annotations
+
+import typing as t
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime
+from sqlalchemy import and_, func, literal, or_, true, false
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
+
+from .data_source_prune import mongo_field_path
+from .filterable import Filterable, FilterableDate, FilterableNumber, FilterableString
+
+if t.TYPE_CHECKING:
+    from sqlalchemy.sql.elements import ColumnElement
+
+
+def schema_path_to_jsonpath(path: t.Sequence[str]) -> str:
+    """Converts a schema path to a SQL/JSON path, e.g.
+    ("properties", "entities", "properties", "urls", "items", "properties", "url")
+    becomes '$."entities"."urls"[*]."url"'.
+    """
+    parts = ["$"]
+    for part in path:
+        if part == "items":
+            parts.append("[*]")
+        elif part != "properties":
+            parts.append("." + json.dumps(part))
+    return "".join(parts)
+
+
+def containment_document(path: t.Sequence[str], value: t.Any) -> t.Any:
+    """The document containing a value at a schema path, for ``@>``.
+
+    A document contains it if any item of an array on the path contains the rest,
+    e.g. ("properties", "tags", "items", "properties", "text") and "a" gives
+    {"tags": [{"text": "a"}]}.
+    """
+    document = value
+    for part in reversed(path):
+        if part == "items":
+            document = [document]
+        elif part != "properties":
+            document = {part: document}
+    return document
+
+
+def _json_value(value: t.Any) -> t.Any:
+    """Dates are compared as ISO strings in JSON documents."""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class Condition:
+    """A filterable and the value chosen for it"""
+
+    def __init__(self, filterable: Filterable, value: t.Any):
+        """Initializes a Condition, the value is validated by the filterable
+
+        Args:
+            filterable (Filterable): The filterable, its path is the field compared
+            value (t.Any): The chosen value, see the module documentation
+
+        Raises:
+            ValueError: If the value isn't valid for the filterable
+        """
+        self.filterable = filterable
+        self.value = self._validate(filterable, value)
+
+    @staticmethod
+    def _validate(filterable: Filterable, value: t.Any) -> t.Any:
+        def _check(val: t.Any) -> t.Any:
+            if isinstance(filterable, FilterableDate) and isinstance(val, str):
+                try:
+                    val = datetime.fromisoformat(val)
+                except ValueError as exc:
+                    raise ValueError(f"{val!r} is not a valid date for {filterable.name}") from exc
+            if not filterable.validate(val):
+                raise ValueError(f"{val!r} is not a valid value for {filterable.name}")
+            return val
+
+        if value is None:
+            if not filterable.nullable:
+                raise ValueError(f"{filterable.name} is not nullable")
+            return None
+        if isinstance(value, dict):
+            if not isinstance(filterable, (FilterableNumber, FilterableDate)):
+                raise ValueError(f"{filterable.name} can't be filtered on a range")
+            if not value.keys() <= {"min", "max"} or not value:
+                raise ValueError(f"A range has a min and/or a max, not {sorted(value)}")
+            return {key: _check(val) for key, val in value.items() if val is not None}
+        if isinstance(value, (list, tuple)):
+            if not isinstance(filterable, FilterableString):
+                raise ValueError(f"{filterable.name} can't be filtered on a list of values")
+            return [_check(val) for val in value]
+        return _check(value)
+
+    @property
+    def path(self) -> t.Tuple[str, ...]:
+        """The schema path of the field"""
+        return self.filterable.path
+
+    def to_mongo(self) -> t.Dict[str, t.Any]:
+        """The mongo query document"""
+        field = mongo_field_path(self.path)
+        value = self.value
+        is_date = isinstance(self.filterable, FilterableDate)
+        if isinstance(value, dict):
+            operators = {"min": "$gte", "max": "$lte"}
+            query = {field: {operators[key]: val for key, val in value.items()}}
+            if is_date:
+                # dates are stored as dates (typed imports) or as ISO strings (JSON)
+                iso = {field: {operators[key]: val.isoformat() for key, val in value.items()}}
+                return {"$or": [query, iso]}
+            return query
+        if isinstance(value, list):
+            return {field: {"$in": value}}
+        if is_date and value is not None:
+            return {field: {"$in": [value, value.isoformat()]}}
+        return {field: value}
+
+    def to_postgres(self, column: 'ColumnElement') -> 'ColumnElement':
+        """The expression on a JSONB document column"""
+        value = self.value
+        if isinstance(value, dict):
+            if not value:
+                return true()
+            predicates = {"min": "@ >= $min", "max": "@ <= $max"}
+            jsonpath = "{} ? ({})".format(  # pylint: disable=consider-using-f-string
+                schema_path_to_jsonpath(self.path),
+                " && ".join(predicates[key] for key in value))
+            return func.jsonb_path_exists(
+                column,
+                literal(jsonpath, JSONPATH),
+                literal({key: _json_value(val) for key, val in value.items()}, JSONB))
+        if isinstance(value, list):
+            if not value:
+                return false()
+            return or_(*(column.contains(containment_document(self.path, val)) for val in value))
+        return column.contains(containment_document(self.path, _json_value(value)))
+
+
+class _Composite(ABC):
+    """Conditions composed with an operator"""
+
+    _mongo_operator: str
+
+    def __init__(self, *conditions: t.Union[Condition, '_Composite']):
+        self.conditions = conditions
+
+    def to_mongo(self) -> t.Dict[str, t.Any]:
+        """The mongo query document"""
+        if not self.conditions:
+            return {} if self._mongo_operator == "$and" else {"_id": {"$exists": False}}
+        if len(self.conditions) == 1:
+            return self.conditions[0].to_mongo()
+        return {self._mongo_operator: [condition.to_mongo() for condition in self.conditions]}
+
+    @abstractmethod
+    def to_postgres(self, column: 'ColumnElement') -> 'ColumnElement':
+        """The expression on a JSONB document column"""
+
+
+class And(_Composite):
+    """All of the conditions, no conditions matches every document"""
+
+    _mongo_operator = "$and"
+
+    def to_postgres(self, column: 'ColumnElement') -> 'ColumnElement':
+        return and_(true(), *(condition.to_postgres(column) for condition in self.conditions))
+
+
+class Or(_Composite):
+    """Any of the conditions, no conditions matches no document"""
+
+    _mongo_operator = "$or"
+
+    def to_postgres(self, column: 'ColumnElement') -> 'ColumnElement':
+        return or_(false(), *(condition.to_postgres(column) for condition in self.conditions))
+
+
+def compile_filters(
+        filterables: t.Mapping[str, Filterable],
+        values: t.Mapping[str, t.Any],
+        match_all: bool = True) -> t.Union[And, Or]:
+    """The conditions for the values chosen for some of the filterables of a data source.
+
+    Args:
+        filterables: The filterables of the data source by name, e.g.
+                     ``{name: ds.filterable(name) for name in ds.filterables}``.
+        values: The chosen values by filterable name.
+        match_all: Whether documents have to match all of the values (AND), or any (OR).
+
+    Raises:
+        KeyError: If a value is chosen for an unknown filterable.
+        ValueError: If a value isn't valid for its filterable.
+    """
+    unknown = set(values) - set(filterables)
+    if unknown:
+        raise KeyError(f"Unknown filterables: {', '.join(sorted(unknown))}")
+    conditions = [Condition(filterables[name], value) for name, value in values.items()]
+    return And(*conditions) if match_all else Or(*conditions)
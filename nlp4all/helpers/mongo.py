@@ -1,61 +1,253 @@
-"""Mongo Flask Plugin"""
+"""Mongo Flask Plugin
+
+The client is created lazily, the first time the database is used, and once per
+process: a MongoClient is not fork-safe, so a process forked by celery or
+gunicorn (prefork) gets its own client (and connection pool) the first time it
+uses the database, rather than sharing the sockets of its parent. App startup
+doesn't connect to (or wait for) MongoDB.
+"""
 
 import typing as t
-from pymongo import MongoClient, ASCENDING, TEXT
+import os
+import threading
+import time
+from pymongo import MongoClient
 from pymongo.collection import Collection
 from pymongo.database import Database
+from pymongo.errors import PyMongoError
+from pymongo.monitoring import (
+    ConnectionPoolListener,
+    ConnectionCheckOutStartedEvent,
+    ConnectionCheckOutFailedEvent,
+    ConnectionCheckedOutEvent,
+    ConnectionCheckedInEvent,
+    ConnectionCreatedEvent,
+    ConnectionClosedEvent,
+    PoolClearedEvent,
+)
 from flask import Flask
-from ..config import MONGODB_HOST, MONGO_INITDB_ROOT_PASSWORD, MONGO_INITDB_ROOT_USERNAME
+from ..config import MONGO_URI
+
+
+class PoolMetrics(ConnectionPoolListener):
+    """Counts connection pool checkouts and the time spent waiting for a connection.
+
+    The counters are per process, like the pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        """Sets all of the counters to 0."""
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checked_out = 0  # connections in use right now
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.pool_clears = 0
+
+    def snapshot(self) -> t.Dict[str, t.Any]:
+        """The counters, and the mean wait per checkout."""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checked_out": self.checked_out,
+                "wait_seconds": self.wait_seconds,
+                "mean_wait_seconds": self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+                "connections_created": self.connections_created,
+                "connections_open": self.connections_created - self.connections_closed,
+                "pool_clears": self.pool_clears,
+            }
+
+    def _waited(self) -> float:
+        # a checkout starts and ends on the thread that needs the connection
+        started = getattr(self._started, "time", None)
+        self._started.time = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event: ConnectionCheckOutStartedEvent) -> None:
+        self._started.time = time.perf_counter()
+
+    def connection_checked_out(self, event: ConnectionCheckedOutEvent) -> None:
+        waited = self._waited()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def connection_check_out_failed(self, event: ConnectionCheckOutFailedEvent) -> None:
+        waited = self._waited()
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def connection_checked_in(self, event: ConnectionCheckedInEvent) -> None:
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_created(self, event: ConnectionCreatedEvent) -> None:
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event: ConnectionClosedEvent) -> None:
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_created(self, event: t.Any) -> None:
+        pass
+
+    def pool_ready(self, event: t.Any) -> None:
+        pass
+
+    def pool_cleared(self, event: PoolClearedEvent) -> None:
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event: t.Any) -> None:
+        pass
+
+    def connection_ready(self, event: t.Any) -> None:
+        pass
 
 
 class Mongo:
     """"Mongo Flask Plugin"""
 
-    _conn: t.Union[MongoClient, None]
-    app: t.Union[Flask, None]
-    _db: t.Union[Database, None]
+    app: t.Union[Flask, None] = None
+    _connection_string: t.Union[str, None] = None
 
     def __init__(self, app: t.Optional[Flask] = None):
+        self._conn: t.Union[MongoClient, None] = None
+        self._pid: t.Union[int, None] = None
+        self._lock = threading.Lock()
+        self._client_options: t.Dict[str, t.Any] = {}
+        self.metrics = PoolMetrics()
+        # a lock held by another thread at the time of a fork would never be released in the child
+        os.register_at_fork(after_in_child=self._after_fork)
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app: Flask) -> None:
-        """Initialize the app."""
+        """Initialize the app.
+
+        This only reads the settings, the client is created when the database is first used.
+        """
         self.app = app
-        CONNECTION_STRING = f"mongodb://{MONGO_INITDB_ROOT_USERNAME}:{MONGO_INITDB_ROOT_PASSWORD}@{MONGODB_HOST}"
-        CONNECTION_STRING = CONNECTION_STRING + ":27017/nlp4all?authSource=admin"
-        app.logger.info("Connecting to MongoDB: %s", CONNECTION_STRING)
-        self._conn = MongoClient(CONNECTION_STRING)
-        self._db = self._conn.get_database()
+        self._connection_string = app.config.get("MONGO_URI") or MONGO_URI
+        options = {
+            "maxPoolSize": app.config.get("MONGO_MAX_POOL_SIZE"),
+            "minPoolSize": app.config.get("MONGO_MIN_POOL_SIZE"),
+            "maxIdleTimeMS": app.config.get("MONGO_MAX_IDLE_TIME_MS"),
+            "waitQueueTimeoutMS": app.config.get("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+            "connectTimeoutMS": app.config.get("MONGO_CONNECT_TIMEOUT_MS"),
+            "serverSelectionTimeoutMS": app.config.get("MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+            "socketTimeoutMS": app.config.get("MONGO_SOCKET_TIMEOUT_MS"),
+            "readPreference": app.config.get("MONGO_READ_PREFERENCE"),
+        }
+        self._client_options = {key: value for key, value in options.items() if value is not None}
+        with self._lock:
+            self._close()
         app.extensions["mongo"] = self
 
+    def _after_fork(self) -> None:
+        """Forgets the parent's client in a forked process, the child connects on first use."""
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.metrics = PoolMetrics()
+
+    def _close(self) -> None:
+        """Closes the client of this process, a client inherited from a parent process is left alone."""
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self) -> MongoClient:
+        if self._connection_string is None:
+            raise RuntimeError("Database not initialized")
+        if self.app:
+            self.app.logger.info("Connecting to MongoDB: %s (pid %s)", self._connection_string, os.getpid())
+        self.metrics.reset()
+        # connect=False: the pool connects in the background on first use, creating the client doesn't block
+        conn: MongoClient = MongoClient(
+            self._connection_string,
+            connect=False,
+            event_listeners=[self.metrics],
+            **self._client_options)
+        self._pid = os.getpid()
+        self._conn = conn
+        return conn
+
+    @property
+    def client(self) -> MongoClient:
+        """The client of this process, created on first use."""
+        conn = self._conn
+        if conn is not None and self._pid == os.getpid():
+            return conn
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                return self._conn
+            # the client was created before a fork (or not at all), don't touch the parent's sockets
+            self._conn = None
+            return self._connect()
+
+    def reconnect(self) -> None:
+        """Replace the connection with a new one.
+
+        A forked process gets a new client on first use anyway, this also
+        replaces the client of the current process.
+        """
+        if self._connection_string is None:
+            raise RuntimeError("Database not initialized")
+        with self._lock:
+            self._close()
+            self._connect()
+
     def get_conn(self) -> t.Union[MongoClient, None]:
         """Get the connection."""
-        return self._conn
+        if self._connection_string is None:
+            return None
+        return self.client
+
+    def get_database(self) -> Database:
+        """Get the database (from the connection string)."""
+        return self.client.get_database()
 
     def get_collection(self, collection_name: str) -> Collection:
         """Get the collection."""
-        if self._db is None:
-            raise RuntimeError("Database not initialized")
-        return self._db.get_collection(collection_name)
-
-    def add_indices_to_collection(
-            self,
-            collection: t.Union[str, Collection],
-            index_paths: t.Dict[str, t.Tuple[str, ...]],
-            primary_text_field: str) -> None:
-        """Add index to collection."""
-        if self._db is None:
-            raise RuntimeError("Database not initialized")
-        if isinstance(collection, str):
-            collection = self._db.get_collection(collection)
-        for index_path, tipe in index_paths.items():
-            if tipe[0] in ("number", "integer", "boolean"):
-                if self.app:
-                    self.app.logger.info("Creating index %s", index_path)
-                collection.create_index([(index_path, ASCENDING)], background=True)
-            elif index_path == primary_text_field and tipe[0] == "string":
-                if self.app:
-                    self.app.logger.info("Creating MAIN TEXT index %s", index_path)
-                collection.create_index([(index_path, TEXT)], background=True)
-            collection.create_index(index_path)
+        return self.get_database().get_collection(collection_name)
+
+    def pool_stats(self) -> t.Dict[str, t.Any]:
+        """Connection pool metrics of this process."""
+        return {
+            "pid": os.getpid(),
+            "connected": self._conn is not None and self._pid == os.getpid(),
+            "options": dict(self._client_options),
+            **self.metrics.snapshot(),
+        }
+
+    def health(self) -> t.Dict[str, t.Any]:
+        """Pings the server, with the pool metrics.
+
+        Returns:
+            "ok", the ping round trip in seconds (or the error) and ``pool_stats``.
+        """
+        started = time.perf_counter()
+        try:
+            self.get_database().command("ping")
+            status: t.Dict[str, t.Any] = {"ok": True, "ping_seconds": time.perf_counter() - started}
+        except (PyMongoError, RuntimeError) as e:
+            status = {"ok": False, "error": str(e)}
+        status["pool"] = self.pool_stats()
+        return status
@@ -0,0 +1,345 @@
+"""Word counts for naive Bayes classification.
+
+A ``CountStore`` holds, for each category, the number of documents tagged with
+it and the number of those documents each word appears in. Words get an integer
+id from a vocabulary, and the counts are a categories x vocabulary NumPy matrix,
+so a word is a column and a tagged document updates one row at the ids of its
+words.
+
+The store replaces the nested dictionaries analyses used to keep in a JSON
+column, ``{"counts": n, category: {"counts": n, "words": {word: n}}}``.
+``from_data`` and ``to_data`` convert from and to that format.
+
+A ``NaiveBayesScorer`` scores words and documents from the count matrix with
+array operations, for one document or for a batch of thousands.
+"""
+
+from __future__ import annotations
+
+import typing as t
+import numpy as np
+
+# the categories of a store, e.g. category ids, or names in the nested dictionaries
+Category = t.TypeVar("Category", bound=t.Hashable)
+
+
+class CountStore(t.Generic[Category]):
+    """Document counts per category, and per category and word"""
+
+    def __init__(self, categories: t.Iterable[Category] = ()):
+        """Initializes an empty CountStore
+
+        Args:
+            categories: The categories, more are added as documents are counted
+        """
+        self.categories: t.List[Category] = []
+        self.category_index: t.Dict[Category, int] = {}
+        self.words: t.List[str] = []
+        self.vocab: t.Dict[str, int] = {}
+        # allocated ahead (doubling), the counts are the used part
+        self._counts = np.zeros((0, 0), dtype=np.int64)
+        self._category_counts = np.zeros(0, dtype=np.int64)
+        for category in categories:
+            self.add_category(category)
+
+    @property
+    def counts(self) -> np.ndarray:
+        """The categories x vocabulary matrix of document counts (a view)"""
+        return self._counts[:len(self.categories), :len(self.words)]
+
+    @property
+    def category_counts(self) -> np.ndarray:
+        """The number of documents of each category (a view)"""
+        return self._category_counts[:len(self.categories)]
+
+    @property
+    def total(self) -> int:
+        """The number of documents counted"""
+        return int(self.category_counts.sum())
+
+    def _reserve(self, rows: int, columns: int) -> None:
+        capacity_rows, capacity_columns = self._counts.shape
+        if rows <= capacity_rows and columns <= capacity_columns:
+            return
+        shape = (max(rows, 2 * capacity_rows, 4), max(columns, 2 * capacity_columns, 64))
+        counts = np.zeros(shape, dtype=np.int64)
+        counts[:capacity_rows, :capacity_columns] = self._counts
+        self._counts = counts
+        category_counts = np.zeros(shape[0], dtype=np.int64)
+        category_counts[:capacity_rows] = self._category_counts
+        self._category_counts = category_counts
+
+    def add_category(self, category: Category) -> int:
+        """Adds a category (if it's new)
+
+        Returns:
+            int: The row of the category
+        """
+        row = self.category_index.get(category)
+        if row is None:
+            row = len(self.categories)
+            self._reserve(row + 1, len(self.words))
+            self.categories.append(category)
+            self.category_index[category] = row
+        return row
+
+    def word_ids(self, words: t.Iterable[str], add: bool = False) -> np.ndarray:
+        """The ids (columns) of words
+
+        Args:
+            words: The words
+            add: Whether to add unknown words to the vocabulary, otherwise their id is -1
+
+        Returns:
+            np.ndarray: The ids, in the order of the words
+        """
+        words = list(words)
+        if add:
+            for word in words:
+                if word not in self.vocab:
+                    self.vocab[word] = len(self.words)
+                    self.words.append(word)
+            self._reserve(len(self.categories), len(self.words))
+        vocab = self.vocab
+        return np.fromiter((vocab.get(word, -1) for word in words), dtype=np.int64, count=len(words))
+
+    def add(self, category: Category, words: t.Iterable[str], n: int = 1) -> np.ndarray:
+        """Counts a document (n times), each of its words once
+
+        Args:
+            category: The category the document was tagged with
+            words: The words of the document
+            n: How many times to count it, negative to uncount
+
+        Returns:
+            np.ndarray: The ids of the (distinct) words
+        """
+        unique = list(dict.fromkeys(words))
+        row = self.add_category(category)
+        ids = self.word_ids(unique, add=True)
+        # the ids are distinct, so a fancy index add counts each once
+        self._counts[row, ids] += n
+        self._category_counts[row] += n
+        return ids
+
+    def set_counts(
+            self,
+            categories: t.Sequence[Category],
+            words: t.Optional[t.Sequence[str]],
+            counts: t.Sequence[int]) -> None:
+        """Sets counts, e.g. when loading a store
+
+        Args:
+            categories: The category of each count
+            words: The word of each count, None to set the counts of the categories
+            counts: The counts
+        """
+        rows = np.fromiter((self.add_category(category) for category in categories),
+                           dtype=np.int64, count=len(categories))
+        values = np.asarray(counts, dtype=np.int64)
+        if words is None:
+            self._category_counts[rows] = values
+        else:
+            # the ids first, adding words may reallocate the matrix
+            ids = self.word_ids(words, add=True)
+            self._counts[rows, ids] = values
+
+    def add_counts(
+            self,
+            categories: t.Sequence[Category],
+            words: t.Sequence[t.Optional[str]],
+            counts: t.Sequence[int]) -> None:
+        """Adds counts, e.g. pending updates when loading a store
+
+        Args:
+            categories: The category of each count
+            words: The word of each count, None to add to the count of the category
+            counts: The counts, the same (category, word) may come more than once
+        """
+        rows = np.fromiter((self.add_category(category) for category in categories),
+                           dtype=np.int64, count=len(categories))
+        values = np.asarray(counts, dtype=np.int64)
+        is_word = np.fromiter((word is not None for word in words), dtype=bool, count=len(words))
+        np.add.at(self._category_counts, rows[~is_word], values[~is_word])
+        if is_word.any():
+            ids = self.word_ids([word for word in words if word is not None], add=True)
+            np.add.at(self._counts, (rows[is_word], ids), values[is_word])
+
+    def count(self, category: Category, word: t.Optional[str] = None) -> int:
+        """The number of documents of a category, with a word if it's given"""
+        row = self.category_index.get(category)
+        if row is None:
+            return 0
+        if word is None:
+            return int(self._category_counts[row])
+        column = self.vocab.get(word)
+        return 0 if column is None else int(self._counts[row, column])
+
+    @t.overload
+    @classmethod
+    def from_data(cls, data: t.Optional[t.Mapping[str, t.Any]]) -> CountStore[str]:
+        ...
+
+    @t.overload
+    @classmethod
+    def from_data(
+            cls,
+            data: t.Optional[t.Mapping[str, t.Any]],
+            category_key: t.Callable[[str], t.Optional[Category]]) -> CountStore[Category]:
+        ...
+
+    @classmethod
+    def from_data(
+            cls,
+            data: t.Optional[t.Mapping[str, t.Any]],
+            category_key: t.Optional[t.Callable[[str], t.Any]] = None) -> CountStore[t.Any]:
+        """A store from the nested dictionaries analyses kept in JSON
+
+        Args:
+            data: ``{"counts": n, "words": {}, category: {"counts": n, "words": {word: n}}}``
+            category_key: Maps a category name to the category in the store, None to leave it out
+                          (without it the categories are the names)
+        """
+        store: CountStore[t.Any] = cls()
+        for name, value in (data or {}).items():
+            if name in ("counts", "words") or not isinstance(value, dict):
+                continue
+            category = name if category_key is None else category_key(name)
+            if category is None:
+                continue
+            words = value.get("words", {})
+            store.set_counts([category], None, [value.get("counts", 0)])
+            store.set_counts([category] * len(words), list(words), list(words.values()))
+        return store
+
+    def to_data(
+            self,
+            category_name: t.Optional[t.Callable[[Category], t.Optional[str]]] = None) -> t.Dict[str, t.Any]:
+        """The nested dictionaries analyses kept in JSON, see ``from_data``
+
+        Args:
+            category_name: Maps a category to its name in the dictionaries, None to leave it out
+                           (without it the names are the categories)
+        """
+        data: t.Dict[t.Any, t.Any] = {"counts": self.total, "words": {}}
+        counts = self.counts
+        for row, category in enumerate(self.categories):
+            name = category if category_name is None else category_name(category)
+            if name is None:
+                continue
+            columns = np.flatnonzero(counts[row])
+            data[name] = {
+                "counts": int(self._category_counts[row]),
+                "words": {self.words[column]: int(counts[row, column]) for column in columns},
+            }
+        return data
+
+
+class BatchScores(t.NamedTuple):
+    """The scores of a batch of documents, see ``NaiveBayesScorer.score_batch``"""
+    words: np.ndarray  # (words of all documents) x categories, P(category | word)
+    offsets: np.ndarray  # where the words of each document start in words
+    documents: np.ndarray  # documents x categories, the mean over the words of each document
+
+
+class NaiveBayesScorer(t.Generic[Category]):
+    """Scores words and documents by category from the counts of a ``CountStore``.
+
+    The probability of a category given a word is P(word | cat) P(cat) / P(word),
+    which with document counts is count(cat, word) / count(word): the column of
+    the word in the count matrix, normalized. A document scores the mean of its
+    (distinct) words, words that weren't counted score 0 for every category.
+    """
+
+    def __init__(self, store: CountStore[Category], categories: t.Optional[t.Sequence[Category]] = None):
+        """Initializes a NaiveBayesScorer
+
+        Args:
+            store: The counts
+            categories: The categories to score, in order (default: all of the store).
+                        Categories without counts score 0, and only these categories count for P(word).
+        """
+        self.store = store
+        self.categories = list(store.categories if categories is None else categories)
+        rows = [store.category_index.get(category, -1) for category in self.categories]
+        self._rows = np.array([row for row in rows if row >= 0], dtype=np.int64)
+        # where the rows of the store go in the scores
+        self._columns = np.array([i for i, row in enumerate(rows) if row >= 0], dtype=np.int64)
+
+    @property
+    def total(self) -> int:
+        """The number of documents counted in the scored categories"""
+        return int(self.store.category_counts[self._rows].sum())
+
+    def encode(self, words: t.Iterable[str]) -> np.ndarray:
+        """The ids of the distinct words of a document, -1 for words that weren't counted"""
+        return self.store.word_ids(dict.fromkeys(words))
+
+    def word_probabilities(self, ids: np.ndarray) -> np.ndarray:
+        """P(category | word) for word ids
+
+        Returns:
+            np.ndarray: words x categories
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        counts = np.zeros((len(ids), len(self.categories)), dtype=np.float64)
+        known = ids >= 0
+        if known.any() and len(self._rows):
+            counts[np.ix_(known, self._columns)] = self.store.counts[np.ix_(self._rows, ids[known])].T
+        totals = counts.sum(axis=1, keepdims=True)
+        return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+    def probabilities(self) -> np.ndarray:
+        """P(category | word) for the whole vocabulary, categories x vocabulary"""
+        return self.word_probabilities(np.arange(len(self.store.words))).T
+
+    def score_batch(self, documents: t.Sequence[np.ndarray], decimals: t.Optional[int] = None) -> BatchScores:
+        """Scores many documents at once
+
+        Args:
+            documents: The word ids of each document, see ``encode``
+            decimals: Round the word probabilities to this many decimals before they are averaged
+
+        Returns:
+            BatchScores: The probabilities of the words of all documents, and the mean of each document
+        """
+        lengths = np.fromiter((len(document) for document in documents), dtype=np.int64, count=len(documents))
+        offsets = np.zeros(len(documents), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        ids = np.concatenate(documents) if len(documents) else np.zeros(0, dtype=np.int64)
+        words = self.word_probabilities(ids)
+        if decimals is not None:
+            words = np.round(words, decimals)
+        sums = np.zeros((len(documents), len(self.categories)), dtype=np.float64)
+        filled = lengths > 0
+        if filled.any():
+            # the offsets of empty documents are left out, the next document starts at the same place
+            sums[filled] = np.add.reduceat(words, offsets[filled], axis=0)
+        return BatchScores(words, offsets, sums / np.maximum(lengths, 1)[:, None])
+
+    def predictions_and_words(
+            self,
+            words: t.Iterable[str],
+            names: t.Optional[t.Sequence[str]] = None) -> t.Tuple[t.Dict[str, t.Dict[str, float]], t.Dict[str, float]]:
+        """The scores of a document in the dictionaries analyses use
+
+        Args:
+            words: The words of the document
+            names: The name of each category, in order (default: the categories as text)
+
+        Returns:
+            The probabilities by word and by category name, and the mean by category name,
+            rounded to 2 decimals
+        """
+        names = [str(category) for category in self.categories] if names is None else list(names)
+        unique = list(dict.fromkeys(words))
+        if not unique:
+            return {}, {}
+        if self.total == 0:
+            return {}, {name: 0.0 for name in names}
+        probabilities = self.word_probabilities(self.store.word_ids(unique)).tolist()
+        by_word = {
+            word: {name: round(probability, 2) for name, probability in zip(names, row)}
+            for word, row in zip(unique, probabilities)}
+        return by_word, {
+            name: round(sum(by_word[word][name] for word in unique) / len(unique), 2) for name in names}
@@ -7,6 +7,9 @@
 from .background_tasks import BackgroundTaskModel as BackgroundTaskModel
 from .bayesian_robot import BayesianRobotModel as BayesianRobotModel
 from .bayesian_analysis import BayesianAnalysisModel as BayesianAnalysisModel
+from .analysis_counts import AnalysisCategoryCountModel as AnalysisCategoryCountModel
+from .analysis_counts import AnalysisWordCountModel as AnalysisWordCountModel
+from .analysis_counts import AnalysisCountDeltaModel as AnalysisCountDeltaModel
 from .confusion_matrix import ConfusionMatrixModel as ConfusionMatrixModel
 from .data_source import DataSourceModel as DataSourceModel
 from .data_source import DataSourceStatus as DataSourceStatus
@@ -0,0 +1,113 @@
+"""Word count models for analyses"""  # pylint: disable=invalid-name
+
+from __future__ import annotations
+
+import typing as t
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import ForeignKey, String, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Mapped, mapped_column, Session
+
+from ..database import Base
+
+
+class AnalysisCategoryCountModel(Base):  # pylint: disable=too-few-public-methods
+    """The number of documents of an analysis tagged with a category."""
+
+    __tablename__ = "analysis_category_count"
+    analysis_id: Mapped[int] = mapped_column(
+        ForeignKey("bayesian_analysis.id", ondelete="CASCADE"), primary_key=True)
+    category_id: Mapped[int] = mapped_column(
+        ForeignKey("data_tag_category.id", ondelete="CASCADE"), primary_key=True)
+    count: Mapped[int] = mapped_column(default=0)
+
+
+class AnalysisWordCountModel(Base):  # pylint: disable=too-few-public-methods
+    """The number of documents of an analysis tagged with a category that contain a word."""
+
+    __tablename__ = "analysis_word_count"
+    analysis_id: Mapped[int] = mapped_column(
+        ForeignKey("bayesian_analysis.id", ondelete="CASCADE"), primary_key=True)
+    category_id: Mapped[int] = mapped_column(
+        ForeignKey("data_tag_category.id", ondelete="CASCADE"), primary_key=True)
+    word: Mapped[str] = mapped_column(String, primary_key=True)
+    count: Mapped[int] = mapped_column(default=0)
+
+
+class AnalysisCountDeltaModel(Base):  # pylint: disable=too-few-public-methods
+    """A pending change to a count of an analysis, appended when a document is tagged.
+
+    Deltas are folded into the counts above by ``BayesianAnalysisModel.compact_counts``,
+    until then they're added to the counts when they're read.
+    """
+
+    __tablename__ = "analysis_count_delta"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    analysis_id: Mapped[int] = mapped_column(
+        ForeignKey("bayesian_analysis.id", ondelete="CASCADE"), index=True)
+    category_id: Mapped[int] = mapped_column(ForeignKey("data_tag_category.id", ondelete="CASCADE"))
+    word: Mapped[t.Optional[str]] = mapped_column(String, nullable=True)  # None for the category count
+    n: Mapped[int] = mapped_column(default=1)
+    time_created: Mapped[datetime] = mapped_column(nullable=False, default=datetime.utcnow)
+
+
+# (category id, word or None for the count of the category, n)
+CountRow = t.Tuple[int, t.Optional[str], int]
+
+# the dialects with INSERT ... ON CONFLICT
+_UPSERTS: t.Dict[str, t.Callable[..., t.Union[postgresql.Insert, sqlite.Insert]]] = {
+    "postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert_counts(session: Session, analysis_id: int, rows: t.Iterable[CountRow], increment: bool = True) -> None:
+    """Adds to the counts of an analysis, atomically.
+
+    The rows are written with INSERT ... ON CONFLICT DO UPDATE SET count = count + n,
+    so the counts aren't read first and concurrent writers don't lose each other's
+    updates. Rows are summed by key and written in key order, so concurrent writers
+    lock them in the same order.
+
+    Args:
+        session: The session to write in
+        analysis_id: The analysis
+        rows: The counts to add, the same key may come more than once
+        increment: Whether to add to existing counts, otherwise they're left as they are
+                   (to seed counts more than one writer may seed)
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect not in _UPSERTS:
+        raise NotImplementedError(f"Atomic counts aren't supported on {dialect}")
+    sums: t.Counter[t.Tuple[int, t.Optional[str]]] = Counter()
+    for category_id, word, n in rows:
+        sums[category_id, word] += n
+    categories = sorted((key[0], n) for key, n in sums.items() if key[1] is None)
+    words = sorted((key[0], key[1], n) for key, n in sums.items() if key[1] is not None)
+    upserts: t.List[t.Tuple[t.Any, t.List[str], t.List[t.Dict[str, t.Any]]]] = [
+        (AnalysisCategoryCountModel.__table__, ["analysis_id", "category_id"], [
+            {"analysis_id": analysis_id, "category_id": category_id, "count": n}
+            for category_id, n in categories]),
+        (AnalysisWordCountModel.__table__, ["analysis_id", "category_id", "word"], [
+            {"analysis_id": analysis_id, "category_id": category_id, "word": word, "count": n}
+            for category_id, word, n in words])]
+    for table, keys, values in upserts:
+        if not values:
+            continue
+        stmt = _UPSERTS[dialect](table)
+        if increment:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=keys, set_={"count": table.c["count"] + stmt.excluded["count"]})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+        session.execute(stmt, values)
+
+
+def claim_deltas(session: Session, analysis_id: int) -> t.List[CountRow]:
+    """Deletes the pending deltas of an analysis, returning them.
+
+    A delta is claimed by one caller only, a delta appended meanwhile is left for the next.
+    """
+    table = AnalysisCountDeltaModel.__table__
+    return [tuple(row) for row in session.execute(  # type: ignore
+        delete(table).where(table.c.analysis_id == analysis_id)
+        .returning(table.c.category_id, table.c.word, table.c.n))]
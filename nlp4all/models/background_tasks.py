@@ -3,6 +3,8 @@
 This module contains the model for background task processing.
 """
 
+import typing as t
+from datetime import datetime
 from sqlalchemy import String, Enum
 from sqlalchemy.orm import Mapped, mapped_column
 from ..database import Base, BackgroundTaskStatus, TimestampMixin
@@ -19,6 +21,11 @@ class BackgroundTaskModel(TimestampMixin, Base):
         task_status: The status of the background task.
         total_steps: The total number of steps in the background task.
         current_step: The current step of the background task.
+        status_message: A message describing the status of the background task.
+        rows_processed: The number of rows processed, for tasks that process rows.
+        rows_per_second: The throughput of the background task, for tasks that process rows.
+        eta_seconds: The estimated number of seconds until the background task is done.
+        heartbeat_at: The last time the worker running the task reported it is alive (UTC).
     Mixin Attributes:
         created_at: The date and time the model was created.
         updated_at: The date and time the model was last updated.
@@ -34,3 +41,14 @@ class BackgroundTaskModel(TimestampMixin, Base):
     total_steps: Mapped[int] = mapped_column(nullable=True)
     current_step: Mapped[int] = mapped_column(default=0, nullable=True)
     status_message: Mapped[str] = mapped_column(String(256), nullable=True)
+    rows_processed: Mapped[t.Optional[int]] = mapped_column(nullable=True)
+    rows_per_second: Mapped[t.Optional[float]] = mapped_column(nullable=True)
+    eta_seconds: Mapped[t.Optional[float]] = mapped_column(nullable=True)
+    heartbeat_at: Mapped[t.Optional[datetime]] = mapped_column(nullable=True)
+
+    @property
+    def progress(self) -> t.Optional[float]:
+        """The fraction of the task that is done, None if unknown."""
+        if not self.total_steps:
+            return None
+        return min((self.current_step or 0) / self.total_steps, 1.0)
@@ -2,10 +2,19 @@
 
 import typing as t
 
-from sqlalchemy import String, ForeignKey
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy import String, ForeignKey, insert, literal, null, select, union_all
+from sqlalchemy.orm import relationship, Mapped, mapped_column, object_session, Session
 
 from ..database import Base, MutableJSON
+from ..helpers.naive_bayes import CountStore, NaiveBayesScorer
+from .analysis_counts import (
+    AnalysisCategoryCountModel,
+    AnalysisCountDeltaModel,
+    AnalysisWordCountModel,
+    CountRow,
+    claim_deltas,
+    upsert_counts
+)
 
 if t.TYPE_CHECKING:
     from .bayesian_robot import BayesianRobotModel
@@ -37,19 +46,118 @@ class BayesianAnalysisModel(Base):
         """Get project."""
         return self.project
 
-    # pylint: disable=unsupported-assignment-operation, unsubscriptable-object
-    def updated_data(self, tweet, category):
-        """Update data."""
-        self.data["counts"] = self.data["counts"] + 1  # type: ignore
-        if category.name not in self.data.keys():  # type: ignore # pylint: disable=no-member
-            self.data[category.name] = {"counts": 0, "words": {}}  # type: ignore
-        self.data[category.name]["counts"] = (self.data[category.name].get("counts", 0)) + 1  # type: ignore
-        for word in set(tweet.words):  # type: ignore
-            val = self.data[category.name]["words"].get(word, 0)
-            self.data[category.name]["words"][word] = val + 1  # type: ignore
-        return self.data
+    # the word counts, loaded on first use (see counts)
+    _count_store: t.Optional[CountStore[int]] = None
 
-    # pylint: enable=unsupported-assignment-operation, unsubscriptable-object
+    @property
+    def counts(self) -> CountStore[int]:
+        """The word counts of the tagged documents, by category id, loaded on first use"""
+        if self._count_store is None:
+            self._count_store = self._load_counts()
+        return self._count_store
+
+    def _load_counts(self) -> CountStore[int]:
+        """Loads the word counts from their tables, adding the deltas that weren't compacted yet.
+
+        The counts and the deltas are read in one statement, so a compaction can't
+        count a delta twice or not at all.
+        """
+        session = object_session(self)
+        if session is None or self.id is None:
+            return self._legacy_counts()
+        categories = AnalysisCategoryCountModel
+        words = AnalysisWordCountModel
+        deltas = AnalysisCountDeltaModel
+        rows = session.execute(union_all(
+            select(literal(0), categories.category_id, null().label("word"), categories.count)
+            .where(categories.analysis_id == self.id),
+            select(literal(0), words.category_id, words.word, words.count)
+            .where(words.analysis_id == self.id),
+            select(literal(1), deltas.category_id, deltas.word, deltas.n)
+            .where(deltas.analysis_id == self.id))).all()
+        snapshot = [row for row in rows if row[0] == 0]
+        pending = [row for row in rows if row[0] == 1]
+        if any(row[2] is None for row in snapshot):
+            store: CountStore[int] = CountStore()
+            store.set_counts(
+                [row[1] for row in snapshot if row[2] is None], None, [row[3] for row in snapshot if row[2] is None])
+            snapshot = [row for row in snapshot if row[2] is not None]
+            store.set_counts([row[1] for row in snapshot], [row[2] for row in snapshot], [row[3] for row in snapshot])
+        else:
+            store = self._legacy_counts()
+        store.add_counts([row[1] for row in pending], [row[2] for row in pending], [row[3] for row in pending])
+        return store
+
+    def _legacy_counts(self) -> CountStore[int]:
+        """The word counts kept in data by category name, before they had their own tables"""
+        category_ids = {c.name: c.id for c in self.project.categories} if self.project else {}
+        return CountStore.from_data(self.data, category_ids.get)
+
+    @staticmethod
+    def _count_rows(store: CountStore[int]) -> t.List[CountRow]:
+        """The counts of a store as (category id, word, n) rows, None for the counts of the categories"""
+        counts = store.counts
+        rows, columns = counts.nonzero()
+        return [
+            *((category, None, int(count)) for category, count in zip(store.categories, store.category_counts)),
+            *((store.categories[row], store.words[column], int(counts[row, column]))
+              for row, column in zip(rows, columns))]
+
+    def count_tag(self, tweet, category, n: int = 1) -> None:
+        """Counts a document tagged with a category, and each of its words once.
+
+        The counts are appended as deltas (one row for the category and one per word),
+        which ``compact_counts`` folds into the count tables later. The loaded counts
+        (if they are) are updated in place.
+
+        Args:
+            tweet: The document, anything with words
+            category: The category it was tagged with, anything with an id
+            n: How many times to count it, negative to uncount
+        """
+        words = list(dict.fromkeys(tweet.words))
+        session = object_session(self)
+        if session is None:
+            self.counts.add(category.id, words, n)
+            return
+        if self.id is None:
+            session.flush()
+        session.execute(insert(AnalysisCountDeltaModel), [
+            {"analysis_id": self.id, "category_id": category.id, "word": word, "n": n}
+            for word in [None, *words]])
+        if self._count_store is not None:
+            self._count_store.add(category.id, words, n)
+
+    def compact_counts(self, session: Session) -> int:
+        """Folds the pending deltas of the analysis into its count tables.
+
+        The deltas are deleted as they're read, so a delta appended meanwhile is left
+        for the next compaction, and added with atomic upserts (see ``upsert_counts``),
+        so compactions may run concurrently. Analyses that still keep their counts in
+        data are moved to the tables on their first compaction.
+
+        Args:
+            session: The session to compact in, committed by the caller
+
+        Returns:
+            int: The number of deltas folded
+        """
+        claimed = claim_deltas(session, self.id)
+        if not claimed:
+            return 0
+        has_rows = session.execute(
+            select(AnalysisCategoryCountModel.category_id)
+            .where(AnalysisCategoryCountModel.analysis_id == self.id).limit(1)).first() is not None
+        if not has_rows:
+            # the counts are still in data, another compaction may be seeding them as well
+            upsert_counts(session, self.id, self._count_rows(self._legacy_counts()), increment=False)
+        upsert_counts(session, self.id, claimed)
+        return len(claimed)
+
+    def counts_data(self) -> t.Dict[str, t.Any]:
+        """The word counts as the nested dictionaries data used to keep, by category name"""
+        names = {c.id: c.name for c in self.project.categories}
+        return self.counts.to_data(names.get)
 
     # pylint: disable=unsupported-assignment-operation, unsubscriptable-object
     def updated_a_tags(self, atag, tweet):
@@ -63,41 +171,20 @@ class BayesianAnalysisModel(Base):
 
     # pylint: enable=unsupported-assignment-operation, unsubscriptable-object
 
-    # pylint: disable=unsupported-assignment-operation, unsubscriptable-object
+    def scorer(self) -> t.Tuple[NaiveBayesScorer[int], t.List[str]]:
+        """Scores words and documents by category, and the names of the categories
+
+        Only the categories of the project that have been tagged are scored.
+        """
+        store = self.counts
+        categories = [c for c in self.project.categories if c.id in store.category_index]
+        return NaiveBayesScorer(store, [c.id for c in categories]), [c.name for c in categories]
+
     def get_predictions_and_words(self, words):
-        """Get predictions and words."""
-        # take each word  and  calculate a probabilty for each category
-        categories = self.project.categories
-        # type: ignore # pylint: disable=no-member
-        category_names = [c.name for c in categories if c.name in self.data.keys()]
-        preds = {}
-        predictions = {}
-        if self.data["counts"] == 0:  # type: ignore
-            predictions = {c: {w: 0} for w in words for c in category_names}
-            # predictions = {word : {category : 0 for category in category_names} for word in words}
-        else:
-            for word in words:  # only categorize each word once
-                preds[word] = {c: 0 for c in category_names}
-                for cat in category_names:
-                    predictions[cat] = predictions.get(cat, {})
-                    prob_ba = self.data[cat]["words"].get(word, 0) / self.data[cat]["counts"]
-                    prob_a = self.data[cat]["counts"] / self.data["counts"]  # type: ignore
-                    prob_b = (
-                        sum(  # pylint: disable=consider-using-generator
-                            [self.data[c]["words"].get(word, 0) for c in category_names]
-                        )  # pylint: disable=consider-using-generator
-                        / self.data["counts"]  # type: ignore
-                    )
-                    if prob_b == 0:
-                        preds[word][cat] = 0
-                        predictions[cat][word] = 0
-                    else:
-                        preds[word][cat] = round(prob_ba * prob_a / prob_b, 2)
-                        predictions[cat][word] = round(prob_ba * prob_a / prob_b, 2)
-
-        return (
-            preds,
-            {k: round(sum(v.values()) / len(set(words)), 2) for k, v in predictions.items()},
-        )
+        """Get predictions and words.
 
-    # pylint: enable=unsupported-assignment-operation, unsubscriptable-object
+        Returns:
+            The probability of each category by word, and the mean of each category over the words
+        """
+        scorer, names = self.scorer()
+        return scorer.predictions_and_words(words, names)
@@ -9,6 +9,7 @@ from sqlalchemy import String, ForeignKey
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from ..database import Base, MutableJSON
+from ..helpers.feature_index import FeatureIndex
 
 if t.TYPE_CHECKING:
     from .bayesian_analysis import BayesianAnalysisModel
@@ -66,21 +67,7 @@ class BayesianRobotModel(Base):
         Returns:
             bool: True if the word is in the features of the robot, False otherwise.
         """
-        for feature in self.features.keys():  # type: ignore
-            feature_string = feature.lower()
-            if feature_string.startswith("*") and feature_string.endswith("*"):
-                if feature_string[1:-1] in word:
-                    return True
-            elif feature_string.startswith("*"):
-                if word.endswith(feature_string[1:]):
-                    return True
-            elif feature_string.endswith("*"):
-                if word.startswith(feature_string[:1]):
-                    return True
-            else:
-                if word == feature_string:
-                    return True
-        return False
+        return any(BayesianRobotModel.matches(word, feature) for feature in self.features.keys())  # type: ignore
 
     def calculate_accuracy(self, ):  # pylint: disable=too-many-locals, too-many-branches, too-many-statements
         """Calculates the accuracy of the robot.
@@ -91,14 +78,9 @@ class BayesianRobotModel(Base):
         # @TODO: This function is too long and needs to be refactored.
         analysis_obj = self.analysis
         proj_obj = analysis_obj.project
-        tf_idf = proj_obj.tf_idf
-        feature_words = {}
-        words = tf_idf.get("words", {})
-        for feature in self.features:
-            feature_words[feature] = [
-                word for word in words
-                if BayesianRobotModel.matches(word, feature)
-            ]
+        words = proj_obj.tf_idf.get("words", {})
+        index = proj_obj.feature_index()
+        feature_words = {feature: index.expand(feature) for feature in self.features}
         # relevant_words = [w for words in feature_words.values() for w in words]
         # first calculate the predictions, based on the training sets.
         predictions_by_feature = {}
@@ -304,20 +286,7 @@ class BayesianRobotModel(Base):
 
     def feature_words(self, a_feature, tf_idf):
         """Return a list of words that match a feature."""
-        return_list = []
-        words = tf_idf.get("words")
-        feature_string = a_feature.lower()
-        for word in words:
-            if feature_string.startswith("*") and feature_string.endswith("*"):
-                if feature_string[1:-1] in word:
-                    return_list.append(word)
-            elif feature_string.startswith("*"):
-                if word.endswith(feature_string[1:]):
-                    return_list.append(word)
-            elif feature_string.endswith("*"):
-                if word.startswith(feature_string[:1]):
-                    return_list.append(word)
-            else:
-                if word == feature_string:
-                    return_list.append(word)
-        return return_list
+        project = self.analysis.project if self.analysis is not None else None
+        if project is not None and tf_idf is project.tf_idf:
+            return project.feature_index().expand(a_feature)
+        return FeatureIndex(tf_idf.get("words")).expand(a_feature)
@@ -16,6 +16,7 @@ if TYPE_CHECKING:
     from .data_tag_category import DataTagCategoryModel
 
 from ..helpers.datasets import create_n_split_tnt_sets
+from ..helpers.naive_bayes import CountStore, NaiveBayesScorer
 
 
 class ConfusionMatrixModel(Base):  # pylint: disable=too-many-instance-attributes
@@ -71,44 +72,14 @@ class ConfusionMatrixModel(Base):  # pylint: disable=too-many-instance-attribute
         self.training_and_test_sets = create_n_split_tnt_sets(30, self.ratio, tweet_id_and_cat)  # type: ignore
         return self.training_and_test_sets
 
+    def scorer(self) -> NaiveBayesScorer[str]:
+        """Scores words and documents with the training data, by category name"""
+        return NaiveBayesScorer(CountStore.from_data(self.train_data), [c.name for c in self.categories])
+
     def get_predictions_and_words(self, words):
         """Get predictions and words."""
         # works the same way as for bayesian analysis
-        categories = self.categories
-        category_names = [c.name for c in categories]
-        preds = {}
-        predictions = {}
-        if self.train_data["counts"] == 0:  # type: ignore
-            predictions = {c: {w: 0} for w in words for c in category_names}
-            # predictions = {word : {category : 0 for category in category_names} for word in words}
-        else:
-            for word in words:  # only categorize each word once
-                preds[word] = {c: 0 for c in category_names}
-                for cat in category_names:
-                    predictions[cat] = predictions.get(cat, {})
-                    prob_ba = (
-                        self.train_data[cat]["words"].get(word, 0) / self.train_data[cat]["counts"]
-                    )
-                    prob_a = (
-                        self.train_data[cat]["counts"] /
-                        self.train_data["counts"])  # type: ignore
-                    prob_b = (
-                        sum(  # pylint: disable=consider-using-generator
-                            [self.train_data[c]["words"].get(word, 0) for c in category_names]
-                        )
-                        / self.train_data["counts"]  # type: ignore
-                    )
-                    if prob_b == 0:
-                        preds[word][cat] = 0
-                        predictions[cat][word] = 0
-                    else:
-                        preds[word][cat] = round(prob_ba * prob_a / prob_b, 2)
-                        predictions[cat][word] = round(prob_ba * prob_a / prob_b, 2)
-
-        return (
-            preds,
-            {k: round(sum(v.values()) / len(set(words)), 2) for k, v in predictions.items()},
-        )
+        return self.scorer().predictions_and_words(words)
 
     def train_model(self, train_tweet_ids):
         """Train model."""
@@ -131,13 +102,14 @@ class ConfusionMatrixModel(Base):  # pylint: disable=too-many-instance-attribute
             t.id: {"predictions": 0, "pred_cat": "", "probability": 0, "relative probability": 0}
             for t in test_tweets
         }
-        words = {t.id: "" for t in test_tweets}
-
-        for a_tweet in test_tweets:
-            (
-                words[a_tweet.id],  # type: ignore
-                matrix_data[a_tweet.id]["predictions"],
-            ) = self.get_predictions_and_words(set(a_tweet.words))
+        # score all of the test tweets at once
+        scorer = self.scorer()
+        scores = scorer.score_batch([scorer.encode(a_tweet.words) for a_tweet in test_tweets], decimals=2)
+
+        for a_tweet, document_scores in zip(test_tweets, scores.documents.tolist()):
+            matrix_data[a_tweet.id]["predictions"] = {
+                name: round(score, 2) for name, score in zip(scorer.categories, document_scores)
+            } if a_tweet.words else {}
             # if no data
             if bool(matrix_data[a_tweet.id]["predictions"]) is False:
                 matrix_data[a_tweet.id]["pred_cat"] = "none"
@@ -11,6 +11,7 @@ from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database import Base, NestedMutableJSONB
+from ..helpers.data_source import compile_path
 
 if t.TYPE_CHECKING:
     from .data_source import DataSourceModel
@@ -40,7 +41,8 @@ class DataModel(Base):  # pylint: disable=too-few-public-methods
         """Returns the text of the document"""
         if self._text_path is None:
             self._text_path = self.data_source.document_text_path
-        return self.document[self._text_path]
+        values = compile_path(self._text_path).values(self.document)
+        return " ".join(str(value) for value in values if value is not None)
 
 
 # DataModel.__table__.append_constraint(
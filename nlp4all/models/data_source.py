@@ -8,12 +8,13 @@ from __future__ import annotations
 
 import typing as t
 import enum
-from sqlalchemy import String, Text, ForeignKey, Enum
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy import String, Text, ForeignKey, Enum, event
+from sqlalchemy.orm import relationship, Mapped, mapped_column, validates
 
 from ..database import Base, NestedMutableJSONB, MutableJSONB, project_data_source_table, BackgroundTaskMixin
-from ..helpers.data_source import schema_aliased_path_dict
+from ..helpers.data_source import SchemaPathMaps, schema_fingerprint, schema_path_maps
 from ..helpers.filterable import Filterable
+from ..helpers.filterable_query import And, Or, compile_filters
 
 
 if t.TYPE_CHECKING:
@@ -41,6 +42,8 @@ class DataSourceModel(BackgroundTaskMixin, Base):  # pylint: disable=too-few-pub
         back_populates="data_sources")
     meta: Mapped[dict] = mapped_column(MutableJSONB, nullable=True, default=dict)
     schema: Mapped[dict] = mapped_column(NestedMutableJSONB, nullable=True)
+    # schema_fingerprint(schema), set with the schema, recomputed when it is changed in place
+    schema_fingerprint: Mapped[t.Optional[str]] = mapped_column(String(64), nullable=True)
     filename: Mapped[str] = mapped_column(String(80), nullable=True)
     data_source_name: Mapped[str] = mapped_column(String(80), nullable=False)
     data_source_description: Mapped[str] = mapped_column(Text(), nullable=True)
@@ -54,6 +57,14 @@ class DataSourceModel(BackgroundTaskMixin, Base):  # pylint: disable=too-few-pub
     # shared
     # groups / projects /etc need to be implemented
     document_collection_prefix: str = "user_data_"
+    # set when filterables change, index_data_source is dispatched when the change is committed
+    indexes_outdated: bool = False
+
+    @validates('schema')
+    def _fingerprint_schema(self, _key: str, schema: t.Optional[dict]) -> t.Optional[dict]:
+        """Updates the schema fingerprint when the schema is set"""
+        self.schema_fingerprint = schema_fingerprint(schema) if schema is not None else None
+        return schema
 
     @property
     def ready(self) -> bool:
@@ -129,6 +140,24 @@ class DataSourceModel(BackgroundTaskMixin, Base):  # pylint: disable=too-few-pub
         """Returns the filterables"""
         return self.meta['filterables']
 
+    def add_filterable(self, filterable: Filterable):
+        """Adds (or replaces) a filterable, its index is built by index_data_source when the data source is saved"""
+        # a new dict, meta only tracks changes to its own keys
+        self.meta['filterables'] = {**self.meta.get('filterables', {}), filterable.name: filterable.to_dict()}
+        self.indexes_outdated = True
+
+    def remove_filterable(self, name: str):
+        """Removes a filterable, its index is dropped by index_data_source when the data source is saved"""
+        filterables = dict(self.meta.get('filterables', {}))
+        del filterables[name]
+        self.meta['filterables'] = filterables
+        self.indexes_outdated = True
+
+    @property
+    def index_report(self) -> t.Optional[t.Dict[str, t.Any]]:
+        """Returns the indexes created and dropped by the last index build, and the index sizes"""
+        return self.meta.get('indexes') if self.meta is not None else None
+
     @property
     def aliased_paths(self) -> t.Dict[str, t.Tuple[str, ...]]:
         """Returns the aliased paths"""
@@ -139,13 +168,28 @@ class DataSourceModel(BackgroundTaskMixin, Base):  # pylint: disable=too-few-pub
         """Sets the aliased paths"""
         self.meta['aliased_paths'] = paths
 
+    @property
+    def awaiting_import(self) -> bool:
+        """True if only the schema of the upload was discovered, the data is imported after fields are selected"""
+        return self.meta is not None and self.meta.get('import_phase') == 'discovered'
+
     def aliased_path(self, name: str) -> t.Tuple[str, ...]:
         """Returns an aliased path"""
         return self.meta['aliased_paths'][name]
 
+    def path_maps_from_schema(self) -> SchemaPathMaps:
+        """Returns the path aliases and their types from the schema, cached by the schema fingerprint"""
+        if self.schema_fingerprint is None:
+            self.schema_fingerprint = schema_fingerprint(self.schema)
+        return schema_path_maps(self.schema, self.schema_fingerprint)
+
     def path_aliases_from_schema(self) -> dict[str, t.Tuple[str, ...]]:
         """Returns the path aliases from the schema"""
-        return schema_aliased_path_dict(self.schema)
+        return self.path_maps_from_schema().paths
+
+    def path_types_from_schema(self) -> dict[str, t.Tuple[str, ...]]:
+        """Returns the types of the path aliases from the schema"""
+        return self.path_maps_from_schema().types
 
     def filterable(self, name: str) -> Filterable:
         """Returns the filterable"""
@@ -153,3 +197,32 @@ class DataSourceModel(BackgroundTaskMixin, Base):  # pylint: disable=too-few-pub
         if self._filterable_has_required_keys(f):
             return Filterable.from_dict(f)
         raise ValueError(f"Filterable {name} is missing required keys")
+
+    def filter_query(self, values: t.Mapping[str, t.Any], match_all: bool = True) -> t.Union[And, Or]:
+        """Returns the conditions for values chosen for filterables, see helpers.filterable_query
+
+        Use ``.to_mongo()`` for the data source collection, ``.to_postgres(DataModel.document)`` for its data.
+        Raises KeyError for values of unknown filterables, see ``compile_filters``.
+        """
+        known = (self.meta or {}).get('filterables', {})
+        # unknown names are left for compile_filters to report
+        filterables = {name: self.filterable(name) for name in values if name in known}
+        return compile_filters(filterables, values, match_all)
+
+
+@event.listens_for(DataSourceModel.schema, "modified")
+def _schema_modified(target: DataSourceModel, _initiator: t.Any) -> None:
+    """Clears the schema fingerprint when the schema is changed in place
+
+    The mutable JSON types report a change before making it, so the fingerprint is
+    computed again when it is needed, or when the data source is saved.
+    """
+    target.schema_fingerprint = None
+
+
+@event.listens_for(DataSourceModel, "before_insert")
+@event.listens_for(DataSourceModel, "before_update")
+def _fingerprint_schema(_mapper: t.Any, _connection: t.Any, target: DataSourceModel) -> None:
+    """Saves the fingerprint of a schema that was changed in place"""
+    if target.schema_fingerprint is None and target.schema is not None:
+        target.schema_fingerprint = schema_fingerprint(target.schema)
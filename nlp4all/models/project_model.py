@@ -4,11 +4,13 @@ from __future__ import annotations
 
 import enum
 import typing as t
+import uuid
 # from random import sample
-from sqlalchemy import Integer, String, ForeignKey, Enum
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy import Integer, String, ForeignKey, Enum, event
+from sqlalchemy.orm import relationship, Mapped, mapped_column, validates
 
 from ..database import Base, project_data_source_table, project_categories_table, MutableJSON, user_group_project_table
+from ..helpers.feature_index import FeatureIndex, feature_index
 
 if t.TYPE_CHECKING:
     from .data_source import DataSourceModel
@@ -46,6 +48,9 @@ class ProjectModel(Base):
         secondary=project_data_source_table,
         back_populates="projects")
     tf_idf: Mapped[dict] = mapped_column(MutableJSON)  # what is this?
+    # a random version of the words in tf_idf, set with tf_idf and when it is changed in place,
+    # the feature index is cached by it (with the id, so projects copying a tf_idf are told apart)
+    vocabulary_version: Mapped[t.Optional[str]] = mapped_column(String(32), nullable=True)
     # remove? or replace with data?
     # tweets = relationship("Tweet", secondary="tweet_project", lazy="dynamic")
 
@@ -55,6 +60,18 @@ class ProjectModel(Base):
         default=ProjectStatus.DRAFT.value,
         nullable=False)
 
+    @validates('tf_idf')
+    def _version_vocabulary(self, _key: str, tf_idf: t.Optional[dict]) -> t.Optional[dict]:
+        """Sets a new vocabulary version when tf_idf is set"""
+        self.vocabulary_version = uuid.uuid4().hex
+        return tf_idf
+
+    def feature_index(self) -> FeatureIndex:
+        """Returns the index of the words of the vocabulary, cached by the vocabulary version"""
+        if self.vocabulary_version is None:
+            self.vocabulary_version = uuid.uuid4().hex
+        return feature_index((self.id, self.vocabulary_version), (self.tf_idf or {}).get("words", {}))
+
     def get_tweets(self):
         """Get tweets."""
         return [t for cat in self.categories for t in cat.data]  # pylint: disable=not-an-iterable
@@ -64,3 +81,21 @@ class ProjectModel(Base):
     #     tweet_ids = self.data.options(load_only("id")).all()  # pylint: disable=no-member
     #     the_tweet_id = sample(tweet_ids, 1)[0]
     #     return Data.query.get(the_tweet_id.id)
+
+
+@event.listens_for(ProjectModel.tf_idf, "modified")
+def _tf_idf_modified(target: ProjectModel, _initiator: t.Any) -> None:
+    """Clears the vocabulary version when tf_idf is changed in place
+
+    The mutable JSON types report a change before making it, so a new version is set
+    when the index is needed, or when the project is saved.
+    """
+    target.vocabulary_version = None
+
+
+@event.listens_for(ProjectModel, "before_insert")
+@event.listens_for(ProjectModel, "before_update")
+def _version_vocabulary(_mapper: t.Any, _connection: t.Any, target: ProjectModel) -> None:
+    """Saves a new vocabulary version for a tf_idf that was changed in place"""
+    if target.vocabulary_version is None:
+        target.vocabulary_version = uuid.uuid4().hex
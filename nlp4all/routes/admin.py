@@ -21,3 +21,4 @@ AdminRouter.route("/manage_categories", methods=["GET", "POST"])(
 AdminRouter.route("/add_org", methods=["GET", "POST"])(AdminController.add_org)
 AdminRouter.route("/celery_test/<int:x>/<int:y>", methods=["GET"])(AdminController.celery_test)
 AdminRouter.route("/celery_result/<string:task_id>", methods=["GET"])(AdminController.celery_result)
+AdminRouter.route("/mongo_status", methods=["GET"])(AdminController.mongo_status)
@@ -27,3 +27,9 @@ DataSourceRouter.route("/save",
                        methods=["GET", "POST"])(DataSourceController.save)
 DataSourceRouter.route("/inspect/<int:datasource_id>",
                        methods=["GET", "POST"])(DataSourceController.inspect)
+DataSourceRouter.route("/export/<int:datasource_id>",
+                       methods=["GET"])(DataSourceController.export)
+DataSourceRouter.route("/export/<int:datasource_id>/ndjson",
+                       methods=["GET"])(DataSourceController.export_ndjson)
+DataSourceRouter.route("/browse/<int:datasource_id>",
+                       methods=["GET"])(DataSourceController.browse)
@@ -0,0 +1,111 @@
+"""
+Benchmark suite tests, the benchmarks themselves are run with ``python -m benchmarks.ingest``.
+"""
+
+import csv
+import json
+import pytest
+
+from benchmarks import analysis_counts
+from benchmarks import feature_index
+from benchmarks import generators
+from benchmarks import naive_bayes
+from benchmarks import paths
+from benchmarks.ingest import main
+from nlp4all.helpers.data_source import schema_aliased_path_dict
+
+
+@pytest.mark.data
+@pytest.mark.parametrize("dataset", list(generators.DATASETS))
+def test_generators(tmp_path, dataset):
+    """The data sets have the requested number of rows, and are the same every time."""
+    file_path = generators.dataset_file(dataset, 50, tmp_path)
+    if file_path.suffix == ".csv":
+        with file_path.open(newline="", encoding="utf-8") as f:
+            assert len(list(csv.DictReader(f))) == 50
+    else:
+        with file_path.open(encoding="utf-8") as f:
+            assert len([json.loads(line) for line in f]) == 50
+    generator, _ = generators.DATASETS[dataset]
+    assert generator(tmp_path / "again", 50).read_bytes() == file_path.read_bytes()
+
+
+@pytest.mark.data
+def test_ingest_benchmark(tmp_path):
+    """The benchmark runs and writes its results as JSON."""
+    output = tmp_path / "results.json"
+    main(["--rows", "100", "--data-dir", str(tmp_path), "--collection", "null",
+          "--in-process", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert report["meta"]["benchmark"] == "ingest"
+    assert [r["dataset"] for r in report["results"]] == list(generators.DATASETS)
+    for result in report["results"]:
+        assert result["rows"] == 100
+        assert result["rows_per_second"] > 0
+        assert result["schema_seconds"] > 0
+        assert result["peak_rss_mb"] > 0
+
+
+@pytest.mark.data
+def test_wide_schema():
+    """The synthetic schemas have the requested number of paths."""
+    schema = generators.wide_schema(1234, fanout=7)
+    assert len(schema_aliased_path_dict(schema)) == 1234
+    assert schema == generators.wide_schema(1234, fanout=7)
+
+
+@pytest.mark.data
+def test_paths_benchmark(tmp_path):
+    """The schema path benchmark runs and writes its results as JSON."""
+    output = tmp_path / "results.json"
+    paths.main(["--paths", "100", "500", "--repeat", "1", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert report["meta"]["benchmark"] == "paths"
+    assert [r["paths"] for r in report["results"]] == [100, 500]
+    for result in report["results"]:
+        assert 0 < result["remove"] < result["paths"]
+        assert result["minimum_paths_for_deletion"] > 0
+
+
+@pytest.mark.data
+def test_tagged_documents():
+    """Tagged documents are the same every time, and draw from the vocabulary."""
+    documents = generators.tagged_documents(20, vocabulary=50, categories=3, words=5)
+    assert documents == generators.tagged_documents(20, vocabulary=50, categories=3, words=5)
+    assert {category for category, _ in documents} <= {"c0", "c1", "c2"}
+    assert all(len(words) == 5 and all(0 <= int(w[1:]) < 50 for w in words) for _, words in documents)
+
+
+def test_naive_bayes_benchmark(tmp_path):
+    """The naive Bayes benchmark runs and writes its results as JSON."""
+    output = tmp_path / "results.json"
+    naive_bayes.main(["--documents", "50", "--vocabulary", "100", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert report["meta"]["benchmark"] == "naive_bayes"
+    assert report["results"][0]["documents"] == 50
+    assert report["results"][0]["batch"] > 0
+
+
+def test_analysis_counts_benchmark(tmp_path):
+    """Concurrent taggers don't lose counts, and the results are written as JSON."""
+    output = tmp_path / "results.json"
+    analysis_counts.main([
+        "--taggers", "4", "--documents", "25", "--modes", "upsert", "delta", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert report["meta"]["benchmark"] == "analysis_counts"
+    assert [r["mode"] for r in report["results"]] == ["upsert", "delta"]
+    for result in report["results"]:
+        assert result["documents"] == 100
+        assert result["errors"] == 0
+        assert result["lost"] == 0
+        assert result["tags_per_second"] > 0
+
+
+def test_feature_index_benchmark(tmp_path):
+    """The feature index benchmark runs and writes its results as JSON."""
+    output = tmp_path / "results.json"
+    feature_index.main(["--vocabulary", "500", "--features", "12", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert report["meta"]["benchmark"] == "feature_index"
+    assert report["results"][0]["features"] == 12
+    assert report["results"][0]["matches"] > 0
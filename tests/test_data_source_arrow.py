@@ -0,0 +1,270 @@
+"""
+Parquet / Arrow import and export tests.
+"""
+
+import datetime
+import json
+import os
+import decimal
+import pytest
+
+from nlp4all.helpers.data_source import generate_schema, projection_tree, schema_aliased_path_dict
+from nlp4all.helpers.data_source_arrow import (
+    ArrowRecordReader,
+    columnar_format,
+    EXTRA_FIELDS_COLUMN,
+    export_parquet,
+    schema_to_arrow_type
+)
+from nlp4all.helpers.data_source_ingest import ingest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+class FindCollection:
+    """Serves and collects documents, in place of a mongo collection."""
+
+    def __init__(self, documents=None):
+        self.documents = list(documents or [])
+
+    def find(self, query=None, projection=None, batch_size=None):  # pylint: disable=unused-argument
+        """All documents, without their ids."""
+        return [{k: v for k, v in d.items() if k != "_id"} for d in self.documents]
+
+    def insert_many(self, documents, ordered=True):  # pylint: disable=unused-argument
+        """Records the inserted documents."""
+        self.documents += documents
+
+
+def _table(rows=25):
+    return pa.table({
+        "id": pa.array(range(rows), pa.int64()),
+        "text": pa.array([f"tweet {i}" for i in range(rows)]),
+        "created": pa.array([datetime.date(2023, 1, 1 + i % 28) for i in range(rows)]),
+        "score": pa.array([decimal.Decimal(i) / 4 for i in range(rows)], pa.decimal128(5, 2)),
+        "user": pa.array([{"name": f"u{i}", "tags": ["a", "b"][:i % 3]} for i in range(rows)]),
+        "lang": pa.array(["en", "da"] * (rows // 2) + ["en"] * (rows % 2)).dictionary_encode(),
+    })
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_columnar_format():
+    """Columnar files are recognized from their suffix."""
+    assert columnar_format("tweets.parquet") == "parquet"
+    assert columnar_format("tweets.ARROW") == "arrow"
+    assert columnar_format("tweets.jsonl") is None
+
+
+@pytest.mark.data
+@pytest.mark.helper
+@pytest.mark.parametrize("file_format,writer_class", [
+    ("parquet", None), ("arrow", "new_file"), ("arrow", "new_stream")])
+def test_arrow_record_reader(tmp_path, file_format, writer_class):
+    """Record batches are converted to documents that mongo can store."""
+    table = _table()
+    file_path = tmp_path / f"data.{file_format}"
+    if file_format == "parquet":
+        pq.write_table(table, file_path, row_group_size=10)
+    else:
+        with getattr(pa.ipc, writer_class)(str(file_path), table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=10):
+                writer.write_batch(batch)
+    reader = ArrowRecordReader(file_path, file_format, batch_size=4)
+    assert reader.num_rows == 25
+    documents = list(reader)
+    assert reader.rows_read == reader.position == 25
+    assert documents[3] == {
+        "id": 3,
+        "text": "tweet 3",
+        "created": datetime.datetime(2023, 1, 4),
+        "score": 0.75,
+        "user": {"name": "u3", "tags": []},
+        "lang": "da",
+    }
+    # the schema gives the same paths as one generated from the (JSON) documents
+    schema = reader.schema()
+    as_json = [{**d, "created": d["created"].isoformat()} for d in documents]
+    assert schema_aliased_path_dict(schema) == schema_aliased_path_dict(generate_schema(as_json))
+    assert schema_aliased_path_dict(schema, types_only=True)["score"] == ("number",)
+
+    # resume part way through a row group
+    reader = ArrowRecordReader(file_path, file_format, batch_size=4, start=13)
+    assert [d["id"] for d in reader] == list(range(13, 25))
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_arrow_record_reader_projection(tmp_path):
+    """Only the kept columns are read, nested fields are projected too."""
+    file_path = tmp_path / "data.parquet"
+    pq.write_table(_table(), file_path)
+    reader = ArrowRecordReader(file_path, "parquet", keep=projection_tree(["text", "user.name"]))
+    assert reader.columns == ["text", "user"]
+    documents = list(reader)
+    assert documents[3] == {"text": "tweet 3", "user": {"name": "u3"}}
+    assert set(schema_aliased_path_dict(reader.schema())) == {"text", "user.name"}
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_ingest_parquet(tmp_path):
+    """Columnar readers work with the ingestion pipeline, ids are row numbers."""
+    file_path = tmp_path / "data.parquet"
+    pq.write_table(_table(), file_path, row_group_size=7)
+    collection = FindCollection()
+    stats = ingest(ArrowRecordReader(file_path, "parquet"), collection, batch_size=5, ids_from_offsets=True)
+    assert stats.rows_written == 25
+    assert sorted(d["_id"] for d in collection.documents) == list(range(25))
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_ingest_parquet_source_ids(tmp_path):
+    """An _id column is kept in another field, the ids are row numbers."""
+    file_path = tmp_path / "data.parquet"
+    pq.write_table(pa.table({"_id": ["x", "y"], "text": ["a", "b"]}), file_path)
+    reader = ArrowRecordReader(file_path, "parquet", keep=projection_tree(["_source_id"]))
+    assert set(schema_aliased_path_dict(reader.schema())) == {"_source_id"}
+    collection = FindCollection()
+    ingest(reader, collection, ids_from_offsets=True)
+    assert collection.documents == [{"_id": 0, "_source_id": "x"}, {"_id": 1, "_source_id": "y"}]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_export_parquet(tmp_path):
+    """Collections are exported with columns from the data source schema."""
+    documents = [
+        {"id": 1, "text": "a", "user": {"name": "x"}, "mixed": 1, "tags": [{"a": 1}, {"b": "x"}]},
+        {"id": 2, "text": "b", "user": {"name": "y"}, "mixed": "one", "tags": []},
+        {"id": 3, "text": "c", "mixed": [1]},
+    ]
+    schema = generate_schema(documents)
+    assert schema_to_arrow_type(schema["properties"]["mixed"]) == pa.large_string()
+    file_path = tmp_path / "export.parquet"
+    count = export_parquet(FindCollection(documents), schema, file_path, batch_size=2)
+    assert count == 3
+    parquet = pq.ParquetFile(file_path)
+    assert parquet.metadata.num_row_groups == 2
+    rows = parquet.read().to_pylist()
+    assert [r["id"] for r in rows] == [1, 2, 3]
+    assert rows[0]["user"] == {"name": "x"}
+    assert rows[2]["user"] is None
+    assert [r["mixed"] for r in rows] == ["1", "one", "[1]"]
+    assert rows[0]["tags"] == [{"a": 1, "b": None}, {"a": None, "b": "x"}]
+    assert all(r[EXTRA_FIELDS_COLUMN] is None for r in rows)
+
+    # and back again
+    reader = ArrowRecordReader(file_path, "parquet")
+    assert [d["text"] for d in reader] == ["a", "b", "c"]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_export_parquet_unsampled(tmp_path):
+    """Values and fields the (sampled) schema doesn't have are exported as JSON text."""
+    schema = generate_schema([{"a": "x", "user": {"name": "u"}, "tags": [1]}])
+    documents = [
+        {"a": "x", "user": {"name": "u"}, "tags": [1]},
+        {"a": 5, "user": {"name": "v", "bio": "b"}, "tags": [1, "two"], "new": True},
+        {"a": "y", "user": "w", "tags": 2 ** 64},
+    ]
+    file_path = tmp_path / "export.parquet"
+    assert export_parquet(FindCollection(documents), schema, file_path) == 3
+    rows = pq.read_table(file_path).to_pylist()
+    assert [r["a"] for r in rows] == ["x", None, "y"]
+    assert [r["user"] for r in rows] == [{"name": "u"}, {"name": "v"}, None]
+    assert [r["tags"] for r in rows] == [[1], None, None]
+    assert rows[0][EXTRA_FIELDS_COLUMN] is None
+    assert json.loads(rows[1][EXTRA_FIELDS_COLUMN]) == {"a": 5, "user": {"bio": "b"}, "tags": [1, "two"], "new": True}
+    assert json.loads(rows[2][EXTRA_FIELDS_COLUMN]) == {"user": "w", "tags": 2 ** 64}
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_load_parquet_data_source(app, monkeypatch):
+    """Parquet uploads are imported with the schema of the file."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.models import DataSourceModel, BackgroundTaskModel, UserModel
+    from nlp4all.helpers import data_source_tasks
+
+    monkeypatch.setattr(data_source_tasks.conf, "DATA_UPLOAD_DIR", str(app.instance_path), raising=False)
+    monkeypatch.setattr(data_source_tasks.conf, "DATA_IMPORT_BATCH_SIZE", 10)
+    os.makedirs(app.instance_path, exist_ok=True)
+    file_path = os.path.join(app.instance_path, "arrow_test.parquet")
+    pq.write_table(_table(), file_path, row_group_size=10)
+    collection = FindCollection()
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    user = nlp4all.db.session.query(UserModel).first()
+    ds = DataSourceModel(data_source_name="arrow", user=user, filename="arrow_test.parquet")
+    task = BackgroundTaskModel(task_id="arrow-test")
+    nlp4all.db.session.add_all([ds, task])
+    nlp4all.db.session.commit()
+    ds.task_id = task.id
+    nlp4all.db.session.commit()
+
+    data_source_tasks.load_data_file(ds)
+    assert len(collection.documents) == 25
+    assert task.total_steps == task.current_step == 25
+    assert set(ds.aliased_paths) == {"id", "text", "created", "score", "user.name", "user.tags", "lang"}
+    assert not os.path.exists(file_path)
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_export_endpoint(app, monkeypatch, tmp_path):
+    """The Parquet export is written in the background, and sent once it is done."""
+    # pylint: disable=import-outside-toplevel
+    import mongomock
+    import nlp4all
+    from nlp4all.controllers import DataSourceController
+    from nlp4all.database import BackgroundTaskStatus
+    from nlp4all.helpers import data_source_tasks
+    from nlp4all.models import BackgroundTaskModel, DataSourceModel, UserModel
+
+    documents = [{"text": f"text {i}"} for i in range(5)]
+    collection = mongomock.MongoClient().get_database("test").get_collection("data")
+    collection.insert_many([dict(document) for document in documents])
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    monkeypatch.setattr(data_source_tasks.conf, "DATA_EXPORT_DIR", str(tmp_path), raising=False)
+    sent = []
+    monkeypatch.setattr(
+        data_source_tasks.export_data_source, "apply_async", lambda args, task_id: sent.append(task_id))
+    ds = DataSourceModel(
+        data_source_name="export", user=nlp4all.db.session.query(UserModel).first(), schema=generate_schema(documents))
+    nlp4all.db.session.add(ds)
+    nlp4all.db.session.commit()
+
+    with app.test_request_context("/"):
+        assert "Exporting data" in DataSourceController.export(ds.id)
+        # still running
+        assert "Exporting data" in DataSourceController.export(ds.id)
+    assert len(sent) == 1
+
+    # the worker
+    export = data_source_tasks.export_data_source
+    export.push_request(id=sent[0])
+    try:
+        export.run(ds.id)
+    finally:
+        export.pop_request()
+    task = nlp4all.db.session.query(BackgroundTaskModel).filter_by(task_id=sent[0]).one()
+    assert task.task_status == BackgroundTaskStatus.SUCCESS
+    assert task.current_step == 5
+
+    with app.test_request_context("/"):
+        response = DataSourceController.export(ds.id)
+        response.direct_passthrough = False
+        table = pq.read_table(pa.BufferReader(response.get_data()))
+    assert table.column("text").to_pylist() == [document["text"] for document in documents]
+
+    # a new export of a new schema, the old file is removed
+    ds.schema = generate_schema(documents + [{"n": 1}])
+    nlp4all.db.session.commit()
+    with app.test_request_context("/"):
+        DataSourceController.export(ds.id)
+    assert len(sent) == 2
+    assert not data_source_tasks.export_path(ds, sent[0]).exists()
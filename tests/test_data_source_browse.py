@@ -0,0 +1,127 @@
+"""
+Data source browsing and NDJSON export tests, on an in-memory mongo stand-in.
+"""
+
+import json
+from urllib.parse import quote
+import mongomock
+import pytest
+from bson import ObjectId
+
+from nlp4all.helpers.data_source_browse import (
+    browse_page,
+    decode_cursor,
+    encode_cursor,
+    field_projection,
+    iter_pages,
+    ndjson_lines
+)
+
+
+def _collection(n=25):
+    collection = mongomock.MongoClient().get_database("test").get_collection("data")
+    if n:
+        collection.insert_many([
+            {"_id": i, "text": f"text {i}", "user": {"name": f"u{i}", "id": i}} for i in range(n)])
+    return collection
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_cursor():
+    """Cursors round trip _ids of any type."""
+    for value in (10, "abc", ObjectId()):
+        assert decode_cursor(encode_cursor(value)) == value
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_field_projection():
+    """Schema paths become a projection without path collisions."""
+    assert field_projection(None) is None
+    assert field_projection([
+        ("properties", "user", "properties", "name"),
+        ("properties", "user"),
+        ("properties", "tags", "items", "properties", "text"),
+    ]) == {"tags.text": 1, "user": 1}
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_browse_pages():
+    """Following the cursors visits every document once."""
+    collection = _collection()
+    projection = field_projection([("properties", "user", "properties", "name")])
+    seen = []
+    after = None
+    pages = 0
+    while True:
+        documents, after = browse_page(collection, after, limit=10, projection=projection)
+        pages += 1
+        seen += [d["_id"] for d in documents]
+        assert all(set(d) == {"_id", "user"} and set(d["user"]) == {"name"} for d in documents)
+        if after is None:
+            break
+    assert seen == list(range(25))
+    assert pages == 3
+    # an exactly full last page has no next page
+    assert browse_page(_collection(10), limit=10)[1] is None
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_ndjson_export():
+    """The export streams every document, a page per chunk."""
+    collection = _collection()
+    assert [len(page) for page in iter_pages(collection, batch_size=10)] == [10, 10, 5]
+    assert list(iter_pages(_collection(0))) == []
+    chunks = list(ndjson_lines(collection, {"text": 1}, batch_size=10))
+    assert len(chunks) == 3
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [{"_id": i, "text": f"text {i}"} for i in range(25)]
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_browse_endpoint(app, monkeypatch):
+    """The browse endpoint pages through the selected fields."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.controllers import DataSourceController
+    from nlp4all.models import DataSourceModel, UserModel
+
+    collection = _collection()
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    ds = DataSourceModel(
+        data_source_name="browse",
+        user=nlp4all.db.session.query(UserModel).first(),
+        schema={"type": "object", "properties": {
+            "text": {"type": "string"},
+            "user": {"type": "object", "properties": {"name": {"type": "string"}, "id": {"type": "integer"}}}}},
+        meta={"selected_fields": ["user.name"]})
+    nlp4all.db.session.add(ds)
+    nlp4all.db.session.commit()
+
+    with app.test_request_context("/?limit=20"):
+        page = json.loads(DataSourceController.browse(ds.id).get_data())
+    assert len(page["documents"]) == 20
+    assert page["documents"][0] == {"_id": 0, "user": {"name": "u0"}}
+    with app.test_request_context(f"/?after={page['next']}&fields=text"):
+        page = json.loads(DataSourceController.browse(ds.id).get_data())
+    assert page["documents"][0] == {"_id": 20, "text": "text 20"}
+    assert page["next"] is None
+    with app.test_request_context("/?fields=nope"):
+        with pytest.raises(Exception) as error:
+            DataSourceController.browse(ds.id)
+        assert getattr(error.value, "code", None) == 400
+    with app.test_request_context("/"):
+        response = DataSourceController.export_ndjson(ds.id)
+        lines = b"".join(response.response).decode("utf-8").splitlines()
+    assert len(lines) == 25
+    # the next page of the inspect page keeps the fields and page size
+    with app.test_request_context("/?limit=10&fields=text"):
+        html = DataSourceController.inspect(ds.id)
+    assert f"after={quote(encode_cursor(9))}&amp;fields=text&amp;limit=10" in html
+    assert "ndjson?fields=text" in html
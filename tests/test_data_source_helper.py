@@ -5,20 +5,37 @@ Database helper related tests.
 
 import csv
 import json
+from datetime import datetime, timedelta, timezone
 from io import StringIO
 import pytest
 
 
+from nlp4all.helpers import data_source
 from nlp4all.helpers.data_source import (
+    CSV_TYPES,
     csv_to_json,
+    coerce_csv_batch,
+    compile_path,
+    delete_paths,
+    infer_csv_types,
     generate_schema,
     csv_row_to_json,
     minimum_paths_for_deletion,
     path_with_parents,
+    PathTrie,
+    project_document,
+    projection_tree,
     schema_path_to_jsonb_path,
     schema_path_index_and_keys_for_pgsql,
-    # remove_paths_from_schema,
-    # schema_aliased_path_dict
+    document_path_signature,
+    merge_schemas,
+    SchemaSampler,
+    schema_aliased_path_dict,
+    schema_fingerprint,
+    schema_path_maps,
+    nested_get_all,
+    nested_set_all,
+    remove_paths_from_schema,
 )
 
 
@@ -90,6 +107,139 @@ def test_json_schema(jsondata, jsonschema):
     assert schema == jsonschema
 
 
+@pytest.mark.data
+@pytest.mark.helper
+def test_document_path_signature():
+    """Test that signatures capture paths and types, not values or array lengths."""
+    doc = {"a": 1, "b": {"c": "x"}, "d": [{"e": True}, {"e": False}]}
+    assert document_path_signature(doc) == document_path_signature(
+        {"a": 2, "b": {"c": "y"}, "d": [{"e": True}]})
+    assert not document_path_signature({"a": 1.5}) <= document_path_signature(doc)
+    assert not document_path_signature({"b": {"f": "x"}}) <= document_path_signature(doc)
+    assert document_path_signature({"a": 3}) <= document_path_signature(doc)
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_schema_sampler(jsondata):
+    """Test that sampled schemas match full schemas."""
+    parsed_json = json.loads(jsondata)
+
+    # homogeneous data only needs the first document
+    sampler = SchemaSampler(head=1, reservoir=0)
+    for _ in range(50):
+        sampler.add_object(parsed_json[0])
+    assert sampler.to_schema() == generate_schema([parsed_json[0]] * 50)
+    assert sampler.added == 1
+
+    # documents with new paths are added to the builder
+    sampler = SchemaSampler(head=1, reservoir=0)
+    for item in parsed_json:
+        sampler.add_object(item)
+    schema = sampler.to_schema()
+    assert schema_aliased_path_dict(schema) == schema_aliased_path_dict(generate_schema(parsed_json))
+    assert sampler.added < len(parsed_json)
+
+    # changes to documents after they were added don't end up in the schema
+    sampler = SchemaSampler(head=0, reservoir=10)
+    documents = [dict(parsed_json[0]) for _ in range(5)]
+    for document in documents:
+        sampler.add_object(document)
+        document["_id"] = 1
+    assert "_id" not in sampler.to_schema()["properties"]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_merge_schemas(jsondata):
+    """Test that merged partial schemas have the paths of a full schema."""
+    parsed_json = json.loads(jsondata)
+    full = schema_aliased_path_dict(generate_schema(parsed_json))
+    for split in range(1, len(parsed_json)):
+        merged = merge_schemas([generate_schema(parsed_json[:split]), generate_schema(parsed_json[split:])])
+        assert schema_aliased_path_dict(merged) == full
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_typed_csv():
+    """Test CSV column type inference and conversion."""
+    rows = [
+        {"i": "1", "f": "1.5", "b": "true", "d": "2023-01-02", "z": "007", "e": "", "t": "2023-01-02T10:00:00Z"},
+        {"i": "-2", "f": "3", "b": "FALSE", "d": "2023-02-03", "z": "8", "e": "", "t": ""},
+    ]
+    types = infer_csv_types(rows)
+    assert types == {
+        "i": "integer", "f": "number", "b": "boolean", "d": "date-time", "z": "string", "e": "string", "t": "date-time"}
+    batch = coerce_csv_batch([dict(row) for row in rows] + [{"i": "n/a", "f": "2", "t": "", "b": "false"}], types)
+    assert batch[0] == {
+        "i": 1, "f": 1.5, "b": True, "d": datetime(2023, 1, 2), "z": "007", "e": "",
+        "t": datetime(2023, 1, 2, 10, tzinfo=timezone.utc)}
+    assert batch[1]["t"] is None
+    # values that don't fit the column are kept
+    assert batch[2] == {"i": "n/a", "f": 2.0, "t": None, "b": False}
+    schema = generate_schema(batch[:2])
+    assert schema_aliased_path_dict(schema, types_only=True) == {
+        "i": ("integer",), "f": ("number",), "b": ("boolean",), "d": ("string",),
+        "z": ("string",), "e": ("string",), "t": ("string",)}
+    assert schema["properties"]["d"] == {"type": "string", "format": "date-time"}
+    assert schema["properties"]["t"] == {"type": "string", "format": "date-time"}
+    # dates mixed with text are text
+    assert generate_schema(batch[:2] + [{"d": "soon"}])["properties"]["d"] == {"type": "string"}
+
+
+@pytest.mark.data
+@pytest.mark.helper
+@pytest.mark.parametrize("value,expected", [
+    ("2023-01-02", datetime(2023, 1, 2)),
+    ("2023-01-02 10:30", datetime(2023, 1, 2, 10, 30)),
+    ("2023-01-02T10:00:00Z", datetime(2023, 1, 2, 10, tzinfo=timezone.utc)),
+    ("2023-01-02T10:00:00+0130", datetime(2023, 1, 2, 10, tzinfo=timezone(timedelta(hours=1, minutes=30)))),
+    ("2023-01-02T10:00:00-02", datetime(2023, 1, 2, 10, tzinfo=timezone(timedelta(hours=-2)))),
+    ("2023-01-02T10:00:00,5", datetime(2023, 1, 2, 10, 0, 0, 500000)),
+    ("2023-01-02T10:00:00.1234567+00:00", datetime(2023, 1, 2, 10, 0, 0, 123456, tzinfo=timezone.utc)),
+])
+@pytest.mark.parametrize("reads_iso", [True, False])
+def test_csv_date_time(monkeypatch, value, expected, reads_iso):
+    """ISO dates are read the same on every Python version."""
+    if reads_iso and not data_source.FROMISOFORMAT_READS_ISO:
+        pytest.skip("datetime.fromisoformat doesn't read ISO dates before Python 3.11")
+    monkeypatch.setattr(data_source, "FROMISOFORMAT_READS_ISO", reads_iso)
+    assert CSV_TYPES["date-time"](value) == expected
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_coerce_csv_column():
+    """Columns that don't fit their type are converted a value at a time."""
+    batch = coerce_csv_batch(
+        [{"i": "1"}, {"i": str(2 ** 63)}, {"i": ""}, {"n": "1e3"}, {"n": "x"}],
+        {"i": "integer", "n": "number"})
+    assert batch == [{"i": 1}, {"i": str(2 ** 63)}, {"i": None}, {"n": 1000.0}, {"n": "x"}]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_project_document():
+    """Test keeping only selected fields, inside arrays too."""
+    tree = projection_tree(["text", "user.name", "entities.urls.url", "place", "place.name"])
+    assert tree == {"text": True, "user": {"name": True}, "entities": {"urls": {"url": True}}, "place": True}
+    document = {
+        "text": "a",
+        "lang": "en",
+        "user": {"name": "x", "id": 1},
+        "entities": {"urls": [{"url": "u", "expanded": "e"}, {"expanded": "f"}], "hashtags": ["h"]},
+        "place": {"name": "p", "box": [1, 2]},
+    }
+    assert project_document(document, tree) == {
+        "text": "a",
+        "user": {"name": "x"},
+        "entities": {"urls": [{"url": "u"}, {}]},
+        "place": {"name": "p", "box": [1, 2]},
+    }
+    assert project_document({"user": "not an object"}, tree) == {"user": "not an object"}
+
+
 @pytest.mark.data
 @pytest.mark.helper
 def test_path_with_parents():
@@ -106,6 +256,41 @@ def test_path_with_parents():
         "b.a"])
 
 
+@pytest.mark.data
+@pytest.mark.helper
+def test_path_trie():
+    """Paths share the nodes of their common parents."""
+    trie = PathTrie({"a.b": 1, "a.c.d": 2, "e": 3})
+    assert "a" in trie and "a.c" in trie and ("a", "c", "d") in trie
+    assert "a.d" not in trie and "a.b.c" not in trie
+    assert not trie.find("a").terminal
+    assert trie.find("a.c.d").value == 2
+    assert list(trie.items()) == [("a.b", 1), ("a.c.d", 2), ("e", 3)]
+    assert [path for path, _ in trie.walk()] == ["a", "a.b", "a.c", "a.c.d", "e"]
+    assert [path for path, _ in trie.find("a.c").walk("a.c")] == ["a.c.d"]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_remove_sub_paths_arrays():
+    """Arrays are removed as a whole, not only their items."""
+    paths = {
+        "a": ("properties", "a"),
+        "tags": ("properties", "tags", "items"),
+        "x.coordinates": ("properties", "x", "properties", "coordinates", "items", "items"),
+        "x.y": ("properties", "x", "properties", "y"),
+        "u.urls.url": ("properties", "u", "properties", "urls", "items", "properties", "url"),
+        "u.urls.text": ("properties", "u", "properties", "urls", "items", "properties", "text"),
+        "u.name": ("properties", "u", "properties", "name"),
+    }
+    keep = {"a": paths["a"], "x.y": paths["x.y"], "u.name": paths["u.name"]}
+    assert minimum_paths_for_deletion(keep, paths) == {
+        "tags": ("properties", "tags"),
+        "x.coordinates": ("properties", "x", "properties", "coordinates"),
+        "u.urls": ("properties", "u", "properties", "urls"),
+    }
+
+
 @pytest.mark.data
 @pytest.mark.helper
 def test_remove_sub_paths():
@@ -164,6 +349,93 @@ def test_schema_path_index_and_keys_for_pgsql():
         (1, "b"), (2, "a"), (4, "a"), (6, "a")]
 
 
+@pytest.mark.data
+@pytest.mark.helper
+def test_schema_path_maps(monkeypatch):
+    """Paths and types come from one walk of the schema, cached by its fingerprint."""
+    from nlp4all.helpers import data_source  # pylint: disable=import-outside-toplevel
+
+    schema = {"type": "object", "properties": {"a": {"type": "integer"}, "b": {"type": ["string", "null"]}}}
+    reordered = {"properties": {"b": {"type": ["string", "null"]}, "a": {"type": "integer"}}, "type": "object"}
+    assert schema_fingerprint(schema) == schema_fingerprint(reordered)
+    assert schema_fingerprint(schema) != schema_fingerprint({**schema, "required": ["a"]})
+
+    walks = []
+    walk = data_source._schema_path_maps  # pylint: disable=protected-access
+    monkeypatch.setattr(data_source, "_schema_path_maps", lambda *args: walks.append(args) or walk(*args))
+    monkeypatch.setattr(data_source, "_PATH_MAPS_CACHE", data_source.OrderedDict())
+    monkeypatch.setattr(data_source, "PATH_MAPS_CACHE_SIZE", 1)
+    maps = schema_path_maps(schema)
+    assert maps.paths == {"a": ("properties", "a"), "b": ("properties", "b")}
+    assert maps.types == {"a": ("integer",), "b": ("string", "null")}
+    maps.paths.clear()
+    assert schema_aliased_path_dict(reordered) == {"a": ("properties", "a"), "b": ("properties", "b")}
+    assert schema_aliased_path_dict(schema, types_only=True) == {"a": ("integer",), "b": ("string", "null")}
+    assert len(walks) == 1
+    # least recently used schemas are dropped
+    schema_path_maps({"type": "object", "properties": {"c": {"type": "integer"}}})
+    schema_path_maps(schema)
+    assert len(walks) == 3
+    # a depth isn't cached
+    assert schema_aliased_path_dict(schema, depth=1) == {}
+    assert len(walks) == 4
+
+
+def _nested_schema() -> dict:
+    return generate_schema([
+        {"a": 1, "b": {"c": "x", "d": 2}, "tags": [{"text": "t", "n": 1}]},
+        {"a": 2, "b": {"c": "y", "d": 3}, "tags": [{"text": "u", "n": 2}]},
+    ])
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_compile_path():
+    """Compiled paths are cached and work on schemas and documents."""
+    path = ("properties", "tags", "items", "properties", "text")
+    assert compile_path(path) is compile_path(list(path))
+    schema = _nested_schema()
+    assert compile_path(path).get_all(schema) == [{"type": "string"}]
+    assert nested_get_all(schema, ("properties", "b", "properties", "d")) == [{"type": "integer"}]
+    assert nested_set_all(schema, ("properties", "b", "properties", "d"), {"type": "number"}) is schema
+    assert schema["properties"]["b"]["properties"]["d"] == {"type": "number"}
+    # only existing keys are set
+    assert compile_path(("properties", "b", "properties", "e")).set_all(schema, {}) == 0
+
+    document = {"a": 1, "tags": [{"text": "t"}, {"n": 2}, {"text": "u"}], "b": {"c": "x"}}
+    assert compile_path(path).values(document) == ["t", "u"]
+    assert compile_path(("properties", "b", "properties", "c")).values(document) == ["x"]
+    assert compile_path(("properties", "missing", "properties", "c")).values(document) == []
+    assert compile_path(("properties", "nums", "items")).values({"nums": [1, 2]}) == [1, 2]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_delete_paths():
+    """Many paths are deleted in one walk, "required" is kept in sync."""
+    schema = _nested_schema()
+    paths = [
+        ("properties", "a"),
+        ("properties", "b", "properties", "c"),
+        ("properties", "tags", "items", "properties", "n"),
+        ("properties", "tags", "items", "properties", "n", "type"),  # inside a deleted path
+        ("properties", "missing"),
+    ]
+    assert delete_paths(schema, paths) == 3
+    assert set(schema["properties"]) == {"b", "tags"}
+    assert sorted(schema["required"]) == ["b", "tags"]
+    assert schema["properties"]["b"]["required"] == ["d"]
+    item = schema["properties"]["tags"]["items"]
+    item = item[0] if isinstance(item, list) else item
+    assert item["properties"] == {"text": {"type": "string"}}
+    assert item["required"] == ["text"]
+
+    schema = _nested_schema()
+    removed = remove_paths_from_schema(schema, {"a": ("properties", "a")})
+    assert "a" in schema["properties"]
+    assert "a" not in removed["properties"] and "a" not in removed["required"]
+
+
 # @pytest.mark.data
 # @pytest.mark.helper
 # def test_remove_paths_from_schema():
@@ -0,0 +1,75 @@
+"""
+Data source index tests, on an in-memory mongo stand-in.
+"""
+
+import mongomock
+import pytest
+
+from nlp4all.helpers.data_source_indexes import IndexManager, index_models
+from nlp4all.helpers.filterable import FilterableBoolean, FilterableNumber
+
+
+def _collection():
+    collection = mongomock.MongoClient().get_database("test").get_collection("data")
+    collection.insert_many([{"n": i, "flag": i % 2 == 0, "user": {"text": f"text {i}"}} for i in range(20)])
+    return collection
+
+
+FILTERABLES = {
+    "n": FilterableNumber("n", ("properties", "n"), {"min": 0, "max": 20}).to_dict(),
+    "flag": FilterableBoolean("flag", ("properties", "flag"), {}).to_dict(),
+}
+TEXT_PATH = ("properties", "user", "properties", "text")
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_index_models():
+    """Only filterables and the text field are indexed."""
+    models = [model.document for model in index_models(FILTERABLES, TEXT_PATH)]
+    assert [(m["name"], list(m["key"].items())) for m in models] == [
+        ("n4a_n", [("n", 1)]),
+        ("n4a_flag", [("flag", 1)]),
+        ("n4a_text_user.text", [("user.text", "text")]),
+    ]
+    assert index_models({}) == []
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_sync_indexes():
+    """Indexes are created in one batch, and dropped when their filterable is removed."""
+    collection = _collection()
+    collection.create_index("n", name="not_managed")
+    created = []
+    create_indexes = collection.create_indexes
+    collection.create_indexes = lambda models: created.append(len(models)) or create_indexes(models)
+    manager = IndexManager(collection, poll_interval=0.01)
+
+    report = manager.sync(index_models(FILTERABLES, TEXT_PATH))
+    assert report["created"] == ["n4a_n", "n4a_flag", "n4a_text_user.text"]
+    assert report["dropped"] == []
+    assert isinstance(report["sizes"], dict)
+    assert created == [3]
+    assert manager.plan(index_models(FILTERABLES, TEXT_PATH)) == ([], [])
+
+    # a removed filterable, and a filterable with a new path
+    moved = {"flag": {**FILTERABLES["flag"], "path": ["properties", "user", "properties", "flag"]}}
+    report = manager.sync(index_models(moved))
+    assert sorted(report["dropped"]) == ["n4a_flag", "n4a_n", "n4a_text_user.text"]
+    assert report["created"] == ["n4a_flag"]
+    assert created == [3, 1]
+    assert set(collection.index_information()) == {"_id_", "not_managed", "n4a_flag"}
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_text_index_key():
+    """Text indexes reported by the server by their internal key aren't rebuilt."""
+    manager = IndexManager(_collection())
+    info = {
+        "_id_": {"key": [("_id", 1)]},
+        "n4a_text_user.text": {"key": [("_fts", "text"), ("_ftsx", 1)], "weights": {"user.text": 1}},
+    }
+    manager.collection.index_information = lambda: info
+    assert manager.plan(index_models({}, TEXT_PATH)) == ([], [])
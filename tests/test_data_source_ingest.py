@@ -0,0 +1,552 @@
+"""
+Streaming ingestion engine tests.
+"""
+
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import os
+import threading
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+import mongomock
+import pytest
+from celery.exceptions import Retry
+from pymongo.errors import BulkWriteError
+
+from nlp4all.helpers.data_source import csv_to_json
+from nlp4all.helpers.data_source_ingest import (
+    RecordReader,
+    RecordError,
+    MappedRecordReader,
+    ProgressEstimator,
+    data_suffix,
+    decompress_stream,
+    detect_compression,
+    ingest,
+    shard_offsets,
+    unique_upload_name,
+    upload_suffix
+)
+
+
+class ListCollection:
+    """Collects inserted documents in a list, in place of a mongo collection."""
+
+    def __init__(self, fail_after=None):
+        self.documents = []
+        self.calls = []
+        self.fail_after = fail_after
+        self._lock = threading.Lock()
+
+    def insert_many(self, documents, ordered=True):
+        """Records the inserted documents."""
+        with self._lock:
+            if self.fail_after is not None and len(self.calls) >= self.fail_after:
+                raise RuntimeError("insert failed")
+            self.calls.append((len(documents), ordered))
+            self.documents += documents
+
+
+@pytest.mark.data
+@pytest.mark.helper
+@pytest.mark.parametrize("reader_class", [RecordReader, MappedRecordReader])
+def test_record_reader_csv(tmp_path, csvdata, reader_class):
+    """CSV records survive chunk boundaries, including quoted fields."""
+    expected = csv_to_json(list(csv.reader(StringIO(csvdata))), None)
+    file_path = tmp_path / "data.csv"
+    file_path.write_bytes(csvdata.encode("utf-8"))
+    with file_path.open("rb") as f:
+        reader = reader_class(f, is_csv=True, chunk_size=7)
+        assert list(reader) == expected
+    assert reader.rows_read == len(expected)
+    assert reader.bytes_read == len(csvdata.encode("utf-8"))
+
+
+@pytest.mark.data
+@pytest.mark.helper
+@pytest.mark.parametrize("reader_class", [RecordReader, MappedRecordReader])
+def test_record_reader_json(tmp_path, reader_class):
+    """JSON lines are read one document per line, blank lines are skipped."""
+    data = [{"a": i, "b": {"c": "x" * i}} for i in range(20)]
+    raw = ("\n".join(json.dumps(d) for d in data) + "\n\n").encode("utf-8")
+    file_path = tmp_path / "data.json"
+    file_path.write_bytes(raw)
+    with file_path.open("rb") as f:
+        reader = reader_class(f, is_csv=False, chunk_size=16)
+        assert list(reader) == data
+    assert reader.bytes_read == len(raw)
+
+
+@pytest.mark.data
+@pytest.mark.helper
+@pytest.mark.parametrize("reader_class", [RecordReader, MappedRecordReader])
+def test_record_reader_error(tmp_path, reader_class):
+    """Invalid records are reported with their row number and byte offset."""
+    lines = [b'{"a": 1}\n', b'{"a": 2}\n', b'{"a": \n', b'{"a": 4}\n']
+    file_path = tmp_path / "data.json"
+    file_path.write_bytes(b"".join(lines))
+    with file_path.open("rb") as f:
+        f.seek(len(lines[0]))
+        reader = reader_class(f, is_csv=False)
+        with pytest.raises(RecordError) as excinfo:
+            list(reader)
+    assert excinfo.value.row == 2
+    assert excinfo.value.offset == len(lines[0]) + len(lines[1])
+
+    file_path = tmp_path / "data.csv"
+    file_path.write_bytes(b"a,b\n1,2\n3\n")
+    with file_path.open("rb") as f:
+        with pytest.raises(RecordError) as excinfo:
+            list(reader_class(f, is_csv=True))
+    assert excinfo.value.row == 2
+    assert excinfo.value.offset == 8
+
+
+@pytest.mark.data
+@pytest.mark.helper
+@pytest.mark.parametrize("compression, compress", [
+    ("gzip", gzip.compress),
+    ("bz2", bz2.compress),
+    ("xz", lzma.compress),
+    ("zstd", lambda data: pytest.importorskip("zstandard").ZstdCompressor().compress(data)),
+])
+def test_compressed_records(tmp_path, compression, compress):
+    """Compressed files are detected from their contents and read as a stream."""
+    data = [{"a": i, "b": "text " * (i % 7)} for i in range(300)]
+    raw = compress("\n".join(json.dumps(d) for d in data).encode("utf-8"))
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(raw)
+    with file_path.open("rb") as f:
+        assert detect_compression(f) == compression
+        assert f.tell() == 0
+        reader = RecordReader(decompress_stream(f, compression), is_csv=False, chunk_size=64, source=f)
+        assert list(reader) == data
+        assert reader.source_position == len(raw)
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_data_suffix(tmp_path):
+    """Compression suffixes are ignored when picking the data format."""
+    assert data_suffix("tweets.jsonl.gz") == ".jsonl"
+    assert data_suffix("tweets.CSV.ZST") == ".csv"
+    assert data_suffix("tweets.json") == ".json"
+    assert data_suffix("tweets") == ""
+    assert upload_suffix("tweets.2023.jsonl.gz") == ".jsonl.gz"
+    assert upload_suffix("tweets.CSV.ZST") == ".CSV.ZST"
+    assert upload_suffix("tweets.json") == ".json"
+    assert upload_suffix("tweets") == ""
+    file_path = tmp_path / "data.json"
+    file_path.write_bytes(b'{"a": 1}\n')
+    with file_path.open("rb") as f:
+        assert detect_compression(f) is None
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_shard_offsets(tmp_path):
+    """Shards start at line boundaries and together cover every line once."""
+    data = [{"a": i, "b": "x" * (i % 13)} for i in range(500)]
+    file_path = tmp_path / "data.json"
+    file_path.write_bytes("\n".join(json.dumps(d) for d in data).encode("utf-8"))
+    for shards in (1, 3, 8, 1000):
+        offsets = shard_offsets(file_path, shards, chunk_size=5)
+        assert offsets[0][0] == 0
+        assert offsets[-1][1] == file_path.stat().st_size
+        assert all(prev[1] == nxt[0] for prev, nxt in zip(offsets, offsets[1:]))
+        for reader_class in (RecordReader, MappedRecordReader):
+            records = []
+            with file_path.open("rb") as f:
+                for start, end in offsets:
+                    f.seek(start)
+                    records += list(reader_class(f, is_csv=False, chunk_size=7, limit=end - start))
+            assert records == data
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_ingest():
+    """All documents are written, in bounded unordered batches."""
+    data = [{"a": i} for i in range(1001)]
+    raw = "\n".join(json.dumps(d) for d in data).encode("utf-8")
+    collection = ListCollection()
+    seen = []
+    progress = []
+    stats = ingest(
+        RecordReader(BytesIO(raw), is_csv=False, chunk_size=64),
+        collection,
+        on_batch=seen.extend,
+        on_progress=lambda s: progress.append(s.rows_read),
+        batch_size=100,
+        queue_depth=2,
+        writers=3,
+        progress_every=250)
+    assert stats.rows_read == stats.rows_written == len(data)
+    assert seen == data
+    assert sorted(collection.documents, key=lambda d: d["a"]) == data
+    assert all(size <= 100 and not ordered for size, ordered in collection.calls)
+    assert progress == [250, 500, 750, 1000, 1001]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_ingest_writer_error():
+    """Errors raised by a writer surface in the calling thread."""
+    raw = "\n".join(json.dumps({"a": i}) for i in range(100)).encode("utf-8")
+    with pytest.raises(RuntimeError, match="insert failed"):
+        ingest(
+            RecordReader(BytesIO(raw), is_csv=False),
+            ListCollection(fail_after=1),
+            batch_size=10,
+            writers=2)
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_progress_estimator():
+    """Rates and time remaining follow byte progress."""
+    estimator = ProgressEstimator(1000, smoothing=0.5)
+    assert estimator.eta_seconds is None
+    start = estimator._last  # pylint: disable=protected-access
+    estimator.update(100, 10, now=start + 1)
+    assert estimator.bytes_per_second == 100
+    assert estimator.rows_per_second == 10
+    assert estimator.eta_seconds == 9
+    estimator.update(400, 40, now=start + 2)
+    assert estimator.bytes_per_second == 200
+    assert estimator.rows_per_second == 20
+    assert estimator.eta_seconds == 3
+
+
+class IdCollection(ListCollection):
+    """Rejects documents with an _id that was inserted before, like mongo does."""
+
+    def insert_many(self, documents, ordered=True):
+        """Records new documents, raises a duplicate key error for the others."""
+        with self._lock:
+            if self.fail_after is not None and len(self.calls) >= self.fail_after:
+                raise RuntimeError("insert failed")
+            ids = {d["_id"] for d in self.documents}
+            new = [d for d in documents if d["_id"] not in ids]
+            self.calls.append((len(documents), ordered))
+            self.documents += new
+        if len(new) < len(documents):
+            raise BulkWriteError({
+                "writeErrors": [{"code": 11000}] * (len(documents) - len(new)),
+                "writeConcernErrors": []})
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_ingest_ids_from_offsets(tmp_path):
+    """Writing the same records again doesn't duplicate them."""
+    data = [{"a": i} for i in range(100)]
+    file_path = tmp_path / "data.json"
+    file_path.write_bytes("\n".join(json.dumps(d) for d in data).encode("utf-8"))
+    collection = IdCollection()
+    seen = []
+    with file_path.open("rb") as f:
+        stats = ingest(RecordReader(f, is_csv=False), collection,
+                       on_batch=lambda batch: seen.extend(dict(d) for d in batch),
+                       batch_size=7, ids_from_offsets=True)
+    assert stats.committed_position == file_path.stat().st_size
+    assert stats.rows_committed == 100
+    # the ids are not part of what on_batch sees
+    assert "_id" not in seen[0]
+    # resume from the middle
+    with file_path.open("rb") as f:
+        f.seek(sorted(d["_id"] for d in collection.documents)[50])
+        stats = ingest(RecordReader(f, is_csv=False), collection, batch_size=7, ids_from_offsets=True)
+    assert stats.rows_read == 50
+    assert len(collection.documents) == 100
+    assert sorted(d["a"] for d in collection.documents) == list(range(100))
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_ingest_source_ids(tmp_path):
+    """The _ids of an upload are kept in another field, so every _id is an offset."""
+    file_path = tmp_path / "data.json"
+    file_path.write_bytes(b'{"a": 1}\n{"_id": "x", "a": 2}\n{"_id": 7, "a": 3}\n')
+    collection = IdCollection()
+    with file_path.open("rb") as f:
+        ingest(RecordReader(f, is_csv=False), collection, ids_from_offsets=True)
+    assert [d["_id"] for d in collection.documents] == [0, 9, 30]
+    assert [d.get("_source_id") for d in collection.documents] == [None, "x", 7]
+    rows = list(RecordReader(BytesIO(b"_id,a\nx,1\n"), is_csv=True))
+    assert rows == [{"_source_id": "x", "a": "1"}]
+
+
+class FileCollection:
+    """Appends inserted documents to a file per process, so a test sees the writes of worker processes."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def insert_many(self, documents, ordered=True):  # pylint: disable=unused-argument
+        """Appends the documents as JSON lines."""
+        with open(self.directory / f"{os.getpid()}.{threading.get_ident()}.jsonl", "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(document) + "\n" for document in documents)
+
+    def documents(self):
+        """All of the documents written, by any process."""
+        return [json.loads(line) for path in self.directory.glob("*.jsonl") for line in path.open(encoding="utf-8")]
+
+
+def _data_source(filename):
+    """A data source for an upload, with its import task."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.models import DataSourceModel, BackgroundTaskModel, UserModel
+
+    user = nlp4all.db.session.query(UserModel).first()
+    ds = DataSourceModel(data_source_name=filename, user=user, filename=filename)
+    task = BackgroundTaskModel(task_id=filename)
+    nlp4all.db.session.add_all([ds, task])
+    nlp4all.db.session.commit()
+    ds.task_id = task.id
+    nlp4all.db.session.commit()
+    return ds
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_redelivered_import(app, monkeypatch):
+    """A redelivered import is only taken over once the lease of the worker running it expired."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.database import BackgroundTaskStatus
+    from nlp4all.helpers import data_source_tasks
+
+    conf = data_source_tasks.conf
+    monkeypatch.setattr(conf, "DATA_UPLOAD_DIR", str(app.instance_path), raising=False)
+    monkeypatch.setattr(conf, "DATA_IMPORT_SHARDS", 1)
+    monkeypatch.setattr(conf, "DATA_IMPORT_TWO_PHASE", False)
+    os.makedirs(app.instance_path, exist_ok=True)
+    filename = "redelivered_test.json"
+    upload = Path(app.instance_path, filename)
+    upload.write_bytes(b'{"a": 1}\n{"a": 2}\n')
+    collection = IdCollection()
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    ds = _data_source(filename)
+    task = ds.task
+    task.task_status = BackgroundTaskStatus.STARTED
+    task.heartbeat_at = datetime.utcnow()
+    nlp4all.db.session.commit()
+
+    process = data_source_tasks.process_data_source
+    process.push_request(id=task.task_id)
+    try:
+        # still running in another worker
+        with pytest.raises(Retry):
+            process.run(ds.id)
+        assert task.task_status == BackgroundTaskStatus.STARTED
+        assert not collection.documents
+
+        # the other worker died
+        task.heartbeat_at = datetime.utcnow() - timedelta(seconds=conf.DATA_IMPORT_LEASE_TIMEOUT)
+        nlp4all.db.session.commit()
+        process.run(ds.id)
+        assert task.task_status == BackgroundTaskStatus.SUCCESS
+        assert sorted(d["a"] for d in collection.documents) == [1, 2]
+        assert not upload.exists()
+
+        # delivered again after it finished
+        process.run(ds.id)
+        assert task.task_status == BackgroundTaskStatus.SUCCESS
+    finally:
+        process.pop_request()
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_resume_import(app, monkeypatch):
+    """An interrupted import resumes from its checkpoint without duplicating rows."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.helpers import data_source_tasks
+
+    conf = data_source_tasks.conf
+    monkeypatch.setattr(conf, "DATA_UPLOAD_DIR", str(app.instance_path), raising=False)
+    monkeypatch.setattr(conf, "DATA_IMPORT_BATCH_SIZE", 10)
+    monkeypatch.setattr(conf, "DATA_IMPORT_WRITERS", 1)
+    monkeypatch.setattr(conf, "DATA_IMPORT_PROGRESS_ROWS", 20)
+    monkeypatch.setattr(conf, "DATA_IMPORT_CHECKPOINT_INTERVAL", 0)
+    monkeypatch.setattr(conf, "DATA_IMPORT_SHARDS", 1)
+    os.makedirs(app.instance_path, exist_ok=True)
+    data = [{"a": i, "b": {"c": str(i)}} for i in range(300)]
+    filename = "resume_test.json"
+    Path(app.instance_path, filename).write_bytes("\n".join(json.dumps(d) for d in data).encode("utf-8"))
+
+    collection = IdCollection()
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    ds = _data_source(filename)
+    # the "worker" dies after a few batches
+    collection.fail_after = 15
+    with pytest.raises(RuntimeError):
+        data_source_tasks.load_data_file(ds)
+    checkpoint = ds.meta["import_checkpoint"]
+    assert 0 < checkpoint["rows"] < len(data)
+    assert len(collection.documents) >= checkpoint["rows"]
+
+    collection.fail_after = None
+    calls = len(collection.calls)
+    data_source_tasks.load_data_file(ds)
+    assert "import_checkpoint" not in ds.meta
+    # only the rows after the checkpoint were written again
+    assert sum(size for size, _ in collection.calls[calls:]) == len(data) - checkpoint["rows"]
+    assert sorted(d["a"] for d in collection.documents) == list(range(len(data)))
+    assert ds.aliased_paths == {"a": ["properties", "a"], "b.c": ["properties", "b", "properties", "c"]}
+
+
+@pytest.mark.data
+@pytest.mark.integration
+@pytest.mark.parametrize("suffix", [".json", ".csv"])
+def test_two_phase_import(app, monkeypatch, suffix):
+    """The schema is discovered from a sample, then only the selected fields are written."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.helpers import data_source_tasks
+
+    conf = data_source_tasks.conf
+    monkeypatch.setattr(conf, "DATA_UPLOAD_DIR", str(app.instance_path), raising=False)
+    monkeypatch.setattr(conf, "DATA_IMPORT_DISCOVERY_ROWS", 10)
+    os.makedirs(app.instance_path, exist_ok=True)
+    filename = "two_phase" + suffix
+    if suffix == ".json":
+        data = [{"id": i, "text": f"t{i}", "user": {"name": f"u{i}", "id": i}, "lang": "en"} for i in range(100)]
+        raw = "\n".join(json.dumps(d) for d in data)
+        selected = ["text", "user.name"]
+    else:
+        raw = "id,text,lang\n" + "\n".join(f"{i},t{i},en" for i in range(100))
+        selected = ["id", "text"]
+    Path(app.instance_path, filename).write_bytes(raw.encode("utf-8"))
+    collection = IdCollection()
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    ds = _data_source(filename)
+
+    data_source_tasks.discover_data_file(ds)
+    assert ds.awaiting_import
+    assert collection.documents == []
+    assert set(selected) < set(ds.aliased_paths)
+
+    data_source_tasks.load_data_file(ds, selected)
+    assert not ds.awaiting_import
+    assert len(collection.documents) == 100
+    assert set(ds.aliased_paths) == set(selected)
+    for document in collection.documents:
+        assert set(document) == {"_id"} | {field.split(".")[0] for field in selected}
+    if suffix == ".csv":
+        assert sorted(d["id"] for d in collection.documents) == list(range(100))
+    else:
+        assert all(set(d["user"]) == {"name"} for d in collection.documents)
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_import_past_schema_head(app, monkeypatch):
+    """Documents sampled after the head don't get the ids mongo sets on insert."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.helpers import data_source_tasks
+
+    conf = data_source_tasks.conf
+    monkeypatch.setattr(conf, "DATA_UPLOAD_DIR", str(app.instance_path), raising=False)
+    monkeypatch.setattr(conf, "DATA_IMPORT_SCHEMA_MODE", "sample")
+    monkeypatch.setattr(conf, "DATA_IMPORT_SHARDS", 1)
+    os.makedirs(app.instance_path, exist_ok=True)
+    rows = conf.DATA_IMPORT_SCHEMA_HEAD + 500
+    filename = "past_head.json"
+    Path(app.instance_path, filename).write_bytes(
+        "\n".join(json.dumps({"a": i, "b": str(i)}) for i in range(rows)).encode("utf-8"))
+    # mongo sets an ObjectId _id on the inserted documents, in place
+    collection = mongomock.MongoClient().db.past_head
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    ds = _data_source(filename)
+
+    data_source_tasks.load_data_file(ds)
+    assert collection.count_documents({}) == rows
+    assert set(ds.schema["properties"]) == {"a", "b"}
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_sharded_import(app, monkeypatch, tmp_path):
+    """A JSON lines upload is imported by worker processes, a byte range each."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.helpers import data_source_tasks
+
+    conf = data_source_tasks.conf
+    monkeypatch.setattr(conf, "DATA_UPLOAD_DIR", str(app.instance_path), raising=False)
+    monkeypatch.setattr(conf, "DATA_IMPORT_SHARDS", 3)
+    monkeypatch.setattr(conf, "DATA_IMPORT_SHARD_MIN_BYTES", 0)
+    monkeypatch.setattr(conf, "DATA_IMPORT_BATCH_SIZE", 50)
+    monkeypatch.setattr(conf, "DATA_IMPORT_PROGRESS_INTERVAL", 0.05)
+    os.makedirs(app.instance_path, exist_ok=True)
+    data = [{"a": i, "b": {"c": str(i)}} for i in range(1000)]
+    data[-1]["d"] = True
+    filename = "sharded.json"
+    Path(app.instance_path, filename).write_bytes("\n".join(json.dumps(d) for d in data).encode("utf-8"))
+    collection = FileCollection(tmp_path)
+    monkeypatch.setattr(nlp4all.docdb, "get_collection", lambda name: collection)
+    monkeypatch.setattr(nlp4all.docdb, "reconnect", lambda: None)
+    ds = _data_source(filename)
+
+    data_source_tasks.load_data_file(ds)
+    documents = collection.documents()
+    # every line was written once, by more than one process
+    assert sorted(d["a"] for d in documents) == list(range(len(data)))
+    assert len({d["_id"] for d in documents}) == len(data)
+    assert len(list(tmp_path.glob("*.jsonl"))) > 1
+    assert ds.task.rows_processed == len(data)
+    # the partial schemas of the shards were merged
+    assert set(ds.aliased_paths) == {"a", "b.c", "d"}
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_unique_upload_name(tmp_path):
+    """Names that are taken get a timestamp before all of their suffixes."""
+    assert unique_upload_name(tmp_path, "tweets.jsonl.gz") == "tweets.jsonl.gz"
+    (tmp_path / "tweets.jsonl.gz").touch()
+    name = unique_upload_name(tmp_path, "tweets.jsonl.gz")
+    assert name.startswith("tweets_") and name.endswith(".jsonl.gz")
+    assert data_suffix(name) == ".jsonl"
+    (tmp_path / name).touch()
+    again = unique_upload_name(tmp_path, "tweets.jsonl.gz")
+    assert again not in ("tweets.jsonl.gz", name)
+    assert again.endswith(".jsonl.gz")
+
+
+@pytest.mark.data
+@pytest.mark.integration
+def test_upload_same_name(app, monkeypatch, tmp_path):
+    """Uploading a compressed file with the name of an earlier upload keeps both, importable."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.controllers import data_source as controller
+    from nlp4all.helpers import data_source_tasks
+    from nlp4all.models import DataSourceModel
+
+    upload_dir = tmp_path
+    monkeypatch.setattr(controller.conf, "DATA_UPLOAD_DIR", str(upload_dir), raising=False)
+    monkeypatch.setattr(data_source_tasks.process_data_source, "delay", lambda ds_id: None)
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    client.post("/user/login", data={"email": "example@example.org", "password": "example"})
+    raw = gzip.compress(b'{"a": 1}\n')
+    for _ in range(2):
+        response = client.post("/datasource/create", data={
+            "data_source_name": "same", "data_source": (BytesIO(raw), "same.jsonl.gz")})
+        assert response.status_code == 302
+    names = [ds.filename for ds in nlp4all.db.session.query(DataSourceModel).order_by(DataSourceModel.id)]
+    assert names[0] == "same.jsonl.gz"
+    assert names[1] != names[0]
+    for name in names:
+        assert data_suffix(name) == ".jsonl"
+        assert (upload_dir / name).read_bytes() == raw
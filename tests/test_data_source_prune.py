@@ -0,0 +1,90 @@
+"""
+Data source pruning tests.
+"""
+
+import pytest
+
+from nlp4all.helpers.data_source import generate_schema, minimum_paths_for_deletion, schema_aliased_path_dict
+from nlp4all.helpers.data_source_prune import id_ranges, mongo_field_path, prune_collection, prune_pipeline
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class CountingCollection:
+    """Counts the updates sent to a mongomock collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.updates = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def update_many(self, query, update):
+        """Records the update."""
+        self.updates.append(query)
+        return self.collection.update_many(query, update)
+
+
+def _documents(n):
+    return [{
+        "_id": i,
+        "text": f"text {i}",
+        "user": {"name": f"u{i}", "id": i, "location": "x"},
+        "entities": {"urls": [{"url": "a", "expanded": "b"}] * (i % 3), "hashtags": ["x"] * (i % 2)},
+        "lang": "en",
+    } for i in range(n)]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_prune_pipeline():
+    """Paths are converted to dotted field paths, nested paths are left out."""
+    assert mongo_field_path(("properties", "a", "items", "properties", "b")) == "a.b"
+    assert prune_pipeline([
+        ("properties", "a", "properties", "b"),
+        ("properties", "a"),
+        ("properties", "ab"),
+        ("properties", "a-b"),
+        ("properties", "a-b", "properties", "c"),
+        ("properties", "a", "properties", "c"),
+        ("properties", "_id"),
+        ("properties", "c", "items", "properties", "d"),
+    ]) == [{"$project": {"a": 0, "a-b": 0, "ab": 0, "c.d": 0}}]
+
+
+@pytest.mark.data
+@pytest.mark.helper
+@pytest.mark.parametrize("chunk_size, workers", [(None, 1), (7, 1), (7, 3)])
+def test_prune_collection(chunk_size, workers):
+    """Unselected fields are removed from every document, in one update per chunk."""
+    documents = _documents(50)
+    collection = CountingCollection(mongomock.MongoClient().db.data)
+    collection.insert_many(documents)
+    paths = schema_aliased_path_dict(generate_schema([{k: v for k, v in d.items() if k != "_id"} for d in documents]))
+    keep = {field: paths[field] for field in ("text", "user.name", "entities.urls.url")}
+    to_remove = minimum_paths_for_deletion(keep, paths)
+    chunks = []
+    modified = prune_collection(
+        collection, to_remove.values(), chunk_size=chunk_size, workers=workers,
+        on_chunk=lambda done, total, modified: chunks.append((done, total)))
+    assert modified == 50
+    expected_chunks = 1 if chunk_size is None else 8
+    assert len(collection.updates) == expected_chunks
+    assert chunks == [(i, expected_chunks) for i in range(1, expected_chunks + 1)]
+    for document in collection.find():
+        i = document["_id"]
+        assert document == {
+            "_id": i, "text": f"text {i}", "user": {"name": f"u{i}"}, "entities": {"urls": [{"url": "a"}] * (i % 3)}}
+
+
+@pytest.mark.data
+@pytest.mark.helper
+def test_id_ranges():
+    """The ranges cover the collection, without overlap."""
+    collection = mongomock.MongoClient().db.data
+    collection.insert_many(_documents(20))
+    ranges = id_ranges(collection, 6)
+    assert ranges == [(0, 6), (6, 12), (12, 18), (18, None)]
+    assert id_ranges(collection, 5) == [(0, 5), (5, 10), (10, 15), (15, None)]
+    assert id_ranges(mongomock.MongoClient().db.empty, 5) == []
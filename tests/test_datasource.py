@@ -3,7 +3,10 @@
 # import json
 # import pytest
 # import python_jsonschema_objects as pjs
-from nlp4all.helpers.data_source import schema_aliased_path_dict
+import pytest
+from nlp4all.helpers.data_source import schema_aliased_path_dict, schema_fingerprint
+from nlp4all.helpers.filterable import FilterableBoolean
+from nlp4all.models import DataSourceModel
 
 
 def test_schema_to_path_dict(jsonschema, schema_paths):
@@ -32,6 +35,91 @@ def test_schema_to_path_dict(jsonschema, schema_paths):
     # complex example
     assert schema_aliased_path_dict(jsonschema) == schema_paths
 
+
+def test_schema_fingerprint(jsonschema, schema_paths):
+    """The schema fingerprint is kept up to date with the schema."""
+    ds = DataSourceModel(data_source_name="fingerprint", schema=jsonschema)
+    assert ds.schema_fingerprint == schema_fingerprint(jsonschema)
+    assert ds.path_aliases_from_schema() == schema_paths
+    assert ds.path_types_from_schema() == schema_aliased_path_dict(jsonschema, types_only=True)
+    ds.schema = {"type": "object", "properties": {"text": {"type": "string"}}}
+    assert ds.path_aliases_from_schema() == {"text": ("properties", "text")}
+    # changed in place
+    ds.schema["properties"]["lang"] = {"type": "string"}
+    assert set(ds.path_aliases_from_schema()) == {"text", "lang"}
+    assert ds.schema_fingerprint == schema_fingerprint(ds.schema)
+    ds.schema["properties"]["lang"]["type"] = "integer"
+    assert ds.path_types_from_schema()["lang"] == ("integer",)
+    ds.schema = None
+    assert ds.schema_fingerprint is None
+
+
+def test_schema_fingerprint_saved(app):  # pylint: disable=unused-argument
+    """A schema changed in place is saved with its new fingerprint."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.models import UserModel
+
+    user = nlp4all.db.session.query(UserModel).first()
+    ds = DataSourceModel(data_source_name="fingerprint", user=user, schema={"type": "object", "properties": {}})
+    nlp4all.db.session.add(ds)
+    nlp4all.db.session.commit()
+    ds.schema["properties"]["text"] = {"type": "string"}
+    nlp4all.db.session.commit()
+    nlp4all.db.session.expire(ds)
+    assert ds.schema_fingerprint == schema_fingerprint({"type": "object", "properties": {"text": {"type": "string"}}})
+
+
+def test_filterables():
+    """Filterables are added and removed as a whole new meta value."""
+    ds = DataSourceModel(data_source_name="filterables", meta={})
+    ds.add_filterable(FilterableBoolean("flag", ("properties", "flag"), {}))
+    filterables = ds.filterables
+    assert ds.filterable("flag").path == ("properties", "flag")
+    ds.remove_filterable("flag")
+    assert ds.filterables == {}
+    assert "flag" in filterables
+
+
+def test_filterables_dispatch_index_build(app, monkeypatch):  # pylint: disable=unused-argument
+    """Committing changed filterables syncs the indexes of the data source."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.helpers import data_source_tasks
+    from nlp4all.models import UserModel
+
+    dispatched = []
+    monkeypatch.setattr(data_source_tasks.index_data_source, "delay", dispatched.append)
+    user = nlp4all.db.session.query(UserModel).first()
+    ds = DataSourceModel(data_source_name="indexes", user=user, meta={})
+    nlp4all.db.session.add(ds)
+    nlp4all.db.session.commit()
+    assert not dispatched
+    ds.add_filterable(FilterableBoolean("flag", ("properties", "flag"), {}))
+    nlp4all.db.session.commit()
+    assert dispatched == [ds.id]
+    ds.remove_filterable("flag")
+    nlp4all.db.session.flush()
+    nlp4all.db.session.rollback()
+    nlp4all.db.session.commit()
+    assert dispatched == [ds.id]
+    ds.remove_filterable("flag")
+    nlp4all.db.session.commit()
+    assert dispatched == [ds.id, ds.id]
+
+
+def test_filter_query():
+    """Values chosen for filterables compile to a query."""
+    ds = DataSourceModel(data_source_name="filter_query", meta={})
+    ds.add_filterable(FilterableBoolean("flag", ("properties", "flag"), {}))
+    assert ds.filter_query({"flag": True}).to_mongo() == {"flag": True}
+    with pytest.raises(KeyError, match="other"):
+        ds.filter_query({"flag": True, "other": True})
+    # no filterables at all
+    with pytest.raises(KeyError, match="other"):
+        DataSourceModel(data_source_name="no_filterables", meta={}).filter_query({"other": True})
+
+
 # @pytest.mark.data
 # # @pytest.mark.model
 # def test_data_import_csv(app, csvdata):
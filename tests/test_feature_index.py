@@ -0,0 +1,94 @@
+"""Tests for wildcard feature lookups."""
+
+import random
+import pytest
+
+from nlp4all.helpers.feature_index import FeatureIndex, feature_index
+from nlp4all.models import BayesianRobotModel
+
+WORDS = ["hello", "help", "shell", "yellow", "he", "ohell", "apple", "app", "\U0010ffffx", "Hello"]
+
+
+def _scan(words, feature):
+    return [word for word in words if BayesianRobotModel.matches(word, feature)]
+
+
+@pytest.mark.helper
+def test_expand():
+    """Features expand to the words they match, in the order of the vocabulary."""
+    index = FeatureIndex(WORDS)
+    assert index.expand("hel*") == ["hello", "help"]
+    assert index.expand("*ll") == ["shell", "ohell"]
+    assert index.expand("*ell*") == ["hello", "shell", "yellow", "ohell", "Hello"]
+    assert index.expand("*el*") == ["hello", "help", "shell", "yellow", "ohell", "Hello"]
+    assert index.expand("*") == WORDS
+    assert index.expand("*\U0010ffff*") == ["\U0010ffffx"]
+    assert index.expand("\U0010ffff*") == ["\U0010ffffx"]
+    assert index.expand("APP") == ["app"]
+    assert index.expand("*lol*") == []
+    assert index.expand("*xyz") == []
+    words = index.expand("app*")
+    words.append("changed")
+    assert index.expand("app*") == ["apple", "app"]
+    for feature in ["hel*", "*ll", "*ell*", "*", "**", "h*", "*p", "*lle*", "app", "*o*", "zzz*"]:
+        assert index.expand(feature) == _scan(WORDS, feature)
+
+
+@pytest.mark.helper
+def test_expand_random():
+    """The index matches what checking every word matches."""
+    rng = random.Random(1)
+    words = list(dict.fromkeys("".join(rng.choices("abcde", k=rng.randint(1, 8))) for _ in range(2000)))
+    index = FeatureIndex(words)
+    for _ in range(300):
+        text = "".join(rng.choices("abcde", k=rng.randint(0, 5)))
+        feature = rng.choice([text, f"{text}*", f"*{text}", f"*{text}*"])
+        assert index.expand(feature) == _scan(words, feature)
+
+
+@pytest.mark.helper
+def test_feature_index_cache():
+    """Indexes are cached by key, the words are only read to build them."""
+    index = feature_index(("test", 1), ["a", "b"])
+    assert feature_index(("test", 1), iter(())) is index
+    assert index.words == ["a", "b"]
+    assert feature_index(("test", 2), ["b", "a"]).words == ["b", "a"]
+
+
+@pytest.mark.integration
+def test_project_feature_index(app):  # pylint: disable=unused-argument
+    """Projects have a new vocabulary version when their words change."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.models import ProjectModel, UserModel
+    from nlp4all.models.project_model import ProjectStatus
+    db = nlp4all.db
+    user = db.session.query(UserModel).first()
+    project = ProjectModel(
+        name="project", description="", user=user, tf_idf={"words": dict.fromkeys(WORDS)}, training_and_test_sets={},
+        status=ProjectStatus.DRAFT)
+    db.session.add(project)
+    db.session.commit()
+    version = project.vocabulary_version
+    assert version is not None
+    index = project.feature_index()
+    assert project.feature_index() is index
+    assert index.expand("hel*") == ["hello", "help"]
+    project.tf_idf["words"] = dict.fromkeys(["helium"])
+    db.session.commit()
+    assert project.vocabulary_version not in (None, version)
+    assert project.feature_index().expand("hel*") == ["helium"]
+    project.tf_idf = {"words": dict.fromkeys(WORDS)}
+    assert project.feature_index() is not index
+    assert project.feature_index().expand("hel*") == ["hello", "help"]
+
+
+@pytest.mark.helper
+def test_robot_features():
+    """Robots look their features up in the index."""
+    robot = BayesianRobotModel(features={"hel*": 1, "*ow": 1})
+    assert robot.feature_words("hel*", {"words": dict.fromkeys(WORDS)}) == ["hello", "help"]
+    # prefixes used to match on their first letter only
+    assert robot.word_in_features("help")
+    assert not robot.word_in_features("hat")
+    assert robot.word_in_features("yellow")
@@ -1,6 +1,7 @@
 """Tests for the filterable module."""
 
-from datetime import datetime
+from datetime import datetime, timezone
+import numpy as np
 import pytest
 
 from nlp4all.helpers.filterable import (
@@ -246,3 +247,78 @@ def test_filterableboolean():
     assert filterable.validate(False)
     assert not filterable.validate(1)
     assert not filterable.validate("test")
+
+
+def _validate_each(filterable, values):
+    """validate, value by value (False where it raises, e.g. for aware dates)"""
+    def _validate(value):
+        try:
+            return filterable.validate(value)
+        except (TypeError, ValueError, OverflowError):
+            return False
+    return [_validate(value) for value in values]
+
+
+@pytest.mark.helper
+def test_filterable_mask():
+    """Columns validate like their values, lists and NumPy arrays alike."""
+    values = [None, True, 'a', 'abcdef', 1, 2.5, -3, 10, float('nan'), float('inf'),
+              datetime(2018, 6, 1), datetime(2019, 6, 1), datetime(2018, 6, 1, tzinfo=timezone.utc),
+              '2018-06-01', '2018-06-01T12:30:00', '2018-06-01T12:30:00+00:00', '2019-06-01',
+              '2018', 'today', 'NaT', '2018-13-01', np.int64(3)]
+    filterables = [
+        FilterableString('s', ('s',), {'max_length': 5}),
+        FilterableNumber('n', ('n',), {'min': -3, 'max': 5}),
+        FilterableNumber('f', ('f',), {'min': -3, 'max': 5, 'is_float': True}),
+        FilterableDate('d', ('d',), {'min': datetime(2018, 1, 1), 'max': datetime(2018, 12, 31)}),
+        FilterableBoolean('b', ('b',), {}),
+    ]
+    for filterable in filterables:
+        assert filterable.mask(values).tolist() == _validate_each(filterable, values), filterable.name
+        assert not filterable.validate_many(values)
+        assert filterable.validate_many([])
+
+    assert filterables[0].mask(np.array(['a', 'abcdef'])).tolist() == [True, False]
+    assert filterables[1].mask(np.array([-4, 0, 5.9, 6])).tolist() == [False, True, True, False]
+    assert filterables[2].mask(np.array([-4, 0, 5.9, np.nan])).tolist() == [False, True, False, False]
+    dates = np.array(['2017-12-31', '2018-03-01', '2018-12-31'], dtype='datetime64[D]')
+    assert filterables[3].mask(dates).tolist() == [False, True, True]
+    assert filterables[3].mask(np.array(['2018-03-01', 'x'])).tolist() == [True, False]
+    assert filterables[4].mask(np.array([True, False])).all()
+    assert not filterables[4].mask(np.array([1, 0])).any()
+    with pytest.raises(ValueError):
+        filterables[4].mask(np.zeros((2, 2), dtype=bool))
+
+
+@pytest.mark.helper
+def test_filterable_large_numbers():
+    """Integers beyond 2 ** 53 are compared and summarized exactly."""
+    big = 2 ** 62
+    number = FilterableNumber('n', ('n',), {'min': big, 'max': big + 2})
+    values = [big - 1, big, big + 1, big + 2, big + 3]
+    expected = [False, True, True, True, False]
+    assert number.mask(values).tolist() == expected == _validate_each(number, values)
+    assert number.mask(np.array(values, dtype=np.int64)).tolist() == expected
+    assert number.mask(np.array(values, dtype=np.uint64)).tolist() == expected
+    assert number.stats(values) == {'count': 5, 'valid': 3, 'nulls': 0, 'min': big, 'max': big + 2}
+    assert number.stats(np.array(values, dtype=np.uint64))['max'] == big + 2
+    # mixed with floats, and beyond 64 bits
+    mixed = [big + 1, float(big), 2 ** 64, -2 ** 64]
+    assert number.mask(mixed).tolist() == [True, True, False, False] == _validate_each(number, mixed)
+    assert number.stats(mixed)['min'] == big
+    assert number.stats(mixed)['max'] == big + 1
+    huge = FilterableNumber('h', ('h',), {'min': 2 ** 64, 'max': 2 ** 65})
+    assert huge.mask([2 ** 64 + 1, big]).tolist() == [True, False]
+    assert not huge.mask(np.array([big], dtype=np.int64)).any()
+
+
+@pytest.mark.helper
+def test_filterable_stats():
+    """Stats count the valid values and give the range of numbers and dates."""
+    number = FilterableNumber('n', ('n',), {'min': 0, 'max': 100})
+    assert number.stats([None, 3.7, 50, 'x', 1000]) == {'count': 5, 'valid': 2, 'nulls': 1, 'min': 3, 'max': 50}
+    assert number.stats([]) == {'count': 0, 'valid': 0, 'nulls': 0, 'min': None, 'max': None}
+    date = FilterableDate('d', ('d',), {'min': datetime(2018, 1, 1), 'max': datetime(2018, 12, 31)})
+    assert date.stats(['2018-03-01', datetime(2018, 2, 1, 12), '2020-01-01']) == {
+        'count': 3, 'valid': 2, 'nulls': 0, 'min': datetime(2018, 2, 1, 12), 'max': datetime(2018, 3, 1)}
+    assert FilterableBoolean('b', ('b',), {}).stats([True, None]) == {'count': 2, 'valid': 1, 'nulls': 1}
@@ -0,0 +1,113 @@
+"""Tests for compiling filterables into mongo and postgres queries."""
+
+from datetime import datetime
+import mongomock
+import pytest
+from sqlalchemy import column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+
+from nlp4all.helpers.filterable import (
+    FilterableString,
+    FilterableNumber,
+    FilterableDate,
+    FilterableBoolean
+)
+from nlp4all.helpers.filterable_query import (
+    And,
+    Condition,
+    Or,
+    compile_filters,
+    containment_document,
+    schema_path_to_jsonpath,
+)
+
+LANG = FilterableString('lang', ('properties', 'lang'), {})
+LIKES = FilterableNumber('likes', ('properties', 'stats', 'properties', 'likes'), {'min': 0, 'max': 1000})
+CREATED = FilterableDate('created', ('properties', 'created'), {
+    'min': datetime(2020, 1, 1), 'max': datetime(2024, 1, 1), 'nullable': True})
+VERIFIED = FilterableBoolean('verified', ('properties', 'verified'), {})
+TAG = FilterableString('tag', ('properties', 'tags', 'items', 'properties', 'text'), {})
+
+DOCUMENTS = [
+    {'_id': 1, 'lang': 'en', 'stats': {'likes': 5}, 'created': datetime(2021, 5, 1), 'verified': True,
+     'tags': [{'text': 'a'}, {'text': 'b'}]},
+    {'_id': 2, 'lang': 'da', 'stats': {'likes': 50}, 'created': '2022-05-01T00:00:00', 'verified': False,
+     'tags': [{'text': 'b'}]},
+    {'_id': 3, 'lang': 'en', 'stats': {'likes': 500}, 'created': None, 'verified': False, 'tags': []},
+]
+
+
+def _find(expression):
+    collection = mongomock.MongoClient().db.documents
+    collection.insert_many(DOCUMENTS)
+    return sorted(document['_id'] for document in collection.find(expression.to_mongo()))
+
+
+def _sql(expression):
+    return str(expression.to_postgres(column('document', JSONB)).compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.helper
+def test_paths():
+    """Schema paths as SQL/JSON paths and containment documents."""
+    assert schema_path_to_jsonpath(LIKES.path) == '$."stats"."likes"'
+    assert schema_path_to_jsonpath(TAG.path) == '$."tags"[*]."text"'
+    assert containment_document(TAG.path, 'a') == {'tags': [{'text': 'a'}]}
+    assert containment_document(LIKES.path, 5) == {'stats': {'likes': 5}}
+
+
+@pytest.mark.helper
+def test_condition_validation():
+    """Values are validated by the filterables."""
+    with pytest.raises(ValueError):
+        Condition(LIKES, 5000)
+    with pytest.raises(ValueError):
+        Condition(LIKES, {'min': 10, 'step': 2})
+    with pytest.raises(ValueError):
+        Condition(LANG, {'min': 'a'})
+    with pytest.raises(ValueError):
+        Condition(LIKES, [1, 2])
+    with pytest.raises(ValueError):
+        Condition(LANG, None)
+    with pytest.raises(ValueError):
+        Condition(CREATED, 'yesterday')
+    assert Condition(CREATED, '2021-01-01').value == datetime(2021, 1, 1)
+    assert Condition(CREATED, None).value is None
+    with pytest.raises(KeyError):
+        compile_filters({'lang': LANG}, {'likes': 5})
+
+
+@pytest.mark.helper
+def test_to_mongo():
+    """Mongo queries select the matching documents."""
+    assert _find(Condition(LANG, 'en')) == [1, 3]
+    assert _find(Condition(LANG, ['da', 'de'])) == [2]
+    assert _find(Condition(LIKES, {'min': 10, 'max': 500})) == [2, 3]
+    assert _find(Condition(VERIFIED, True)) == [1]
+    assert _find(Condition(TAG, 'b')) == [1, 2]
+    # dates stored as dates and as ISO strings
+    assert _find(Condition(CREATED, {'min': datetime(2021, 1, 1)})) == [1, 2]
+    assert _find(Condition(CREATED, '2022-05-01T00:00:00')) == [2]
+    assert _find(Condition(CREATED, None)) == [3]
+    assert _find(And(Condition(LANG, 'en'), Or(Condition(LIKES, {'min': 100}), Condition(VERIFIED, True)))) == [1, 3]
+    assert _find(compile_filters({'lang': LANG, 'likes': LIKES}, {'lang': 'en', 'likes': {'max': 10}})) == [1]
+    assert _find(compile_filters({'lang': LANG}, {'lang': 'da'}, match_all=False)) == [2]
+    assert _find(And()) == [1, 2, 3]
+    assert _find(Or()) == []
+
+
+@pytest.mark.helper
+def test_to_postgres():
+    """Postgres expressions use containment for values and jsonb_path_exists for ranges."""
+    sql = _sql(Condition(TAG, 'a'))
+    assert sql.startswith('document @>')
+    sql = _sql(Condition(LIKES, {'min': 10, 'max': 500}))
+    assert sql.startswith('jsonb_path_exists(document,')
+    expression = Condition(LIKES, {'min': 10}).to_postgres(column('document', JSONB))
+    params = expression.compile(dialect=postgresql.dialect()).params
+    assert '$."stats"."likes" ? (@ >= $min)' in params.values()
+    assert {'min': 10} in params.values()
+    sql = _sql(And(Condition(LANG, ['en', 'da']), Or(Condition(VERIFIED, True), Condition(CREATED, None))))
+    assert sql.count('@>') == 4
+    assert ' AND ' in sql and ' OR ' in sql
@@ -0,0 +1,69 @@
+"""
+Mongo plugin tests, these don't need a MongoDB server.
+"""
+
+import os
+import pytest
+
+from nlp4all.helpers.mongo import Mongo, PoolMetrics
+
+
+@pytest.mark.helper
+def test_lazy_client(app):
+    """The client is created on first use, once per process."""
+    mongo = Mongo()
+    app.config["MONGO_MAX_POOL_SIZE"] = 7
+    app.config["MONGO_READ_PREFERENCE"] = "secondaryPreferred"
+    mongo.init_app(app)
+    assert not mongo.pool_stats()["connected"]
+    client = mongo.client
+    assert mongo.client is client
+    assert client.options.pool_options.max_pool_size == 7
+    assert client.read_preference.mongos_mode == "secondaryPreferred"
+    assert mongo.get_collection("test").database.name == "nlp4all"
+    assert mongo.pool_stats()["connected"]
+
+
+@pytest.mark.helper
+def test_client_after_fork(app, monkeypatch):
+    """A forked process doesn't use (or close) the client of its parent."""
+    mongo = Mongo(app)
+    parent = mongo.client
+    closed = []
+    monkeypatch.setattr(parent, "close", lambda: closed.append(True))
+    pid = os.getpid()
+    monkeypatch.setattr(os, "getpid", lambda: pid + 1)
+    child = mongo.client
+    assert child is not parent
+    assert mongo.client is child
+    mongo.reconnect()
+    assert mongo.client is not child
+    assert not closed
+
+
+@pytest.mark.helper
+def test_pool_metrics():
+    """Checkouts are counted with the time waited for them."""
+    metrics = PoolMetrics()
+    for _ in range(3):
+        metrics.connection_check_out_started(None)
+        metrics.connection_checked_out(None)
+    metrics.connection_checked_in(None)
+    metrics.connection_check_out_started(None)
+    metrics.connection_check_out_failed(None)
+    stats = metrics.snapshot()
+    assert stats["checkouts"] == 3
+    assert stats["checked_out"] == 2
+    assert stats["checkout_failures"] == 1
+    assert stats["wait_seconds"] >= stats["max_wait_seconds"] >= stats["mean_wait_seconds"] >= 0
+
+
+@pytest.mark.helper
+def test_health_without_server(app):
+    """The health check reports an unreachable server instead of raising."""
+    app.config["MONGO_URI"] = "mongodb://127.0.0.1:1/nlp4all"
+    app.config["MONGO_SERVER_SELECTION_TIMEOUT_MS"] = 100
+    status = Mongo(app).health()
+    assert status["ok"] is False
+    assert "error" in status
+    assert status["pool"]["options"]["serverSelectionTimeoutMS"] == 100
@@ -0,0 +1,307 @@
+"""Tests for the naive Bayes word counts, and for analyses keeping them in their own tables."""
+
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from benchmarks.generators import tagged_documents
+from benchmarks.naive_bayes import legacy_predictions_and_words
+from nlp4all.helpers.naive_bayes import CountStore, NaiveBayesScorer
+
+LEGACY_DATA = {
+    "counts": 3,
+    "words": {},
+    "pos": {"counts": 2, "words": {"good": 2, "day": 1}},
+    "neg": {"counts": 1, "words": {"bad": 1, "day": 1}},
+}
+
+
+@pytest.mark.helper
+def test_count_store():
+    """Documents are counted per category, and each of their words once."""
+    store = CountStore(["pos"])
+    ids = store.add("pos", ["good", "day", "good"])
+    assert ids.tolist() == [0, 1]
+    store.add("neg", ["bad", "day"])
+    store.add("pos", ["good"])
+    assert store.total == 3
+    assert store.categories == ["pos", "neg"]
+    assert store.counts.tolist() == [[2, 1, 0], [0, 1, 1]]
+    assert store.count("pos") == 2
+    assert store.count("pos", "good") == 2
+    assert store.count("neg", "good") == 0
+    assert store.count("other", "good") == 0
+    assert store.word_ids(["day", "unknown"]).tolist() == [1, -1]
+    assert store.to_data() == LEGACY_DATA
+    store.add("pos", ["good"], n=-1)
+    assert store.count("pos", "good") == 1
+    store.add_counts(["neg", "neg", "new", "pos"], [None, "bad", "bad", "bad"], [2, 1, 1, -1])
+    assert store.count("neg") == 3
+    assert store.count("neg", "bad") == 2
+    assert store.count("new", "bad") == 1
+    assert store.count("pos", "bad") == -1
+
+
+@pytest.mark.helper
+def test_count_store_growth():
+    """The matrix grows with the categories and the vocabulary."""
+    store = CountStore()
+    for i in range(500):
+        store.add(f"c{i % 7}", [f"w{i}", f"w{i + 1}", "all"])
+    assert store.counts.shape == (7, 502)
+    assert store.total == 500
+    assert store.count("c0", "all") == 72
+    assert store.counts[:, store.vocab["all"]].sum() == 500
+
+
+@pytest.mark.helper
+def test_count_store_data():
+    """The nested dictionaries analyses kept round trip."""
+    assert CountStore.from_data(LEGACY_DATA).to_data() == LEGACY_DATA
+    ids = {"pos": 1, "neg": 2}
+    store = CountStore.from_data(LEGACY_DATA, ids.get)
+    assert store.categories == [1, 2]
+    assert store.to_data({1: "pos", 2: "neg"}.get) == LEGACY_DATA
+    assert set(store.to_data({1: "pos"}.get)) == {"counts", "words", "pos"}
+    assert CountStore.from_data(LEGACY_DATA, {"pos": 1}.get).categories == [1]
+    assert CountStore.from_data(None).total == 0
+
+
+@pytest.mark.helper
+def test_count_store_load():
+    """Loading more words and categories than the matrix has room for keeps every count."""
+    store = CountStore()
+    categories = [f"c{i % 10}" for i in range(1000)]
+    words = [f"w{i}" for i in range(1000)]
+    store.set_counts(categories, words, range(1, 1001))
+    store.set_counts(categories[:10], None, range(10))
+    assert store.counts.shape == (10, 1000)
+    assert all(store.count(category, word) == i + 1 for i, (category, word) in enumerate(zip(categories, words)))
+    assert [store.count(f"c{i}") for i in range(10)] == list(range(10))
+    store.add_counts(["new"] * 100, [f"x{i}" for i in range(100)], [1] * 100)
+    assert store.count("new", "x99") == 1
+    assert store.count("c9", "w999") == 1000
+
+
+@pytest.mark.helper
+def test_scorer():
+    """Word probabilities are the count of the category over the count of the word."""
+    store = CountStore.from_data(LEGACY_DATA)
+    scorer = NaiveBayesScorer(store, ["neg", "other", "pos"])
+    ids = scorer.encode(["day", "good", "unknown", "day"])
+    assert ids.tolist() == [1, 0, -1]
+    probabilities = scorer.word_probabilities(ids)
+    assert probabilities.tolist() == [[0.5, 0, 0.5], [0, 0, 1], [0, 0, 0]]
+    assert scorer.probabilities().shape == (3, len(store.words))
+    assert scorer.predictions_and_words(["day", "good"], ["n", "o", "p"]) == (
+        {"day": {"n": 0.5, "o": 0, "p": 0.5}, "good": {"n": 0, "o": 0, "p": 1.0}},
+        {"n": 0.25, "o": 0, "p": 0.75})
+    assert scorer.predictions_and_words([]) == ({}, {})
+    assert NaiveBayesScorer(CountStore(), ["a"]).predictions_and_words(["x"]) == ({}, {"a": 0.0})
+
+
+@pytest.mark.helper
+def test_scorer_legacy():
+    """The scores are those analyses computed on their nested dictionaries."""
+    store = CountStore()
+    for category, words in tagged_documents(200, vocabulary=300, categories=3, words=8):
+        store.add(category, words)
+    data = store.to_data()
+    names = sorted(store.categories)
+    scorer = NaiveBayesScorer(store, names)
+    for _, words in tagged_documents(50, vocabulary=400, categories=3, words=8, seed=2):
+        preds, predictions = scorer.predictions_and_words(words)
+        legacy_preds, legacy_predictions = legacy_predictions_and_words(data, names, set(words))
+        assert preds.keys() == legacy_preds.keys()
+        for word, probabilities in preds.items():
+            assert probabilities == pytest.approx(legacy_preds[word], abs=0.0100001)
+        assert predictions == pytest.approx(legacy_predictions, abs=0.0100001)
+
+
+@pytest.mark.helper
+def test_score_batch():
+    """A batch scores each document as if it was scored on its own."""
+    store = CountStore()
+    for category, words in tagged_documents(100, vocabulary=100, categories=3, words=6):
+        store.add(category, words)
+    scorer = NaiveBayesScorer(store)
+    documents = [words for _, words in tagged_documents(30, vocabulary=150, categories=3, words=6, seed=2)]
+    documents[3] = []
+    documents[-1] = []
+    encoded = [scorer.encode(words) for words in documents]
+    scores = scorer.score_batch(encoded)
+    assert scores.words.shape == (sum(len(ids) for ids in encoded), 3)
+    assert scores.documents.shape == (30, 3)
+    for i, ids in enumerate(encoded):
+        expected = scorer.word_probabilities(ids).mean(axis=0) if len(ids) else np.zeros(3)
+        assert np.allclose(scores.documents[i], expected)
+        start = scores.offsets[i]
+        assert np.array_equal(scores.words[start:start + len(ids)], scorer.word_probabilities(ids))
+    rounded = scorer.score_batch(encoded, decimals=2)
+    _, predictions = scorer.predictions_and_words(documents[0])
+    assert [round(score, 2) for score in rounded.documents[0]] == list(predictions.values())
+    assert scorer.score_batch([]).documents.shape == (0, 3)
+
+
+def _analysis(db, data=None):
+    # pylint: disable=import-outside-toplevel
+    from nlp4all.models import BayesianAnalysisModel, DataTagCategoryModel, ProjectModel, UserModel
+    from nlp4all.models.project_model import ProjectStatus
+    user = db.session.query(UserModel).first()
+    pos = DataTagCategoryModel(name="pos", description="positive")
+    neg = DataTagCategoryModel(name="neg", description="negative")
+    project = ProjectModel(
+        name="project", description="", user=user, categories=[pos, neg], tf_idf={}, training_and_test_sets={},
+        status=ProjectStatus.DRAFT)
+    analysis = BayesianAnalysisModel(
+        user=user.id, name="analysis", project=project, data=data or {"counts": 0, "words": {}},
+        tweets={}, annotation_tags={})
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis, pos, neg
+
+
+def _doc(*words):
+    return SimpleNamespace(words=list(words))
+
+
+@pytest.mark.integration
+def test_analysis_counts(app):  # pylint: disable=unused-argument
+    """Tags are appended as deltas, and merged with the count tables when they're loaded."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.models import AnalysisCountDeltaModel, AnalysisWordCountModel, BayesianAnalysisModel
+    db = nlp4all.db
+    analysis, pos, neg = _analysis(db)
+    analysis.count_tag(_doc("good", "day", "good"), pos)
+    analysis.count_tag(_doc("bad", "day"), neg)
+    db.session.commit()
+    analysis.count_tag(_doc("good"), pos)
+    db.session.commit()
+    assert db.session.query(AnalysisCountDeltaModel).count() == 8
+    assert db.session.query(AnalysisWordCountModel).count() == 0
+    # the data column isn't rewritten
+    assert analysis.data == {"counts": 0, "words": {}}
+    analysis_id, neg_id = analysis.id, neg.id
+    db.session.expunge_all()
+
+    analysis = db.session.get(BayesianAnalysisModel, analysis_id)
+    assert analysis._count_store is None  # pylint: disable=protected-access
+    assert analysis.counts_data() == LEGACY_DATA
+    assert analysis.compact_counts(db.session) == 8
+    db.session.commit()
+    assert db.session.query(AnalysisCountDeltaModel).count() == 0
+    assert db.session.query(AnalysisWordCountModel).filter_by(word="good").one().count == 2
+    assert analysis.compact_counts(db.session) == 0
+    # loaded counts are kept up to date
+    analysis.count_tag(_doc("bad", "night"), SimpleNamespace(id=neg_id))
+    db.session.commit()
+    assert analysis.counts.count(neg_id, "night") == 1
+    db.session.expunge_all()
+    analysis = db.session.get(BayesianAnalysisModel, analysis_id)
+    assert analysis.counts.count(neg_id, "night") == 1
+    assert analysis.counts.count(neg_id, "bad") == 2
+    data = analysis.counts_data()
+
+    preds, predictions = analysis.get_predictions_and_words({"bad", "unknown"})
+    assert preds["bad"] == {"pos": 0, "neg": 1.0}
+    assert preds["unknown"] == {"pos": 0, "neg": 0}
+    assert predictions == {"pos": 0, "neg": 0.5}
+
+    # compacting leaves the counts as they were
+    assert analysis.compact_counts(db.session) == 3
+    db.session.commit()
+    db.session.expunge_all()
+    analysis = db.session.get(BayesianAnalysisModel, analysis_id)
+    assert analysis.counts_data() == data
+    assert db.session.query(AnalysisWordCountModel).filter_by(word="bad").one().count == 2
+
+
+@pytest.mark.integration
+def test_analysis_legacy_counts(app):  # pylint: disable=unused-argument
+    """Counts kept in data are read from it, and moved to the count tables on the first compaction."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.models import AnalysisWordCountModel, BayesianAnalysisModel
+    db = nlp4all.db
+    analysis, pos, _neg = _analysis(db, LEGACY_DATA)
+    assert analysis.counts_data() == LEGACY_DATA
+    analysis.count_tag(_doc("good", "night"), pos)
+    db.session.commit()
+    analysis_id, pos_id = analysis.id, pos.id
+    db.session.expunge_all()
+    analysis = db.session.get(BayesianAnalysisModel, analysis_id)
+    assert analysis.counts.count(pos_id, "good") == 3
+    assert db.session.query(AnalysisWordCountModel).count() == 0
+    analysis.compact_counts(db.session)
+    db.session.commit()
+    assert db.session.query(AnalysisWordCountModel).count() == 5
+    db.session.expunge_all()
+    analysis = db.session.get(BayesianAnalysisModel, analysis_id)
+    assert analysis.counts.count(pos_id) == 3
+    assert analysis.counts.count(pos_id, "good") == 3
+    assert np.array_equal(np.sort(analysis.counts.category_counts), [1, 3])
+
+
+@pytest.mark.integration
+def test_compact_analysis_counts(app):  # pylint: disable=unused-argument
+    """The background task compacts every analysis with pending deltas."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.helpers.analysis_tasks import compact_analysis_counts
+    from nlp4all.models import AnalysisCountDeltaModel
+    db = nlp4all.db
+    analysis, pos, neg = _analysis(db)
+    analysis.count_tag(_doc("good", "day"), pos)
+    analysis.count_tag(_doc("bad"), neg)
+    analysis.count_tag(_doc("bad"), neg, n=-1)
+    db.session.commit()
+    assert compact_analysis_counts() == 7
+    assert db.session.query(AnalysisCountDeltaModel).count() == 0
+    db.session.expire_all()
+    analysis._count_store = None  # pylint: disable=protected-access
+    assert analysis.counts.count(pos.id, "good") == 1
+    assert analysis.counts.count(neg.id) == 0
+    assert compact_analysis_counts(analysis.id) == 0
+
+
+@pytest.mark.integration
+def test_upsert_counts(app):  # pylint: disable=unused-argument
+    """Counts are added to in place, or seeded when they're missing."""
+    # pylint: disable=import-outside-toplevel
+    import nlp4all
+    from nlp4all.models import AnalysisCategoryCountModel, AnalysisWordCountModel
+    from nlp4all.models.analysis_counts import upsert_counts
+    db = nlp4all.db
+    analysis, pos, neg = _analysis(db)
+    upsert_counts(db.session, analysis.id, [(pos.id, None, 1), (pos.id, "good", 1), (pos.id, "good", 1)])
+    upsert_counts(db.session, analysis.id, [(pos.id, None, 2), (neg.id, "bad", 1)])
+    upsert_counts(db.session, analysis.id, [(pos.id, None, 5), (neg.id, "day", 3)], increment=False)
+    db.session.commit()
+    assert db.session.get(AnalysisCategoryCountModel, (analysis.id, pos.id)).count == 3
+    words = db.session.query(AnalysisWordCountModel).order_by(AnalysisWordCountModel.word).all()
+    assert [(row.word, row.count) for row in words] == [("bad", 1), ("day", 3), ("good", 2)]
+
+
+@pytest.mark.helper
+def test_matrix_predictions():
+    """Confusion matrices score their test tweets in a batch."""
+    # pylint: disable=import-outside-toplevel
+    from nlp4all.models import ConfusionMatrixModel, DataTagCategoryModel
+    matrix = ConfusionMatrixModel(
+        categories=[DataTagCategoryModel(name="pos"), DataTagCategoryModel(name="neg")],
+        train_data=LEGACY_DATA)
+    tweets = [
+        SimpleNamespace(id=1, words=["good", "day"], handle="pos"),
+        SimpleNamespace(id=2, words=["bad", "bad"], handle="pos"),
+        SimpleNamespace(id=3, words=["unknown"], handle="neg"),
+        SimpleNamespace(id=4, words=[], handle="neg"),
+    ]
+    matrix_data = dict(matrix.make_matrix_data(tweets, ["pos", "neg"]))
+    assert matrix_data[1]["predictions"] == {"pos": 0.75, "neg": 0.25}
+    assert matrix.get_predictions_and_words({"good", "day"})[1] == {"pos": 0.75, "neg": 0.25}
+    assert matrix_data[1]["class"] == "Pred_pos_Real_pos"
+    assert matrix_data[2]["pred_cat"] == "neg"
+    assert matrix_data[2]["class"] == "Pred_neg_Real_pos"
+    assert matrix_data[3]["pred_cat"] == "none"
+    assert matrix_data[4]["predictions"] == {}